@@ -4,22 +4,29 @@ from PySide2.QtWidgets import QCompleter  # MODIFICADO
 from PySide2.QtCore import Qt             # MODIFICADO
 import pandas as pd
 import os
+from columnar_snapshot import ColumnarSnapshot
 
 class AutocompletadoManager:
     """
     Clase para manejar el autocompletado de QLineEdit basado en datos de Excel
     """
     
-    def __init__(self, excel_path, sheet_name="Trabajos"):
+    def __init__(self, excel_path, sheet_name="Trabajos", session=None, snapshot_dir=None):
         """
         Inicializar el manager de autocompletado
         
         Args:
             excel_path (str): Ruta al archivo Excel
             sheet_name (str): Nombre de la hoja de Excel
+            session (WorkbookSession): Sesión compartida del libro (opcional). Si se indica,
+                                       se lee de ella en lugar de volver a abrir el Excel con pandas.
+            snapshot_dir (str): Copia columnar de la hoja (opcional). Si está al día con la
+                                sesión, los valores únicos salen de su diccionario.
         """
         self.excel_path = excel_path
         self.sheet_name = sheet_name
+        self.session = session
+        self.snapshot_dir = snapshot_dir
         self.completers = {}  # Diccionario para almacenar los completers por campo
         
     def obtener_valores_unicos(self, columna):
@@ -36,6 +43,9 @@ class AutocompletadoManager:
             if not os.path.exists(self.excel_path):
                 print(f"Advertencia: El archivo Excel no se encuentra en {self.excel_path}")
                 return []
+
+            if self.session is not None:
+                return self._valores_unicos_sesion(columna)
             
             df = pd.read_excel(self.excel_path, sheet_name=self.sheet_name)
             
@@ -51,6 +61,33 @@ class AutocompletadoManager:
             print(f"Error al obtener valores de {columna}: {e}")
             return []
     
+    def _valores_unicos_sesion(self, columna):
+        """
+        Igual que obtener_valores_unicos, pero leyendo la columna a través de la sesión (solo lectura).
+        """
+        if self.snapshot_dir:
+            firma = self.session.firma_actual()
+            snapshot = ColumnarSnapshot.abrir(self.snapshot_dir, firma) if firma else None
+            if snapshot is not None and columna in snapshot.headers:
+                try:
+                    valores = [str(valor).strip() for valor in snapshot.valores_unicos(columna)]
+                    return list(dict.fromkeys(texto for texto in valores if texto))
+                except Exception as e:
+                    # Archivos de la copia borrados por otra estación: se lee la hoja
+                    print(f"No se pudo leer la copia columnar de '{columna}': {e}")
+
+        headers = self.session.cabecera(self.sheet_name)
+        if columna not in headers:
+            print(f"Advertencia: La columna '{columna}' no se encuentra en la hoja '{self.sheet_name}'.")
+            return []
+        col_idx = headers.index(columna) + 1
+        valores = {}
+        for (valor,) in self.session.filas(self.sheet_name, min_row=2, min_col=col_idx, max_col=col_idx):
+            texto = str(valor).strip() if valor is not None else ""
+            if texto:
+                valores.setdefault(texto, None)
+        return list(valores)
+
     def configurar_autocompletado(self, line_edit, columna, campo_id=None):
         """
         Configurar autocompletado para un QLineEdit específico
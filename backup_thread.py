@@ -50,6 +50,14 @@ class BackupThread(QThread):
                     self.progress.emit(f"Respaldando base de datos: {self.excel_path}...")
                     zipf.write(self.excel_path, os.path.basename(self.excel_path))
                 
+                # Agregar los archivos mensuales de vales si existen
+                vales_dir = BackupManager.get_vales_dir(self.excel_path)
+                if os.path.isdir(vales_dir):
+                    self.progress.emit(f"Respaldando vales: {vales_dir}...")
+                    for file in os.listdir(vales_dir):
+                        if os.path.isfile(os.path.join(vales_dir, file)):  # Las copias columnares se regeneran
+                            zipf.write(os.path.join(vales_dir, file), os.path.join(os.path.basename(vales_dir), file))
+                
                 # Agregar directorio codes si existe
                 if os.path.exists(self.codes_dir):
                     self.progress.emit(f"Respaldando directorio de códigos: {self.codes_dir}...")
@@ -99,6 +107,11 @@ class BackupManager:
         
         return excel_path, codes_dir
     
+    @staticmethod
+    def get_vales_dir(excel_path):
+        """Carpeta con los archivos mensuales de vales que acompaña al Excel"""
+        return os.path.splitext(excel_path)[0] + "_vales"
+    
     @staticmethod
     def check_files_exist(excel_path, codes_dir):
         """Verifica si existen archivos para respaldar usando get_paths"""
@@ -151,6 +164,14 @@ class BackupManager:
                     progress_callback(f"Respaldando base de datos: {excel_path}...")
                 zipf.write(excel_path, os.path.basename(excel_path))
             
+            vales_dir = BackupManager.get_vales_dir(excel_path)
+            if os.path.isdir(vales_dir):
+                if progress_callback:
+                    progress_callback(f"Respaldando vales: {vales_dir}...")
+                for file in os.listdir(vales_dir):
+                    if os.path.isfile(os.path.join(vales_dir, file)):  # Las copias columnares se regeneran
+                        zipf.write(os.path.join(vales_dir, file), os.path.join(os.path.basename(vales_dir), file))
+            
             if codes_exist: # Usar la variable de check_files_exist
                 if progress_callback:
                     progress_callback(f"Respaldando directorio de códigos: {codes_dir}...")
@@ -190,6 +211,14 @@ class BackupManager:
         else:
             deleted_items_info.append(f"Archivo Excel no encontrado en {excel_path}, no se eliminó.")
             
+        vales_dir = BackupManager.get_vales_dir(excel_path)
+        if os.path.exists(vales_dir):
+            try:
+                shutil.rmtree(vales_dir)
+                deleted_items_info.append(f"Directorio de vales eliminado: {vales_dir}")
+            except Exception as e:
+                deleted_items_info.append(f"Error al eliminar directorio {vales_dir}: {e}")
+            
         if os.path.exists(codes_dir):
             try:
                 shutil.rmtree(codes_dir)
@@ -0,0 +1,138 @@
+# code_index.py
+
+from config import WORK_TYPE_ABBREVIATIONS
+from columnar_snapshot import ColumnarSnapshot
+from serial_codes import decodificar_codigo
+
+
+class CodeIndex:
+    """
+    Índice en memoria de los códigos seriales de la hoja 'Trabajos'.
+
+    Mapea cada código de las columnas 'Código_<tipo de trabajo>' a la fila
+    completa, con un diccionario por tipo de trabajo, para que buscar un código
+    escaneado sea O(1) sin importar cuántos tiquetes haya en la base de datos.
+
+    Los códigos con el formato actual llevan la abreviatura del tipo de trabajo y
+    se buscan solo en el diccionario de ese tipo; los códigos antiguos se buscan
+    en todos.
+    """
+
+    def __init__(self):
+        self.headers = []
+        self._posiciones = {}       # Nombre de columna -> índice
+        self._columnas_codigo = {}  # Tipo de trabajo -> índice de 'Código_<tipo>'
+        self._por_tipo = {}         # Tipo de trabajo -> {código serial -> fila}
+
+    def construir(self, ws_trabajos):
+        """
+        Construye el índice recorriendo una sola vez la hoja 'Trabajos'.
+
+        Args:
+            ws_trabajos: Hoja de openpyxl con la cabecera en la fila 1.
+        """
+        headers = [cell.value for cell in ws_trabajos[1]]
+        self.construir_desde_filas(headers, ws_trabajos.iter_rows(min_row=2, values_only=True))
+
+    def construir_desde_filas(self, headers, filas):
+        """
+        Construye el índice a partir de una cabecera y un iterable de filas (tuplas de valores).
+        """
+        self.headers = list(headers)
+        self._posiciones = {name: idx for idx, name in enumerate(self.headers) if name is not None}
+        self._columnas_codigo = {}
+        for work_type in WORK_TYPE_ABBREVIATIONS.keys():
+            idx = self._posiciones.get(f"Código_{work_type}")
+            if idx is not None:
+                self._columnas_codigo[work_type] = idx
+
+        self._por_tipo = {work_type: {} for work_type in self._columnas_codigo}
+        for row_values in filas:
+            self.agregar_fila(row_values)
+
+    @staticmethod
+    def clave(codigo):
+        """
+        Clave de un código en el índice, igual para las celdas y para lo escaneado:
+        un texto sin espacios a los lados; cualquier otro valor de celda, tal cual,
+        así que (como en la búsqueda secuencial) una celda numérica como 123 o 123.0
+        no coincide con el texto '123'.
+        """
+        return codigo.strip() if isinstance(codigo, str) else codigo
+
+    def agregar_fila(self, row_values):
+        """
+        Registra en el índice los códigos de una fila recién añadida a 'Trabajos'.
+        Si un código ya existía se conserva la primera fila, igual que la búsqueda secuencial.
+        """
+        row_values = tuple(row_values)
+        for work_type, idx in self._columnas_codigo.items():
+            if idx < len(row_values) and row_values[idx]:
+                self._por_tipo[work_type].setdefault(self.clave(row_values[idx]), row_values)
+
+    def buscar(self, codigo):
+        """
+        Busca un código serial: si trae la abreviatura de un tipo de trabajo, solo
+        en el diccionario de ese tipo; si no (código antiguo), en todos.
+
+        Returns:
+            tuple: (fila, tipo de trabajo) o (None, None) si no existe.
+        """
+        codigo = self.clave(codigo)
+        decodificado = decodificar_codigo(codigo)
+        if decodificado is not None and decodificado.work_type in self._por_tipo:
+            fila = self._por_tipo[decodificado.work_type].get(codigo)
+            return (fila, decodificado.work_type) if fila is not None else (None, None)
+
+        for work_type, codigos in self._por_tipo.items():
+            fila = codigos.get(codigo)
+            if fila is not None:
+                return fila, work_type
+        return None, None
+
+    def valor(self, header_name, row_values):
+        """Retorna el valor de la columna 'header_name' en la fila dada, o None si no existe."""
+        idx = self._posiciones.get(header_name)
+        if idx is None or idx >= len(row_values):
+            return None
+        return row_values[idx]
+
+    def __contains__(self, codigo):
+        return self.buscar(codigo)[0] is not None
+
+    def __len__(self):
+        return sum(len(codigos) for codigos in self._por_tipo.values())
+
+
+def construir_indice_trabajos(session, snapshot_dir, columnas_numericas, sheet_name="Trabajos"):
+    """
+    Construye el índice de códigos de 'Trabajos' desde la copia columnar si está al
+    día (sin interpretar el XML); si no, lee la hoja y regenera la copia.
+
+    Args:
+        session (WorkbookSession): Sesión del libro.
+        snapshot_dir (str): Carpeta de la copia columnar de la hoja.
+        columnas_numericas (list): Columnas que la copia guarda como números.
+
+    Returns:
+        CodeIndex
+    """
+    with session.lock:
+        code_index = CodeIndex()
+        firma = session.firma_actual()
+        copia = ColumnarSnapshot.leer(snapshot_dir, firma) if firma else None
+        if copia is not None:
+            code_index.construir_desde_filas(*copia)
+        else:
+            headers = session.cabecera(sheet_name)
+            filas = list(session.filas(sheet_name, min_row=2))
+            code_index.construir_desde_filas(headers, filas)
+            if firma:
+                try:
+                    # Con el mismo bloqueo que el guardado del Excel; solo si la copia sigue siendo de ese archivo
+                    with session.bloqueo_archivo:
+                        if ColumnarSnapshot.firma_de(session.excel_path) == tuple(firma):
+                            ColumnarSnapshot.escribir(snapshot_dir, headers, filas, columnas_numericas, firma)
+                except Exception as e:
+                    print(f"No se pudo escribir la copia columnar de '{sheet_name}': {e}")
+        return code_index
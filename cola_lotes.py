@@ -0,0 +1,70 @@
+# cola_lotes.py
+
+import queue
+
+
+class ColaLotes:
+    """
+    Cola que entrega sus elementos por lotes.
+
+    Los productores llaman a poner() sin bloquearse; el consumidor llama a
+    tomar_lote(), que espera el primer elemento y junta los que lleguen enseguida
+    (hasta 'lote' elementos, sin esperar más de 'espera' segundos entre uno y
+    otro). Así, a ritmo de lector de códigos, muchos escaneos terminan en una sola
+    escritura, y un escaneo aislado no espera más de 'espera' segundos.
+    """
+
+    _FIN = object()
+
+    def __init__(self, lote=50, espera=0.15):
+        """
+        Args:
+            lote (int): Máximo de elementos por lote.
+            espera (float): Segundos que se esperan a más elementos antes de entregar un lote.
+        """
+        self.lote = lote
+        self.espera = espera
+        self._cola = queue.Queue()
+        self._cerrada = False
+
+    def poner(self, elemento):
+        """Añade un elemento (no bloquea)."""
+        self._cola.put(elemento)
+
+    def pendientes(self):
+        """Elementos en cola aún sin entregar (aproximado)."""
+        return self._cola.qsize()
+
+    @property
+    def cerrada(self):
+        return self._cerrada
+
+    def cerrar(self):
+        """
+        Pide terminar: lo que ya estaba en cola se entrega y después tomar_lote()
+        retorna None. Lo que se ponga después de cerrar se descarta.
+        """
+        self._cerrada = True
+        self._cola.put(self._FIN)
+
+    def tomar_lote(self):
+        """
+        Espera y retorna el siguiente lote (lista no vacía), o None cuando la cola
+        fue cerrada y ya no quedan elementos.
+        """
+        primero = self._cola.get()
+        if primero is self._FIN:
+            self._cola.put(self._FIN)  # Otros consumidores también deben terminar
+            return None
+
+        lote = [primero]
+        while len(lote) < self.lote:
+            try:
+                elemento = self._cola.get(timeout=self.espera)
+            except queue.Empty:
+                break
+            if elemento is self._FIN:
+                self._cola.put(self._FIN)  # Se entrega este lote y luego se termina
+                break
+            lote.append(elemento)
+        return lote
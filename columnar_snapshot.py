@@ -0,0 +1,234 @@
+# columnar_snapshot.py
+
+import os
+import json
+import math
+import time
+import numpy as np
+
+
+class ColumnarSnapshot:
+    """
+    Copia columnar de una hoja, guardada junto al Excel para lecturas analíticas.
+
+    Las columnas numéricas se guardan como arreglos float64 (.npy) y el resto con
+    codificación de diccionario: un arreglo int32 de códigos más la lista de
+    valores distintos (JSON). Los lectores abren los .npy con mmap, así que
+    consultar una columna no vuelve a interpretar el XML del .xlsx ni carga en
+    memoria lo que no se usa.
+
+    Cada copia guarda la firma (mtime_ns, tamaño) del archivo del que salió; si no
+    coincide con la del archivo actual, la copia está desactualizada.
+
+    Quien escribe debe tener tomado el mismo FileLock con que se guarda el archivo
+    de origen. Al escribir se conservan los .npy de la generación anterior (un
+    lector puede haber leído su meta.json justo antes) y se borran los más viejos;
+    aun así un lector muy lento puede no encontrarlos, por eso los lectores usan
+    leer() o atrapan los errores y vuelven al archivo de origen.
+    """
+
+    META = "meta.json"
+
+    def __init__(self, directorio, meta):
+        self.directorio = directorio
+        self.headers = meta["headers"]
+        self.firma = tuple(meta["firma"]) if meta.get("firma") else None
+        self.num_filas = meta["num_filas"]
+        self._columnas = meta["columnas"]  # Nombre -> {"tipo", "archivo", ["diccionario"], ["entera"]}
+        self._arreglos = {}
+
+    @staticmethod
+    def firma_de(path):
+        """Firma (mtime_ns, tamaño) de un archivo, o None si no existe."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    # --- ESCRITURA ---
+
+    @classmethod
+    def escribir(cls, directorio, headers, filas, columnas_numericas, firma):
+        """
+        Escribe la copia columnar de una hoja.
+
+        Args:
+            directorio (str): Carpeta de la copia (se crea si no existe).
+            headers (list): Cabecera de la hoja.
+            filas (iterable): Filas de valores (sin la cabecera).
+            columnas_numericas (iterable): Columnas que se guardan como float64. Si alguna
+                                           tiene un valor no numérico se codifica como texto.
+            firma (tuple): Firma del archivo de origen.
+
+        Returns:
+            ColumnarSnapshot: La copia recién escrita.
+        """
+        headers = list(headers)
+        columnas_numericas = set(columnas_numericas)
+        valores = [[] for _ in headers]
+        num_filas = 0
+        for fila in filas:
+            for idx in range(len(headers)):
+                valores[idx].append(fila[idx] if idx < len(fila) else None)
+            num_filas += 1
+
+        os.makedirs(directorio, exist_ok=True)
+        # Archivos nuevos con sufijo de generación: meta.json se reemplaza al final,
+        # así un lector nunca ve una mezcla de columnas viejas y nuevas.
+        generacion = f"{os.getpid()}_{time.time_ns()}"
+        anterior = cls._generacion_vigente(directorio)
+        columnas = {}
+        for idx, nombre in enumerate(headers):
+            if nombre is None:
+                continue
+            datos = valores[idx]
+            archivo = f"c{idx}_{generacion}.npy"
+            if nombre in columnas_numericas and all(cls._es_numero(v) for v in datos if v is not None):
+                arreglo = np.array([math.nan if v is None else float(v) for v in datos], dtype=np.float64)
+                entera = all(isinstance(v, int) for v in datos if v is not None)
+                columnas[nombre] = {"tipo": "numerica", "archivo": archivo, "entera": entera}
+            else:
+                diccionario, codigos = [], {}
+                arreglo = np.empty(num_filas, dtype=np.int32)
+                for pos, v in enumerate(datos):
+                    if v is None:
+                        arreglo[pos] = -1
+                        continue
+                    if not isinstance(v, (str, int, float, bool)):
+                        v = v.isoformat() if hasattr(v, "isoformat") else str(v)
+                    codigo = codigos.get(v)
+                    if codigo is None:
+                        codigo = codigos[v] = len(diccionario)
+                        diccionario.append(v)
+                    arreglo[pos] = codigo
+                columnas[nombre] = {"tipo": "diccionario", "archivo": archivo, "diccionario": diccionario}
+            np.save(os.path.join(directorio, archivo), arreglo)
+
+        meta = {"headers": headers, "firma": list(firma) if firma else None,
+                "num_filas": num_filas, "columnas": columnas, "generacion": generacion}
+        tmp_path = os.path.join(directorio, cls.META + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directorio, cls.META))
+
+        # Solo se borran las generaciones anteriores a la que se acaba de reemplazar
+        conservar = {generacion, anterior}
+        for nombre in os.listdir(directorio):
+            if nombre.endswith(".npy") and cls._generacion_de(nombre) not in conservar:
+                try:
+                    os.remove(os.path.join(directorio, nombre))
+                except OSError:
+                    pass  # Un lector aún lo tiene mapeado (Windows); se borrará en la próxima escritura
+        return cls(directorio, meta)
+
+    @classmethod
+    def _generacion_vigente(cls, directorio):
+        """Generación de la copia a la que apunta meta.json, o None."""
+        try:
+            with open(os.path.join(directorio, cls.META), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("generacion"):
+            return meta["generacion"]
+        # Copias anteriores sin 'generacion' en meta.json: se toma del nombre de sus archivos
+        archivos = [c.get("archivo", "") for c in meta.get("columnas", {}).values()]
+        return cls._generacion_de(archivos[0]) if archivos else None
+
+    @staticmethod
+    def _generacion_de(nombre):
+        """Generación de un archivo 'c<idx>_<generación>.npy'."""
+        return nombre[:-len(".npy")].split("_", 1)[-1]
+
+    @staticmethod
+    def _es_numero(valor):
+        return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+    # --- LECTURA ---
+
+    @classmethod
+    def abrir(cls, directorio, firma=None):
+        """
+        Abre una copia existente.
+
+        Args:
+            firma (tuple): Si se indica, solo se retorna la copia si fue hecha desde esa firma.
+
+        Returns:
+            ColumnarSnapshot o None si no existe, está dañada o está desactualizada.
+        """
+        try:
+            with open(os.path.join(directorio, cls.META), "r", encoding="utf-8") as f:
+                snapshot = cls(directorio, json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        if firma is not None and snapshot.firma != tuple(firma):
+            return None
+        return snapshot
+
+    @classmethod
+    def leer(cls, directorio, firma=None):
+        """
+        Cabecera y filas (lista de tuplas) de una copia al día, ya leídas por
+        completo, o None si no existe, está desactualizada o falla cualquier lectura
+        (p. ej. otra estación borró sus archivos): el llamador lee el archivo de origen.
+        """
+        snapshot = cls.abrir(directorio, firma)
+        if snapshot is None:
+            return None
+        try:
+            return snapshot.headers, list(snapshot.filas())
+        except Exception as e:
+            print(f"No se pudo leer la copia columnar '{directorio}': {e}")
+            return None
+
+    def _arreglo(self, nombre):
+        if nombre not in self._arreglos:
+            info = self._columnas[nombre]
+            self._arreglos[nombre] = np.load(os.path.join(self.directorio, info["archivo"]), mmap_mode="r")
+        return self._arreglos[nombre]
+
+    def columna(self, nombre):
+        """
+        Arreglo mapeado en memoria de una columna: float64 (NaN = vacío) si es
+        numérica, o los códigos int32 (-1 = vacío) si es de diccionario.
+
+        Raises:
+            KeyError: Si la columna no existe.
+        """
+        return self._arreglo(nombre)
+
+    def es_numerica(self, nombre):
+        return self._columnas[nombre]["tipo"] == "numerica"
+
+    def diccionario(self, nombre):
+        """Valores distintos de una columna de diccionario, en orden de aparición."""
+        return self._columnas[nombre]["diccionario"]
+
+    def valores_unicos(self, nombre):
+        """Valores distintos (no vacíos) de una columna, sin recorrer las filas si es de diccionario."""
+        if nombre not in self._columnas:
+            return []
+        if self.es_numerica(nombre):
+            arreglo = self._arreglo(nombre)
+            return self._decodificar_numeros(nombre, np.unique(arreglo[~np.isnan(arreglo)]))
+        return list(self.diccionario(nombre))
+
+    def _decodificar_numeros(self, nombre, arreglo):
+        entera = self._columnas[nombre]["entera"]
+        return [None if math.isnan(v) else (int(v) if entera else v) for v in arreglo.tolist()]
+
+    def valores(self, nombre):
+        """Lista de valores de una columna, con los tipos originales."""
+        if nombre not in self._columnas:
+            return [None] * self.num_filas
+        arreglo = self._arreglo(nombre)
+        if self.es_numerica(nombre):
+            return self._decodificar_numeros(nombre, arreglo)
+        diccionario = self.diccionario(nombre)
+        return [diccionario[c] if c >= 0 else None for c in arreglo.tolist()]
+
+    def filas(self):
+        """Itera las filas como tuplas, en el mismo orden de columnas que la hoja."""
+        return zip(*(self.valores(nombre) for nombre in self.headers)) if self.headers else iter(())
@@ -25,6 +25,12 @@ WORK_TYPE_ABBREVIATIONS = {
     "Empaque": "EM",
 }
 
+# Columnas de 'Trabajos' que la copia columnar guarda como números (float64)
+COLUMNAS_NUMERICAS_TRABAJOS = (
+    [f"Cant_T{i}" for i in range(33, 49)] + ["Total Producido"]
+    + [f"Valor {wt}" for wt in WORK_TYPE_ABBREVIATIONS.keys()]
+)
+
 CAMPOS_VALOR_TRABAJO_MAP = {
     "Corte": "CampoValorCorte",
     "Guarnicion": "CampoValorGuarnicion",
@@ -0,0 +1,99 @@
+# estacion_vales.py
+
+import os
+import socket
+import datetime as dt
+
+from config import COLUMNAS_NUMERICAS_TRABAJOS
+from code_index import construir_indice_trabajos
+from registered_codes import RegisteredCodes
+from vale_journal import ValeJournal
+from workbook_session import WorkbookSession
+from vales_store import ValesShardStore
+from registro_vales import RegistroVales
+from latencias import MedidorLatencias
+
+
+def log(mensaje):
+    print(f"[{dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {mensaje}", flush=True)
+
+
+class EstacionVales:
+    """
+    Estado de una estación de escaneo sin interfaz: sesión del Excel, almacén
+    mensual de vales, índice de 'Trabajos', vales registrados y diario propio.
+    Usa los mismos archivos (y nombres) que la ventana principal.
+    """
+
+    def __init__(self, excel_path, estacion=None, sufijo="lector", sheet_trabajos="Trabajos", sheet_vales="Vales"):
+        """
+        Args:
+            excel_path (str): Ruta del archivo Excel de la base de datos.
+            estacion (str): Nombre de la estación; define el archivo del diario.
+                            Debe ser distinto del de la ventana principal si ambas
+                            corren en el mismo equipo.
+            sufijo (str): Si no se indica la estación, se usa '<estación del equipo>_<sufijo>',
+                          para no compartir el diario con la ventana principal.
+
+        Raises:
+            FileNotFoundError: Si la base de datos no existe.
+            ValueError: Si la hoja 'Vales' no tiene cabecera.
+        """
+        if not os.path.exists(excel_path):
+            raise FileNotFoundError(f"No existe '{excel_path}'. Abra primero la aplicación para crear la base de datos.")
+        base = os.path.splitext(excel_path)[0]
+        self.excel_path = excel_path
+        self.sheet_trabajos = sheet_trabajos
+        self.estacion = estacion or f"{os.environ.get('DRIVERQR_ESTACION') or socket.gethostname()}_{sufijo}"
+        self.trabajos_snapshot_dir = base + "_trabajos.snapshot"
+
+        self.session = WorkbookSession(excel_path)
+        vales_headers = [h for h in self.session.cabecera(sheet_vales) if h is not None]
+        if not vales_headers:
+            raise ValueError(f"La hoja '{sheet_vales}' de '{excel_path}' no tiene cabecera.")
+        self.vales_store = ValesShardStore(base + "_vales", vales_headers, sheet_vales)
+
+        self.construir_indice()
+        self.vales_registrados = RegisteredCodes()
+        self.vales_registrados.construir_desde_valores(self.vales_store.codigos_actualizados(todos=True))
+
+        self.vale_journal = ValeJournal(journal_path=f"{base}_vales_{self.estacion}.jsonl", store=self.vales_store)
+        for fila in self.vale_journal.pendientes():
+            self.vales_registrados.agregar(fila[ValeJournal.CODIGO_SERIAL_IDX])
+
+        self.latencias = MedidorLatencias(json_path=f"{base}_latencias_{self.estacion}.json")
+        self.registro = RegistroVales(lambda: self.code_index, self.vales_registrados, self.vale_journal,
+                                      medidor=self.latencias)
+
+    def construir_indice(self):
+        self._version_indice = self.session.version_externa
+        self.code_index = construir_indice_trabajos(
+            self.session, self.trabajos_snapshot_dir, COLUMNAS_NUMERICAS_TRABAJOS, self.sheet_trabajos
+        )
+
+    def sincronizar(self):
+        """Incorpora los vales (nuevos o anulados) y trabajos que otras estaciones escribieron."""
+        for codigo in self.vales_store.codigos_anulados_actualizados():
+            if not self.vale_journal.contiene_codigo(codigo):
+                self.vales_registrados.quitar(codigo)
+        for codigo in self.vales_store.codigos_actualizados():
+            self.vales_registrados.agregar(codigo)
+        self.session.cambio_externo()
+        if self.session.version_externa != self._version_indice:
+            log("Otra estación modificó 'Trabajos'; actualizando índice de códigos...")
+            self.construir_indice()
+
+    def iniciar(self):
+        self.vale_journal.iniciar()
+
+    def cerrar(self):
+        """Pasa los vales del diario a los archivos mensuales y guarda las latencias."""
+        try:
+            self.vale_journal.detener(compactar=True)
+        except Exception as e:
+            log(f"No se pudieron compactar los vales pendientes (quedan en el diario): {e}")
+        try:
+            self.latencias.volcar()
+        except Exception as e:
+            log(f"No se pudieron guardar las latencias: {e}")
+        self.session.cerrar()
@@ -1,12 +1,16 @@
+import io
 import os
 import sys
 import subprocess
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, PageBreak
 from reportlab.platypus.flowables import Image
+from reportlab.graphics.shapes import Drawing, Path
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 import qrcode # Asegúrate de tener: pip install qrcode
+from qr_cache import QRCache
+from qr_batch import codificar_qr_png, codificar_qr_lote, matriz_qr, matrices_qr_lote
 
 # --- CONSTANTES FIJAS DE TRABAJO ---
 TIPOS_DE_TRABAJO = {
@@ -37,14 +41,56 @@ def generate_serial_code(ticket_number, referencia, work_type_abbr):
     safe_ref = referencia.replace('/', '-').replace('\\', '-')
     return f"TKT:{ticket_number}|REF:{safe_ref}|JOB:{work_type_abbr}"
 
-def generate_barcode(serial_code, codes_dir="codes"):
+# Los seriales son deterministas: al reimprimir un tiquete sus QR salen de la caché
+qr_cache = QRCache(os.path.join("codes", "qr_cache"), codificar_qr_png, variante="png-v1")
+
+def generate_qr_png(serial_code):
+    """PNG (bytes) del QR de un código, de la caché si ya se generó antes."""
+    return qr_cache.obtener(serial_code)
+
+def qr_vectorial(serial_code, size=45, matriz=None):
+    """
+    QR de un código como dibujo vectorial de reportlab, sin imágenes intermedias:
+    más liviano en el PDF y nítido a cualquier escala. Cada tramo de módulos
+    negros de una fila es un rectángulo de un único trazado, así reportlab
+    dibuja un objeto por QR y no uno por módulo. Se puede pasar la matriz ya
+    calculada (ver qr_batch.matrices_qr_lote).
+    """
+    matriz = matriz or matriz_qr(serial_code)  # Mismos parámetros que qrcode.make
+    n = len(matriz)
+    # Coordenadas en módulos (enteros, cortos en el PDF); el dibujo escala a 'size'
+    trazado = Path(fillColor=colors.black, strokeColor=None, strokeWidth=0)
+    for fila, modulos in enumerate(matriz):
+        y = n - fila - 1
+        x = 0
+        while x < n:
+            if not modulos[x]:
+                x += 1
+                continue
+            inicio = x
+            while x < n and modulos[x]:
+                x += 1
+            trazado.moveTo(inicio, y)
+            trazado.lineTo(x, y)
+            trazado.lineTo(x, y + 1)
+            trazado.lineTo(inicio, y + 1)
+            trazado.closePath()
+    drawing = Drawing(size, size, transform=[size / n, 0, 0, size / n, 0, 0])
+    drawing.add(trazado)
+    return drawing
+
+def generate_barcode(serial_code, codes_dir="codes", png=None):
+    """
+    Guarda el QR de un código como PNG en codes_dir (solo para archivo; el PDF
+    usa el PNG en memoria). Si ya se generó, se pasa en 'png' y no se vuelve a codificar.
+    """
     if not os.path.exists(codes_dir):
         os.makedirs(codes_dir)
     safe_filename = "".join(c for c in serial_code if c.isalnum() or c in ('-', '_')).rstrip()
     qr_path = os.path.join(codes_dir, f"qr_{safe_filename}.png")
     try:
-        qr_img = qrcode.make(serial_code)
-        qr_img.save(qr_path)
+        with open(qr_path, "wb") as f:
+            f.write(png if png is not None else generate_qr_png(serial_code))
         return qr_path
     except Exception as e:
         print(f"Error al generar la imagen QR para '{serial_code}': {e}")
@@ -52,18 +98,31 @@ def generate_barcode(serial_code, codes_dir="codes"):
 
 
 # --- FUNCIÓN PARA CONSTRUIR UN VALE INDIVIDUAL (DISEÑO FUSIONADO) ---
-def build_vale_compacto(ticket_data, tipo_display, styles, col_width):
+def build_vale_compacto(ticket_data, tipo_display, styles, col_width, modo_qr="vector"):
     # 1. Extraer datos
     referencia = ticket_data.get("referencia", "N/A")
     ticket_number = ticket_data.get("ticket_number", "N/A")
     color = ticket_data.get("color", "N/A")
     tallas = ticket_data.get("tallas_cantidades", {})
     total = ticket_data.get("total_producido", 0)
+    serial = ticket_data.get("serials", {}).get(tipo_display)
+    matriz = ticket_data.get("qr_matrices", {}).get(tipo_display)
+    barcode_png = ticket_data.get("barcode_images", {}).get(tipo_display)
     barcode_path = ticket_data.get("barcode_paths", {}).get(tipo_display, "")
 
-    # 2. QR
+    # 2. QR: vectorial; o del PNG en memoria; o de un archivo ya generado
     qr_image = Paragraph("(Sin QR)", styles["Normal"])
-    if barcode_path and os.path.exists(barcode_path):
+    if modo_qr == "vector" and serial:
+        try:
+            qr_image = qr_vectorial(serial, matriz=matriz)
+        except Exception:
+            qr_image = Paragraph("(Error QR)", styles["Normal"])
+    elif barcode_png:
+        try:
+            qr_image = Image(io.BytesIO(barcode_png), width=45, height=45)
+        except Exception:
+            qr_image = Paragraph("(Error QR)", styles["Normal"])
+    elif barcode_path and os.path.exists(barcode_path):
         try:
             qr_image = Image(barcode_path, width=45, height=45)
         except Exception:
@@ -115,7 +174,8 @@ def build_vale_compacto(ticket_data, tipo_display, styles, col_width):
 
 
 # --- FUNCIÓN DE MAQUETACIÓN DEL PDF ---
-def generar_pagina_densa(left_ticket_data, right_ticket_data, output_filename):
+def _documento_denso(output_filename):
+    """Documento A4 de márgenes mínimos, estilos compactos y medidas de columna y fila."""
     doc = SimpleDocTemplate(
         output_filename,
         pagesize=A4,
@@ -131,13 +191,18 @@ def generar_pagina_densa(left_ticket_data, right_ticket_data, output_filename):
     page_w, page_h = A4
     gutter = 6
     col_w = (page_w - doc.leftMargin - doc.rightMargin - gutter) / 2
-    row_h = (page_h - doc.topMargin - doc.bottomMargin) / len(TIPOS_DE_TRABAJO)
+    return doc, styles, col_w, gutter
 
+def _elementos_pagina(left_ticket_data, right_ticket_data, styles, col_w, gutter, modo_qr="vector"):
+    """Filas de una página: los vales de un tiquete a la izquierda y los del otro (o nada) a la derecha."""
     elements = []
     
     tipos_de_trabajo_lista = list(TIPOS_DE_TRABAJO.values())
-    vales_izq = [build_vale_compacto(left_ticket_data, tipo, styles, col_w) for tipo in tipos_de_trabajo_lista]
-    vales_der = [build_vale_compacto(right_ticket_data, tipo, styles, col_w) for tipo in tipos_de_trabajo_lista]
+    vales_izq = [build_vale_compacto(left_ticket_data, tipo, styles, col_w, modo_qr) for tipo in tipos_de_trabajo_lista]
+    if right_ticket_data is not None:
+        vales_der = [build_vale_compacto(right_ticket_data, tipo, styles, col_w, modo_qr) for tipo in tipos_de_trabajo_lista]
+    else:
+        vales_der = [""] * len(tipos_de_trabajo_lista)
     
     for i in range(len(tipos_de_trabajo_lista)):
         fila_tabla = Table(
@@ -149,6 +214,11 @@ def generar_pagina_densa(left_ticket_data, right_ticket_data, output_filename):
             ('BOTTOMPADDING', (0, 0), (-1, -1), 8)
         ]))
         elements.append(fila_tabla)
+    return elements
+
+def generar_pagina_densa(left_ticket_data, right_ticket_data, output_filename, modo_qr="vector"):
+    doc, styles, col_w, gutter = _documento_denso(output_filename)
+    elements = _elementos_pagina(left_ticket_data, right_ticket_data, styles, col_w, gutter, modo_qr)
 
     try:
         doc.build(elements)
@@ -158,19 +228,49 @@ def generar_pagina_densa(left_ticket_data, right_ticket_data, output_filename):
         print(f"Error crítico al construir el PDF: {e}")
         return None
 
-# --- FUNCIÓN PRINCIPAL PARA INTEGRACIÓN ---
-def generate_vale_pdf(left_ticket_info, right_ticket_info, output_filename):
-    print("Iniciando generación de PDF de alta densidad...")
-
-    def procesar_tiquete(ticket_info):
-        total = sum(ticket_info["tallas_cantidades"].values())
-        barcode_paths = {}
+# --- PREPARACIÓN DE LOS DATOS DE UN TIQUETE ---
+def procesar_tiquete(ticket_info):
+    """
+    Datos de un tiquete listos para build_vale_compacto: total producido y un serial
+    por tipo de trabajo. Si ticket_info ya trae 'serials' (p. ej. los guardados en
+    'Trabajos'), se usan esos.
+    """
+    total = sum(ticket_info["tallas_cantidades"].values())
+    serials = dict(ticket_info.get("serials") or {})
+    if not serials:
         for tipo_display in TIPOS_DE_TRABAJO.values():
             abbr = ABREVIATURAS_TRABAJO.get(tipo_display)
             if abbr:
-                serial = generate_serial_code(ticket_info["ticket_number"], ticket_info["referencia"], abbr)
-                barcode_paths[tipo_display] = generate_barcode(serial)
-        return {**ticket_info, "total_producido": total, "barcode_paths": barcode_paths}
+                serials[tipo_display] = generate_serial_code(ticket_info["ticket_number"], ticket_info["referencia"], abbr)
+    return {**ticket_info, "total_producido": total, "serials": serials,
+            "barcode_images": {}, "barcode_paths": {}, "qr_matrices": {}}
+
+def _agregar_imagenes_qr(tiquetes, guardar_png=False):
+    """Codifica en un solo lote (ver qr_batch) los QR de todos los tiquetes y los agrega a sus datos."""
+    pares = [(datos, tipo_display, serial) for datos in tiquetes for tipo_display, serial in datos["serials"].items()]
+    try:
+        imagenes = codificar_qr_lote([serial for _, _, serial in pares], cache=qr_cache)
+    except Exception as e:
+        print(f"Error al generar las imágenes QR: {e}")
+        imagenes = [None] * len(pares)
+    for (datos, tipo_display, serial), png in zip(pares, imagenes):
+        if png is None:
+            continue
+        datos["barcode_images"][tipo_display] = png
+        if guardar_png:
+            datos["barcode_paths"][tipo_display] = generate_barcode(serial, png=png)
+
+# --- FUNCIÓN PRINCIPAL PARA INTEGRACIÓN ---
+def generate_vale_pdf(left_ticket_info, right_ticket_info, output_filename, guardar_png=False, modo_qr="vector"):
+    """
+    Genera el PDF de dos tiquetes.
+
+    Con modo_qr="vector" los QR se dibujan como figuras vectoriales, sin imágenes
+    ni archivos en codes/. Con modo_qr="imagen" se generan como PNG en memoria
+    (con caché) y se insertan como imágenes. Con guardar_png=True además se
+    archivan como PNG en codes/.
+    """
+    print("Iniciando generación de PDF de alta densidad...")
 
     print("\nProcesando Tiquete Izquierdo...")
     left_ticket_data = procesar_tiquete(left_ticket_info)
@@ -178,9 +278,84 @@ def generate_vale_pdf(left_ticket_info, right_ticket_info, output_filename):
     print("\nProcesando Tiquete Derecho...")
     right_ticket_data = procesar_tiquete(right_ticket_info)
 
-    pdf_path = generar_pagina_densa(left_ticket_data, right_ticket_data, output_filename)
+    if modo_qr != "vector" or guardar_png:
+        # Los QR de ambos tiquetes se codifican en un solo lote
+        _agregar_imagenes_qr((left_ticket_data, right_ticket_data), guardar_png)
+
+    pdf_path = generar_pagina_densa(left_ticket_data, right_ticket_data, output_filename, modo_qr)
     return pdf_path
 
+class _FlujoPaginas(list):
+    """
+    Lista de flowables que se llena por páginas a medida que doc.build() la
+    consume (build saca los elementos del inicio con 'del flowables[0]').
+    """
+
+    def __init__(self, paginas, construir):
+        super().__init__()
+        self._paginas = iter(paginas)
+        self._construir = construir
+        self._primera = True
+        self._rellenar()
+
+    def _rellenar(self):
+        if super().__len__():
+            return
+        pagina = next(self._paginas, None)
+        if pagina is None:
+            return
+        if not self._primera:
+            self.append(PageBreak())
+        self._primera = False
+        self.extend(self._construir(*pagina))
+
+    def __len__(self):
+        self._rellenar()
+        return super().__len__()
+
+    def __getitem__(self, indice):
+        self._rellenar()
+        return super().__getitem__(indice)
+
+def generate_vales_pdf_lote(tickets_info, output_filename, guardar_png=False, modo_qr="vector"):
+    """
+    Genera un solo PDF con los vales de muchos tiquetes, dos por página (el
+    último va solo si son impares), con la misma maquetación de generate_vale_pdf.
+
+    Las páginas se arman a medida que reportlab las consume, así que en memoria
+    solo están los datos de los tiquetes y las filas de la página en curso.
+    Los QR de todos los tiquetes (matrices en modo "vector", PNG en modo
+    "imagen") se codifican en un solo lote repartido entre los núcleos.
+
+    Returns:
+        str: Ruta del PDF, o None si falla.
+    """
+    tiquetes = [procesar_tiquete(info) for info in tickets_info]
+    if not tiquetes:
+        print("No hay tiquetes para generar el PDF.")
+        return None
+    print(f"Generando PDF de {len(tiquetes)} tiquetes...")
+    if modo_qr != "vector" or guardar_png:
+        _agregar_imagenes_qr(tiquetes, guardar_png)
+    if modo_qr == "vector":
+        # Las matrices de todos los QR se calculan en un solo lote repartido entre los núcleos
+        pares = [(datos, tipo_display, serial) for datos in tiquetes for tipo_display, serial in datos["serials"].items()]
+        for (datos, tipo_display, _), matriz in zip(pares, matrices_qr_lote([serial for _, _, serial in pares])):
+            datos["qr_matrices"][tipo_display] = matriz
+
+    doc, styles, col_w, gutter = _documento_denso(output_filename)
+    paginas = [(tiquetes[i], tiquetes[i + 1] if i + 1 < len(tiquetes) else None)
+               for i in range(0, len(tiquetes), 2)]
+    elements = _FlujoPaginas(paginas, lambda izq, der: _elementos_pagina(izq, der, styles, col_w, gutter, modo_qr))
+
+    try:
+        doc.build(elements)
+        print(f"PDF de {len(tiquetes)} tiquetes ({len(paginas)} páginas) generado exitosamente: {output_filename}")
+        return output_filename
+    except Exception as e:
+        print(f"Error crítico al construir el PDF: {e}")
+        return None
+
 # --- BLOQUE DE TESTEO (main) ---
 if __name__ == "__main__":
     
@@ -0,0 +1,41 @@
+"""
+Construcción de los índices de búsqueda en segundo plano al abrir la aplicación.
+"""
+import traceback
+from PySide2.QtCore import QThread, Signal
+
+
+class CalentamientoIndices(QThread):
+    """
+    Ejecuta en orden los pasos de carga (empleados, índice de códigos, vales
+    registrados...) sin bloquear la interfaz.
+
+    Cada paso es una función sin argumentos que solo lee y retorna su resultado;
+    el resultado se entrega con 'paso_listo' para que la ventana lo aplique en su
+    propio hilo. Si un paso falla, los siguientes no se ejecutan.
+    """
+    progreso = Signal(int, int, str)   # Pasos completados, total de pasos, descripción del paso actual
+    paso_listo = Signal(str, object)   # Nombre del paso, resultado
+    terminado = Signal(bool, str)      # Éxito, mensaje
+
+    def __init__(self, pasos):
+        """
+        Args:
+            pasos (list): Tuplas (nombre, descripción, función).
+        """
+        super().__init__()
+        self.pasos = list(pasos)
+
+    def run(self):
+        total = len(self.pasos)
+        for completados, (nombre, descripcion, funcion) in enumerate(self.pasos):
+            self.progreso.emit(completados, total, descripcion)
+            try:
+                resultado = funcion()
+            except Exception as e:
+                traceback.print_exc()
+                self.terminado.emit(False, f"{descripcion} {e}")
+                return
+            self.paso_listo.emit(nombre, resultado)
+        self.progreso.emit(total, total, "Índices listos")
+        self.terminado.emit(True, "Índices listos")
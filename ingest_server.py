@@ -0,0 +1,287 @@
+"""
+Servicio de ingesta de códigos para estaciones remotas.
+
+Las estaciones de escaneo livianas envían sus códigos por HTTP a un solo equipo
+central, en lugar de abrir cada una el Excel compartido. El servicio valida los
+códigos con la misma lógica que la ventana principal (RegistroVales) y junta
+los envíos de todas las conexiones en escrituras agrupadas del diario.
+
+Solo usa la biblioteca estándar (http.server, con conexiones keep-alive).
+
+API:
+    POST /vales   {"empleado": "123", "codigos": ["...", "..."]}
+                  o {"entradas": [{"codigo": "...", "empleado": "123"}, ...]}
+               -> {"registrados": n, "resultados": [{"codigo", "estado", "mensaje", "id_vale"}, ...]}
+    GET  /estado  -> {"estacion", "codigos_indice", "vales_registrados", "pendientes"}
+
+Uso:
+    python ingest_server.py --host 0.0.0.0 --port 8765
+"""
+import sys
+import json
+import signal
+import argparse
+import threading
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from estacion_vales import EstacionVales, log
+from cola_lotes import ColaLotes
+from registro_vales import ResultadoEscaneo, procesar_cola
+
+
+class SolicitudIngesta:
+    """Un envío de una conexión: sus entradas y, cuando se procesan, sus resultados."""
+
+    def __init__(self, entradas):
+        self.entradas = entradas  # Lista de (código, empleado)
+        self.resultados = None
+        self.listo = threading.Event()
+
+
+class ServicioIngesta:
+    """
+    Recibe envíos de varias conexiones y los registra en confirmaciones agrupadas.
+
+    Cada envío entra a una ColaLotes; un único hilo toma todos los envíos que
+    llegaron casi a la vez, sincroniza con las otras estaciones una vez, registra
+    todas sus entradas con una sola escritura del diario y despierta a cada
+    conexión con sus propios resultados.
+    """
+
+    def __init__(self, estacion, lote=32, espera=0.02, timeout=30):
+        """
+        Args:
+            estacion (EstacionVales): Estado de la estación central.
+            lote (int): Máximo de envíos por confirmación.
+            espera (float): Segundos que se esperan a más envíos antes de confirmar.
+            timeout (float): Segundos máximos que una conexión espera sus resultados.
+        """
+        self.estacion = estacion
+        self.timeout = timeout
+        self._cola = ColaLotes(lote, espera)
+        self._hilo = None
+
+    def iniciar(self):
+        self.estacion.iniciar()
+        self._hilo = threading.Thread(target=self._bucle, name="ServicioIngesta", daemon=True)
+        self._hilo.start()
+
+    def registrar(self, entradas):
+        """
+        Encola un envío y espera sus resultados.
+
+        Raises:
+            TimeoutError: Si el envío no se procesó a tiempo.
+        """
+        solicitud = SolicitudIngesta(entradas)
+        self._cola.poner(solicitud)
+        if not solicitud.listo.wait(self.timeout):
+            raise TimeoutError("El registro de los vales tardó demasiado.")
+        return solicitud.resultados
+
+    def _bucle(self):
+        procesar_cola(self._cola, self.estacion.registro, self._entregar,
+                      entradas_de=lambda solicitudes: [e for solicitud in solicitudes for e in solicitud.entradas],
+                      sincronizar=self.estacion.sincronizar, medir=self.estacion.latencias.medir,
+                      etapa="lote_ingesta", avisar=log)
+
+    def _entregar(self, solicitudes, resultados):
+        """Despierta a cada conexión con sus propios resultados (siempre, aunque algo falle)."""
+        try:
+            registrados = sum(1 for r in resultados if r.valido)
+            log(f"Ingesta: {len(solicitudes)} envíos, {len(resultados)} códigos, {registrados} vales registrados.")
+            inicio = 0
+            for solicitud in solicitudes:
+                fin = inicio + len(solicitud.entradas)
+                solicitud.resultados = resultados[inicio:fin]
+                inicio = fin
+        finally:
+            # Si algo falló, una conexión sin resultados recibe ERROR en vez de esperar hasta el timeout
+            for solicitud in solicitudes:
+                if solicitud.resultados is None:
+                    solicitud.resultados = [
+                        ResultadoEscaneo(codigo, ResultadoEscaneo.ERROR, f"No se pudo procesar '{codigo}'.")
+                        for codigo, _ in solicitud.entradas
+                    ]
+                solicitud.listo.set()
+
+    def estado(self):
+        return {
+            "estacion": self.estacion.estacion,
+            "codigos_indice": len(self.estacion.code_index),
+            "vales_registrados": len(self.estacion.vales_registrados),
+            "pendientes": self._cola.pendientes(),
+        }
+
+    def detener(self):
+        """Confirma los envíos en cola y cierra la estación."""
+        self._cola.cerrar()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
+        self.estacion.cerrar()
+
+
+def _entradas_de(datos):
+    """
+    Convierte el cuerpo de un POST /vales en una lista de (código, empleado).
+
+    Raises:
+        ValueError: Si el cuerpo no tiene el formato esperado.
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("Se esperaba un objeto JSON.")
+    if "entradas" in datos:
+        if not isinstance(datos["entradas"], list):
+            raise ValueError("'entradas' debe ser una lista.")
+        entradas = []
+        for entrada in datos["entradas"]:
+            if not isinstance(entrada, dict) or not entrada.get("codigo") or not entrada.get("empleado"):
+                raise ValueError("Cada entrada debe tener 'codigo' y 'empleado'.")
+            entradas.append((str(entrada["codigo"]).strip(), str(entrada["empleado"])))
+        return entradas
+    empleado = datos.get("empleado")
+    codigos = datos.get("codigos")
+    if not empleado or not isinstance(codigos, list):
+        raise ValueError("Se esperaba 'empleado' y una lista 'codigos', o una lista 'entradas'.")
+    return [(str(codigo).strip(), str(empleado)) for codigo in codigos if str(codigo).strip()]
+
+
+def _resultado_a_dict(resultado):
+    return {
+        "codigo": resultado.codigo,
+        "estado": resultado.estado,
+        "mensaje": resultado.mensaje,
+        "id_vale": resultado.vale_row[0] if resultado.valido else None,
+    }
+
+
+class ManejadorIngesta(BaseHTTPRequestHandler):
+    """Manejador HTTP/1.1: una conexión puede enviar muchos lotes (keep-alive)."""
+
+    protocol_version = "HTTP/1.1"
+    servicio = None            # ServicioIngesta, asignado por crear_servidor()
+    max_cuerpo = 1024 * 1024   # Bytes máximos por envío
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        if self.path == "/estado":
+            self._responder(200, self.servicio.estado())
+        else:
+            self._responder(404, {"error": "Ruta no encontrada."})
+
+    def do_POST(self):
+        if self.path != "/vales":
+            self._responder(404, {"error": "Ruta no encontrada."})
+            return
+        try:
+            largo = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            largo = -1
+        if largo < 0 or largo > self.max_cuerpo:
+            self.close_connection = True
+            self._responder(413 if largo > 0 else 400, {"error": "Largo del cuerpo inválido."})
+            return
+
+        try:
+            entradas = _entradas_de(json.loads(self.rfile.read(largo) or b"null"))
+        except ValueError as e:  # Incluye json.JSONDecodeError
+            self._responder(400, {"error": str(e)})
+            return
+
+        try:
+            resultados = self.servicio.registrar(entradas) if entradas else []
+        except TimeoutError as e:
+            self._responder(503, {"error": str(e)})
+            return
+        self._responder(200, {
+            "registrados": sum(1 for r in resultados if r.valido),
+            "resultados": [_resultado_a_dict(r) for r in resultados],
+        })
+
+    def log_message(self, formato, *args):
+        pass  # Cada lote ya se registra en el log del servicio
+
+
+def crear_servidor(servicio, host="127.0.0.1", port=8765):
+    """Crea (sin arrancar) el servidor HTTP del servicio. port=0 elige un puerto libre."""
+    manejador = type("ManejadorIngestaServicio", (ManejadorIngesta,), {"servicio": servicio})
+    servidor = ThreadingHTTPServer((host, port), manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+class ClienteIngesta:
+    """Cliente para una estación remota: reutiliza la misma conexión entre envíos."""
+
+    def __init__(self, host, port=8765, timeout=30):
+        self._conexion = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def enviar(self, codigos, empleado_id):
+        """
+        Envía un lote de códigos de un empleado.
+
+        Returns:
+            dict: Respuesta del servicio ({"registrados", "resultados"}).
+
+        Raises:
+            RuntimeError: Si el servicio responde con un error.
+        """
+        cuerpo = json.dumps({"empleado": empleado_id, "codigos": list(codigos)}).encode("utf-8")
+        self._conexion.request("POST", "/vales", body=cuerpo, headers={"Content-Type": "application/json"})
+        respuesta = self._conexion.getresponse()
+        datos = json.loads(respuesta.read().decode("utf-8"))
+        if respuesta.status != 200:
+            raise RuntimeError(datos.get("error", f"Error HTTP {respuesta.status}"))
+        return datos
+
+    def cerrar(self):
+        self._conexion.close()
+
+
+def _terminar(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recibe códigos de estaciones remotas y registra los vales.")
+    parser.add_argument("--excel", default="trabajos_database.xlsx", help="Archivo Excel de la base de datos.")
+    parser.add_argument("--estacion", default=None, help="Nombre de la estación (archivo del diario).")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección de escucha (0.0.0.0 para aceptar otras estaciones).")
+    parser.add_argument("--port", type=int, default=8765, help="Puerto de escucha.")
+    args = parser.parse_args(argv)
+
+    try:
+        estacion = EstacionVales(args.excel, args.estacion, sufijo="ingesta")
+    except (OSError, ValueError, KeyError) as e:
+        log(f"ERROR: {e}")
+        return 1
+
+    servicio = ServicioIngesta(estacion)
+    servicio.iniciar()
+    servidor = crear_servidor(servicio, args.host, args.port)
+    log(f"Ingesta '{estacion.estacion}' escuchando en http://{args.host}:{servidor.server_address[1]} "
+        f"({len(estacion.code_index)} códigos, {len(estacion.vales_registrados)} vales registrados).")
+
+    signal.signal(signal.SIGTERM, _terminar)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servicio.detener()
+        log("Ingesta detenida.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Lectura de tiquetes desde un CSV para crearlos por lotes al inicio de una producción.
+"""
+import csv
+import re
+
+TALLAS = range(33, 49)
+
+# Encabezados aceptados (en minúsculas) para cada dato del tiquete
+COLUMNAS_TIQUETE = {
+    "ticket_number": ("ticket", "tiquete", "número ticket", "numero ticket", "n° ticket", "no. ticket"),
+    "referencia": ("referencia", "ref"),
+    "color": ("color",),
+    "tallas": ("tallas", "tallaje"),
+}
+
+# Talla y cantidad dentro de la columna 'tallas': "35:2 36:3", "35=2;36=3", "35x2"...
+_PATRON_TALLA = re.compile(r"(\d{2})\s*[:=xX]\s*(\d+)")
+
+
+def _leer_tallas(texto):
+    """Diccionario talla -> cantidad de un texto como '35:2 36:3', o None si tiene basura."""
+    pares = _PATRON_TALLA.findall(texto)
+    if _PATRON_TALLA.sub("", texto).strip(" ,;|/\t") != "":
+        return None
+    tallas = {}
+    for talla, cantidad in pares:
+        tallas[talla] = tallas.get(talla, 0) + int(cantidad)
+    return tallas
+
+
+def leer_tiquetes_csv(path, work_types=()):
+    """
+    Lee tiquetes de un CSV con encabezado.
+
+    Columnas: Ticket, Referencia, Color y las tallas, ya sea en una columna
+    'Tallas' ("35:2 36:3 37:1") o en una columna por talla ('33' ... '48' o
+    'Cant_T33' ... 'Cant_T48'). Opcionalmente 'Valor <tipo de trabajo>' para
+    cada tipo de 'work_types'. El separador (',', ';' o tabulador) se detecta solo.
+
+    Returns:
+        tuple: (tiquetes, errores). Cada tiquete es un diccionario como el de
+               _collect_ticket_data más 'valores_trabajo'; cada error es
+               (número de línea, mensaje). Las filas con errores no se incluyen.
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        contenido = f.read()
+    if not contenido.strip():
+        return [], []
+
+    try:
+        dialecto = csv.Sniffer().sniff(contenido[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(contenido.splitlines(), dialecto)
+    encabezado = [c.strip().lower() for c in next(lector, [])]
+
+    columnas = {}
+    for campo, nombres in COLUMNAS_TIQUETE.items():
+        columnas[campo] = next((encabezado.index(n) for n in nombres if n in encabezado), None)
+    columnas_talla = {}
+    for talla in TALLAS:
+        for nombre in (str(talla), f"cant_t{talla}", f"t{talla}"):
+            if nombre in encabezado:
+                columnas_talla[str(talla)] = encabezado.index(nombre)
+                break
+    columnas_valor = {wt: encabezado.index(f"valor {wt}".lower())
+                      for wt in work_types if f"valor {wt}".lower() in encabezado}
+
+    faltantes = [campo for campo in ("ticket_number", "referencia", "color") if columnas[campo] is None]
+    if faltantes or (columnas["tallas"] is None and not columnas_talla):
+        raise ValueError("El CSV debe tener las columnas Ticket, Referencia, Color y Tallas "
+                         "(o una columna por talla, de 33 a 48).")
+
+    def celda(fila, indice):
+        return fila[indice].strip() if indice is not None and indice < len(fila) else ""
+
+    tiquetes = []
+    errores = []
+    vistos = set()
+    for linea, fila in enumerate(lector, start=2):
+        if not any(c.strip() for c in fila):
+            continue
+        ticket_number = celda(fila, columnas["ticket_number"])
+        referencia = celda(fila, columnas["referencia"])
+        color = celda(fila, columnas["color"])
+        if not all([ticket_number, referencia, color]):
+            errores.append((linea, "Faltan Ticket, Referencia o Color."))
+            continue
+        if ticket_number in vistos:
+            errores.append((linea, f"El tiquete {ticket_number} está repetido en el archivo."))
+            continue
+
+        tallas_cantidades = {}
+        if columnas["tallas"] is not None:
+            tallas_cantidades = _leer_tallas(celda(fila, columnas["tallas"]))
+            if tallas_cantidades is None:
+                errores.append((linea, "La columna Tallas debe tener el formato '35:2 36:3'."))
+                continue
+        cantidades_invalidas = False
+        for talla, indice in columnas_talla.items():
+            texto = celda(fila, indice)
+            if not texto:
+                continue
+            if not texto.isdigit():
+                cantidades_invalidas = True
+                break
+            tallas_cantidades[talla] = tallas_cantidades.get(talla, 0) + int(texto)
+        fuera_de_rango = [t for t in tallas_cantidades if int(t) not in TALLAS]
+        tallas_cantidades = {t: c for t, c in tallas_cantidades.items() if c > 0}
+        if cantidades_invalidas or fuera_de_rango:
+            errores.append((linea, "Las tallas deben ir de 33 a 48 con cantidades enteras positivas."))
+            continue
+        if not tallas_cantidades:
+            errores.append((linea, "El tiquete no tiene cantidad para ninguna talla."))
+            continue
+
+        valores_trabajo = {}
+        valores_invalidos = False
+        for work_type, indice in columnas_valor.items():
+            texto = celda(fila, indice).replace(",", ".")
+            if not texto:
+                continue
+            try:
+                valores_trabajo[work_type] = float(texto)
+            except ValueError:
+                valores_invalidos = True
+                break
+        if valores_invalidos:
+            errores.append((linea, "Los valores por tipo de trabajo deben ser numéricos."))
+            continue
+
+        vistos.add(ticket_number)
+        tiquetes.append({
+            "ticket_number": ticket_number,
+            "referencia": referencia,
+            "color": color,
+            "tallas_cantidades": dict(sorted(tallas_cantidades.items())),
+            "valores_trabajo": valores_trabajo,
+        })
+    return tiquetes, errores
+
+
+# --- BLOQUE DE TESTEO (main) ---
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "tiquetes.csv")
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write("Ticket;Referencia;Color;Tallas;Valor Corte\n"
+                    "900;BOTIN-DAMA;MIEL;35:2 36:3;1500\n"
+                    "901;ZAPATO;NEGRO;50:1;\n"
+                    "902;ZAPATO;NEGRO;;\n"
+                    "900;BOTIN-DAMA;MIEL;35:1;\n")
+        tiquetes, errores = leer_tiquetes_csv(ruta, work_types=("Corte",))
+        print(tiquetes)
+        print(errores)
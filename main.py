@@ -5,6 +5,10 @@ import uuid
 import traceback
 import datetime as dt
 import time
+import socket
+import subprocess
+import threading
+import multiprocessing
 import pandas as pd
 
 from openpyxl import Workbook, load_workbook
@@ -22,13 +26,26 @@ from PySide2.QtWidgets import *
 from openpyxl.styles import Font, PatternFill, Alignment
 
 from PySide2.QtWidgets import QTableView, QVBoxLayout
-from PySide2.QtGui import QStandardItemModel
+from vale_table_model import ValeTableModel
 
-from generate_pdf import generate_vale_pdf
+from generate_pdf import generate_vale_pdf, generate_vales_pdf_lote
+from generateCodes import generate_serial_code
+from lote_tiquetes import leer_tiquetes_csv
 
 from utils import validate_cedula, display_code_image
 
-from config import TIPOS_DE_TRABAJO, WORK_TYPE_ABBREVIATIONS, CAMPOS_VALOR_TRABAJO_MAP    
+from config import TIPOS_DE_TRABAJO, WORK_TYPE_ABBREVIATIONS, CAMPOS_VALOR_TRABAJO_MAP, COLUMNAS_NUMERICAS_TRABAJOS
+from code_index import construir_indice_trabajos
+from registered_codes import RegisteredCodes
+from vale_journal import ValeJournal
+from workbook_session import WorkbookSession
+from vales_store import ValesShardStore
+from columnar_snapshot import ColumnarSnapshot
+from schema_migration import necesita_migracion, migrar_cabecera
+from registro_vales import RegistroVales, ResultadoEscaneo
+from scan_worker import ScanWorker
+from latencias import MedidorLatencias
+from index_warmup import CalentamientoIndices
 # GUI FILE
 from app_modules import *
 from vales_card import ValeCard, DropColumnWidget
@@ -46,6 +63,18 @@ DATOS_VALES = [
     {"ticket": "T007", "referencia": "REF-G", "color": "Gris", "total": 90, "estado": "impreso", "Satelite": False},
 ]
 class MainWindow(QMainWindow):
+    # Fondo de las filas del modo ráfaga según el resultado del escaneo
+    COLORES_ESTADO_ESCANEO = {
+        ResultadoEscaneo.REGISTRADO: "#2e7d32",
+        ResultadoEscaneo.CODIGO_INVALIDO: "#a33a3a",
+        ResultadoEscaneo.YA_REGISTRADO: "#b07d00",
+        ResultadoEscaneo.REPETIDO_EN_LOTE: "#b07d00",
+        ResultadoEscaneo.NO_ENCONTRADO: "#a33a3a",
+        ResultadoEscaneo.DATOS_INCOMPLETOS: "#a33a3a",
+        ResultadoEscaneo.ERROR: "#a33a3a",
+        ResultadoEscaneo.ANULADO: "#5f5f5f",
+    }
+
     def __init__(self):
         QMainWindow.__init__(self)
         self.ui = Ui_MainWindow()
@@ -67,12 +96,15 @@ class MainWindow(QMainWindow):
         
         # Setup barcode generator functionality
         self.setup_code_generator()
+
+        # Setup vale journal (registro inmediato + compactación en segundo plano)
+        self.setup_vale_journal()
         
         # Setup code reader functionality
         self.setup_code_reader()
         
-        # Setup employee management
-        self.setup_employee_management()
+        # Setup employee management (los empleados se cargan con el calentamiento de índices)
+        self.setup_employee_management(cargar_empleados=False)
 
         # Conectar el botón de eliminarTODO (agregar esta línea)
         self.setup_eliminar_todo_button()
@@ -83,7 +115,13 @@ class MainWindow(QMainWindow):
         # Setup add employee button
         self.setup_add_employee_button()
 
-        self.autocompletado_manager = AutocompletadoManager(excel_path=self.excel_path, sheet_name="Trabajos")
+        # Panel de latencias del escaneo en la página de Configuración
+        self.setup_panel_latencias()
+
+        self.autocompletado_manager = AutocompletadoManager(
+            excel_path=self.excel_path, sheet_name="Trabajos",
+            session=self.workbook_session, snapshot_dir=self.trabajos_snapshot_dir
+        )
         self.datos_vales = DATOS_VALES # O cárgalos desde tu Excel aquí
 
         self.setup_autocompletado_fields()
@@ -93,6 +131,10 @@ class MainWindow(QMainWindow):
         # Show t    he window
         self.show()
 
+        # Índices de búsqueda en segundo plano: la ventana aparece de inmediato
+        # y los escaneos quedan en espera hasta que terminen
+        self.iniciar_calentamiento_indices()
+
 
     def setup_code_reader(self):
         """Setup the code reader functionality and TableView inside WidgetTabla"""
@@ -110,6 +152,25 @@ class MainWindow(QMainWindow):
         else:
             print("ERROR: codeReaderInput no encontrado en UI")
             return
+
+        # Escaneos recibidos antes de que terminen de construirse los índices
+        self._escaneos_en_espera = []
+
+        # Latencia de cada etapa del escaneo (percentiles en la página de Configuración)
+        self.latencias = MedidorLatencias(
+            json_path=f"{os.path.splitext(self.excel_path)[0]}_latencias_{self.estacion}.json"
+        )
+
+        # Validación y registro de vales, compartidos por el escaneo normal y el modo ráfaga
+        self.registro_vales = RegistroVales(lambda: self.code_index, self.vales_registrados, self.vale_journal,
+                                            medidor=self.latencias)
+        # La sincronización con otras estaciones se hace solo en el hilo de la interfaz
+        # (sincronizar_estaciones), también antes de encolar en modo ráfaga
+        self._sincronizacion_lock = threading.Lock()
+        self._ultima_sincronizacion = 0.0
+        self.scan_worker = ScanWorker(self.registro_vales, medidor=self.latencias)
+        self.scan_worker.procesados.connect(self.mostrar_resultados_escaneo)
+        self.scan_worker.start()
         
         # Access the WidgetTabla from UI and setup table
         if hasattr(self.ui, 'WidgetTabla'):
@@ -132,11 +193,10 @@ class MainWindow(QMainWindow):
                 self.ui.tableViewVale.setMinimumHeight(200)
                 
                 # Create the model for the table
-                self.table_model = QStandardItemModel()
                 # Definir encabezados: fijos + dinámicos basados en WORK_TYPE_ABBREVIATIONS
-                fixed_headers = ["Código Serial", "Número Ticket", "Referencia", "Color", "Total Producido"]
+                fixed_headers = ["Código Serial", "Número Ticket", "Referencia", "Tipo Trabajo", "Color", "Total Producido"]
                 valor_headers = [f"Valor {work_type}" for work_type in WORK_TYPE_ABBREVIATIONS.keys()]
-                self.table_model.setHorizontalHeaderLabels(fixed_headers + valor_headers)
+                self.table_model = ValeTableModel(fixed_headers + valor_headers)
                 
                 # Set model and adjust view
                 self.ui.tableViewVale.setModel(self.table_model)
@@ -148,6 +208,23 @@ class MainWindow(QMainWindow):
                 # Add TableView to WidgetTabla's layout
                 table_layout.addWidget(self.ui.tableViewVale)
                 print("tableViewVale creado y agregado")
+
+                # Modo ráfaga: los escaneos se encolan y los resultados aparecen como filas de color
+                self.ui.checkModoRafaga = QCheckBox("Modo ráfaga (escaneo continuo, sin mensajes)", self.ui.WidgetTabla)
+                self.ui.checkModoRafaga.toggled.connect(lambda _: self.ui.codeReaderInput.setFocus())
+                table_layout.insertWidget(0, self.ui.checkModoRafaga)
+
+                # Importación de códigos recogidos sin conexión (texto o CSV)
+                self.ui.btnImportarCodigos = QPushButton("Importar códigos desde archivo...", self.ui.WidgetTabla)
+                self.ui.btnImportarCodigos.clicked.connect(self.importar_codigos_archivo)
+                table_layout.insertWidget(1, self.ui.btnImportarCodigos)
+
+                # Anulación del vale seleccionado (o del último) sin editar la hoja a mano
+                self.ui.btnAnularVale = QPushButton("Anular vale seleccionado (Ctrl+Z: último)", self.ui.WidgetTabla)
+                self.ui.btnAnularVale.clicked.connect(self.anular_vale_seleccionado)
+                table_layout.insertWidget(2, self.ui.btnAnularVale)
+                self.atajo_anular = QShortcut(QKeySequence("Ctrl+Z"), self)
+                self.atajo_anular.activated.connect(lambda: self.anular_vale_seleccionado(ultimo=True))
             else:
                 print("tableViewVale ya existe")
         else:
@@ -190,32 +267,70 @@ class MainWindow(QMainWindow):
             "WorkTypeDetected"
         ]
 
+        # Copia columnar de "Trabajos" junto al Excel, regenerada en cada guardado
+        self.trabajos_snapshot_dir = os.path.splitext(self.excel_path)[0] + "_trabajos.snapshot"
+        self.trabajos_columnas_numericas = list(COLUMNAS_NUMERICAS_TRABAJOS)
+
+        # Sesión única del libro, compartida por toda la ventana. Esta aplicación sigue
+        # sobre el .xlsx compartido en red (SQLiteHandler solo se usa en new_version)
+        if not hasattr(self, 'workbook_session'):
+            self.workbook_session = WorkbookSession(self.excel_path)
+            self.workbook_session.al_guardar(self._escribir_snapshot_trabajos)
+
         # Crear/Cargar Excel y verificar/actualizar cabeceras (Tu lógica existente)
-        if not os.path.exists(self.excel_path):
-            wb = Workbook()
-            ws_trabajos = wb.active
-            ws_trabajos.title = "Trabajos"
-            ws_trabajos.append(trabajos_headers)
-            ws_vales = wb.create_sheet(title=self.vales_sheet_name)
-            ws_vales.append(vales_headers)
-            wb.save(self.excel_path)
-        else:
-            wb = load_workbook(self.excel_path)
-            ws_trabajos = wb["Trabajos"]
-            current_headers = [cell.value for cell in ws_trabajos[1]]
-            if current_headers != trabajos_headers:
-                print("Actualizando cabeceras de la hoja 'Trabajos'...")
-                # Considera una migración más segura si ya hay datos
-                ws_trabajos.delete_rows(1)
-                ws_trabajos.insert_rows(1)
-                for col_idx, header in enumerate(trabajos_headers, 1):
-                    ws_trabajos.cell(row=1, column=col_idx).value = header
-                wb.save(self.excel_path)
-
-            if self.vales_sheet_name not in wb.sheetnames:
+        with self.workbook_session.lock:
+            if not os.path.exists(self.excel_path):
+                wb = Workbook()
+                ws_trabajos = wb.active
+                ws_trabajos.title = "Trabajos"
+                ws_trabajos.append(trabajos_headers)
                 ws_vales = wb.create_sheet(title=self.vales_sheet_name)
                 ws_vales.append(vales_headers)
-                wb.save(self.excel_path)
+                self.workbook_session.reemplazar(wb)
+            else:
+                # Comprobar cabeceras en modo lectura; el libro solo se abre para escribir si hace falta
+                current_headers = self.workbook_session.cabecera("Trabajos")
+                if necesita_migracion(current_headers, trabajos_headers):
+                    print("Actualizando cabeceras de la hoja 'Trabajos'...")
+                    # Las columnas se mueven por nombre en una sola pasada, sin cargar el libro completo;
+                    # el bloqueo evita que otra estación guarde mientras tanto
+                    with self.workbook_session.bloqueo_archivo:
+                        self.workbook_session.flush()
+                        resultado = migrar_cabecera(
+                            self.excel_path, "Trabajos", trabajos_headers,
+                            progreso=lambda filas: print(f"  {filas} filas migradas...")
+                        )
+                        self.workbook_session.descartar()
+                    print(f"Hoja 'Trabajos' migrada: {resultado['filas']} filas, "
+                          f"columnas nuevas: {', '.join(resultado['nuevas']) or 'ninguna'}.")
+                    if resultado["sin_nombre"]:
+                        QMessageBox.warning(
+                            self, "Columnas sin Nombre",
+                            f"La hoja 'Trabajos' tenía {resultado['sin_nombre']} columnas con datos pero sin "
+                            "encabezado. Se conservaron al final de la hoja, sin nombre; revíselas."
+                        )
+
+                if self.vales_sheet_name not in self.workbook_session.nombres_hojas():
+                    def crear_hoja_vales(wb):
+                        if self.vales_sheet_name not in wb.sheetnames:
+                            wb.create_sheet(title=self.vales_sheet_name).append(vales_headers)
+                    self.workbook_session.modificar(crear_hoja_vales)
+                    self.workbook_session.guardar()
+
+            # Los vales se guardan en un archivo por mes; la hoja "Vales" solo conserva la cabecera
+            if not hasattr(self, 'vales_store'):
+                self.vales_store = ValesShardStore(
+                    os.path.splitext(self.excel_path)[0] + "_vales", vales_headers, self.vales_sheet_name
+                )
+            self.vales_store.migrar_desde_hoja(self.workbook_session, self.vales_sheet_name)
+
+        # El índice de códigos y los vales registrados se construyen en segundo plano
+        # (iniciar_calentamiento_indices); save_to_excel mantiene el índice al día
+        self.indices_listos = False
+        self.code_index = None
+        self._filas_trabajos_en_espera = []  # Filas guardadas en 'Trabajos' antes de tener el índice
+        if not hasattr(self, 'vales_registrados'):
+            self.vales_registrados = RegisteredCodes()
 
         # Conectar botón (Tu lógica existente)
         if hasattr(self.ui, 'pushButtonGuardar'):
@@ -223,6 +338,13 @@ class MainWindow(QMainWindow):
         else:
             print("Advertencia: self.ui.pushButtonGuardar no encontrado.")
 
+        # Creación de muchos tiquetes a la vez desde un CSV (inicio de una producción)
+        if hasattr(self.ui, 'gridLayout_9') and not hasattr(self.ui, 'btnTiquetesCSV'):
+            self.ui.btnTiquetesCSV = QPushButton("Crear tiquetes desde CSV...", self.ui.page_widgets)
+            self.ui.btnTiquetesCSV.setMinimumSize(QSize(150, 30))
+            self.ui.btnTiquetesCSV.clicked.connect(self.crear_tiquetes_desde_csv)
+            self.ui.gridLayout_9.addWidget(self.ui.btnTiquetesCSV, 3, 0, 1, 1)
+
         # Configurar escena (Tu lógica existente)
         if hasattr(self.ui, 'PreviwImage'):
             if self.ui.PreviwImage.scene() is None:
@@ -230,41 +352,187 @@ class MainWindow(QMainWindow):
         else:
             print("Advertencia: self.ui.PreviwImage no encontrado.")
 
+    def _construir_indice_trabajos(self):
+        """
+        Construye el índice de códigos de 'Trabajos' (desde la copia columnar si está
+        al día, sin interpretar el XML).
+        """
+        self._version_indice, self.code_index = self._calcular_indice_trabajos()
+
+    def _calcular_indice_trabajos(self):
+        """Retorna (versión del libro, CodeIndex) sin asignarlos; se puede llamar desde otro hilo."""
+        with self.workbook_session.lock:
+            version = self.workbook_session.version_externa
+            return version, construir_indice_trabajos(
+                self.workbook_session, self.trabajos_snapshot_dir, self.trabajos_columnas_numericas
+            )
+
+    def _calcular_vales_registrados(self):
+        """
+        Conjunto de códigos que ya tienen vale: los de los archivos mensuales más los
+        que siguen en el diario. Se puede llamar desde otro hilo.
+        """
+        # Primero el diario: un vale que el compactador mueva entre ambas lecturas
+        # ya estará en los archivos mensuales cuando se lean
+        pendientes = self.vale_journal.pendientes()
+        vales_registrados = RegisteredCodes()
+        vales_registrados.construir_desde_valores(self.vales_store.codigos_actualizados(todos=True))
+        for fila in pendientes:
+            vales_registrados.agregar(fila[ValeJournal.CODIGO_SERIAL_IDX])
+        return vales_registrados
+
+    def iniciar_calentamiento_indices(self):
+        """
+        Carga en un hilo los empleados, el índice de códigos y los vales registrados,
+        con una barra de progreso en la parte inferior de la ventana. Mientras tanto
+        los escaneos se guardan en espera.
+        """
+        if getattr(self, 'calentamiento', None) is not None and self.calentamiento.isRunning():
+            return
+        self.indices_listos = False
+
+        if not hasattr(self.ui, 'progressCalentamiento'):
+            self.ui.progressCalentamiento = QProgressBar(self.ui.frame_label_bottom)
+            self.ui.progressCalentamiento.setMaximumWidth(320)
+            self.ui.progressCalentamiento.setMaximumHeight(14)
+            self.ui.progressCalentamiento.setStyleSheet("color: rgb(98, 103, 111);")
+            self.ui.horizontalLayout_7.addWidget(self.ui.progressCalentamiento)
+        self.ui.progressCalentamiento.setValue(0)
+        self.ui.progressCalentamiento.show()
+        if hasattr(self.ui, 'codeReaderInput'):
+            self.ui.codeReaderInput.setPlaceholderText("Cargando índice de códigos... (los escaneos quedan en espera)")
+
+        self.calentamiento = CalentamientoIndices([
+            ("empleados", "Cargando empleados...", self._leer_empleados),
+            ("indice", "Construyendo índice de códigos...", self._calcular_indice_trabajos),
+            ("vales", "Cargando vales registrados...", self._calcular_vales_registrados),
+        ])
+        self.calentamiento.progreso.connect(self.on_calentamiento_progreso)
+        self.calentamiento.paso_listo.connect(self.on_calentamiento_paso)
+        self.calentamiento.terminado.connect(self.on_calentamiento_terminado)
+        self.calentamiento.start()
+
+    def on_calentamiento_progreso(self, completados, total, descripcion):
+        barra = self.ui.progressCalentamiento
+        barra.setMaximum(total)
+        barra.setValue(completados)
+        en_espera = len(getattr(self, '_escaneos_en_espera', []))
+        barra.setFormat(f"{descripcion} ({en_espera} escaneos en espera)" if en_espera else descripcion)
+
+    def on_calentamiento_paso(self, nombre, resultado):
+        """Aplica en el hilo de la interfaz el resultado de un paso del calentamiento."""
+        if nombre == "empleados":
+            self._cargar_combo_empleados(resultado)
+        elif nombre == "indice":
+            self._version_indice, self.code_index = resultado
+            # Filas que se guardaron en 'Trabajos' mientras se construía el índice
+            for row_data in self._filas_trabajos_en_espera:
+                self.code_index.agregar_fila(row_data)
+            self._filas_trabajos_en_espera = []
+        elif nombre == "vales":
+            with self.registro_vales.lock:
+                self.vales_registrados = resultado
+                self.registro_vales.vales_registrados = resultado
+
+    def on_calentamiento_terminado(self, exito, mensaje):
+        """Habilita el escaneo y procesa los códigos que se escanearon mientras tanto."""
+        if hasattr(self.ui, 'codeReaderInput'):
+            self.ui.codeReaderInput.setPlaceholderText("Escanear o ingresar código aquí...")
+        if not exito:
+            self.ui.progressCalentamiento.setFormat("Error al cargar los índices")
+            QMessageBox.critical(self, "Error al Cargar Índices",
+                                 f"No se pudieron construir los índices de búsqueda:\n{mensaje}\n\n"
+                                 "Los escaneos seguirán en espera. Reinicie la aplicación.")
+            return
+
+        self.ui.progressCalentamiento.hide()
+        self.indices_listos = True
+        print(f"Índice de códigos construido: {len(self.code_index)} códigos, {len(self.vales_registrados)} vales registrados.")
+
+        # Los escaneos en espera se procesan como un lote del modo ráfaga (filas de color)
+        en_espera, self._escaneos_en_espera = self._escaneos_en_espera, []
+        for codigo, empleado_id in en_espera:
+            self.scan_worker.encolar(codigo, empleado_id)
+        if en_espera:
+            print(f"{len(en_espera)} escaneos en espera enviados a registro.")
+
+    INTERVALO_SINCRONIZACION = 2.0  # Segundos mínimos entre dos lecturas de la carpeta compartida
+
+    def sincronizar_estaciones(self, forzar=False):
+        """
+        Incorpora lo que otras estaciones escribieron en el archivo compartido:
+        códigos de vales nuevos o anulados y, si 'Trabajos' cambió, reconstruye el índice.
+
+        Recorre la carpeta de red (un listdir y un stat por mes), así que se hace
+        como mucho una vez cada INTERVALO_SINCRONIZACION segundos salvo con
+        forzar=True; un código repetido entre dos sincronizaciones lo descarta
+        igual la compactación (ValesShardStore.anexar). Solo se llama desde el hilo
+        de la interfaz; el lock evita dos sincronizaciones a la vez de todos modos.
+        """
+        if not self._sincronizacion_lock.acquire(blocking=False):
+            return  # Ya hay una sincronización en curso
+        try:
+            ahora = time.monotonic()
+            if not forzar and ahora - self._ultima_sincronizacion < self.INTERVALO_SINCRONIZACION:
+                return
+            self._ultima_sincronizacion = ahora
+
+            anulados = [codigo for codigo in self.vales_store.codigos_anulados_actualizados()
+                        if not self.vale_journal.contiene_codigo(codigo)]
+            nuevos = self.vales_store.codigos_actualizados()
+            # El hilo del modo ráfaga consulta los códigos registrados con este lock
+            with self.registro_vales.lock:
+                for codigo in anulados:
+                    self.vales_registrados.quitar(codigo)
+                for codigo in nuevos:
+                    self.vales_registrados.agregar(codigo)
+            self.workbook_session.cambio_externo()
+            if self.workbook_session.version_externa != self._version_indice:
+                print("Otra estación modificó 'Trabajos'; actualizando índice de códigos...")
+                self._construir_indice_trabajos()
+        finally:
+            self._sincronizacion_lock.release()
+
+    def _escribir_snapshot_trabajos(self, wb, firma):
+        """Regenera la copia columnar de 'Trabajos' tras cada guardado del Excel."""
+        if "Trabajos" not in wb.sheetnames:
+            return
+        filas = wb["Trabajos"].iter_rows(values_only=True)
+        headers = next(filas, ())
+        ColumnarSnapshot.escribir(self.trabajos_snapshot_dir, headers, filas,
+                                  self.trabajos_columnas_numericas, firma)
+
+    def setup_vale_journal(self):
+        """
+        Crea el diario de vales y arranca su compactador. Los vales escaneados se
+        anexan al diario (rápido y durable) y se pasan a los archivos mensuales por lotes.
+        """
+        if hasattr(self, 'vale_journal'):
+            return
+        # Un diario por estación: varias estaciones pueden compartir la carpeta del Excel
+        self.estacion = os.environ.get("DRIVERQR_ESTACION") or socket.gethostname()
+        journal_path = f"{os.path.splitext(self.excel_path)[0]}_vales_{self.estacion}.jsonl"
+        diario_anterior = os.path.splitext(self.excel_path)[0] + "_vales.jsonl"
+        if os.path.exists(diario_anterior) and not os.path.exists(journal_path):
+            os.replace(diario_anterior, journal_path)
+        # Los vales que quedaron en el diario cuentan como registrados (ver _calcular_vales_registrados)
+        self.vale_journal = ValeJournal(journal_path=journal_path, store=self.vales_store)
+        self.vale_journal.iniciar()
+
     def save_to_excel(self, serial_codes, code_path, ticket_number, referencia, color, tallas_cantidades, total_producido_calculado, valores_trabajo):
         """
         Guarda los datos en la hoja 'Trabajos' del archivo Excel.
         """
         try:
-            wb = load_workbook(self.excel_path)
-            ws_trabajos = wb["Trabajos"]
-
-            # Crear una nueva fila con los datos
-            row_data = [
-                list(serial_codes.values())[0] if serial_codes else "",  # Código Serial (primer código generado)
-                ticket_number,
-                referencia,
-                color
-            ]
-            # Añadir cantidades por talla (33 a 48)
-            for i in range(33, 49):
-                row_data.append(tallas_cantidades.get(str(i), 0))
-            # Añadir total producido y valores por tipo de trabajo
-            row_data.append(total_producido_calculado)
-            # Añadir valores para cada tipo de trabajo según WORK_TYPE_ABBREVIATIONS
-            for work_type in WORK_TYPE_ABBREVIATIONS.keys():
-                row_data.append(valores_trabajo.get(work_type, 0))
-            # Añadir tipo de código y ruta de la imagen
-            row_data.extend([
-                self.current_code_type.upper(),  # Tipo Código
-                code_path  # Ruta Imagen
-            ])
-            # Añadir códigos seriales por tipo de trabajo
-            for work_type in WORK_TYPE_ABBREVIATIONS.keys():
-                row_data.append(serial_codes.get(work_type, ""))
+            row_data = self._fila_trabajos(serial_codes, code_path, ticket_number, referencia, color,
+                                           tallas_cantidades, total_producido_calculado, valores_trabajo)
 
             # Añadir la fila a la hoja "Trabajos"
-            ws_trabajos.append(row_data)
-            wb.save(self.excel_path)
+            self.workbook_session.anexar("Trabajos", row_data)
+            if self.code_index is not None:
+                self.code_index.agregar_fila(row_data)
+            else:
+                self._filas_trabajos_en_espera.append(row_data)
             return True
         except PermissionError as e:
             if e.errno == 13:  # Errno 13 is Permission Denied
@@ -279,15 +547,165 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Error", f"Error al guardar en Excel: {e}")
             return False
 
+    def _fila_trabajos(self, serial_codes, code_path, ticket_number, referencia, color, tallas_cantidades, total_producido_calculado, valores_trabajo):
+        """Fila de la hoja 'Trabajos' para un tiquete, en el orden de sus encabezados."""
+        # Crear una nueva fila con los datos
+        row_data = [
+            list(serial_codes.values())[0] if serial_codes else "",  # Código Serial (primer código generado)
+            ticket_number,
+            referencia,
+            color
+        ]
+        # Añadir cantidades por talla (33 a 48)
+        for i in range(33, 49):
+            row_data.append(tallas_cantidades.get(str(i), 0))
+        # Añadir total producido y valores por tipo de trabajo
+        row_data.append(total_producido_calculado)
+        # Añadir valores para cada tipo de trabajo según WORK_TYPE_ABBREVIATIONS
+        for work_type in WORK_TYPE_ABBREVIATIONS.keys():
+            row_data.append(valores_trabajo.get(work_type, 0))
+        # Añadir tipo de código y ruta de la imagen
+        row_data.extend([
+            self.current_code_type.upper(),  # Tipo Código
+            code_path  # Ruta Imagen
+        ])
+        # Añadir códigos seriales por tipo de trabajo
+        for work_type in WORK_TYPE_ABBREVIATIONS.keys():
+            row_data.append(serial_codes.get(work_type, ""))
+        return row_data
+
+    def guardar_trabajos_lote(self, filas):
+        """
+        Añade varias filas a 'Trabajos' en una sola transacción (un único cambio
+        del libro y un único guardado) y las agrega al índice de códigos.
+
+        Returns:
+            bool: True si quedaron escritas en disco. Si el archivo está abierto en
+                  otro programa las filas quedan en el libro en memoria y se
+                  reintenta el guardado más tarde (retorna False).
+        """
+        def anexar_filas(wb):
+            ws_trabajos = wb["Trabajos"]
+            for row_data in filas:
+                ws_trabajos.append(row_data)
+
+        self.workbook_session.modificar(anexar_filas)
+        for row_data in filas:
+            if self.code_index is not None:
+                self.code_index.agregar_fila(row_data)
+            else:
+                self._filas_trabajos_en_espera.append(row_data)
+        try:
+            self.workbook_session.flush()
+            return True
+        except PermissionError as e:
+            print(f"No se pudo guardar '{self.excel_path}' (¿abierto en otro programa?): {e}. Se reintentará.")
+            self.workbook_session.marcar_modificado()  # Reintento diferido, como en WorkbookSession._guardar_diferido
+            return False
+
+    def crear_tiquetes_desde_csv(self):
+        """
+        Crea de una vez los tiquetes de un CSV (Ticket, Referencia, Color, Tallas;
+        ver lote_tiquetes.leer_tiquetes_csv): genera sus seriales, guarda todas sus
+        filas de 'Trabajos' en una sola transacción y los imprime en un solo PDF.
+        """
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Crear tiquetes desde CSV", "", "CSV (*.csv *.txt);;Todos los archivos (*)"
+        )
+        if not path:
+            return
+
+        try:
+            tiquetes, errores = leer_tiquetes_csv(path, work_types=WORK_TYPE_ABBREVIATIONS.keys())
+        except Exception as e:
+            traceback.print_exc()
+            QMessageBox.critical(self, "Error de Lectura", f"No se pudo leer '{os.path.basename(path)}': {e}")
+            return
+
+        if errores:
+            muestra = "\n".join(f"Línea {linea}: {mensaje}" for linea, mensaje in errores[:20])
+            if len(errores) > 20:
+                muestra += f"\n... (+{len(errores) - 20})"
+            if not tiquetes:
+                QMessageBox.warning(self, "Tiquetes Inválidos", f"Ningún tiquete del archivo es válido.\n\n{muestra}")
+                return
+            respuesta = QMessageBox.question(
+                self, "Tiquetes con Errores",
+                f"{len(errores)} filas tienen errores y no se crearán:\n\n{muestra}\n\n"
+                f"¿Crear los {len(tiquetes)} tiquetes válidos?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+            if respuesta != QMessageBox.Yes:
+                return
+        elif not tiquetes:
+            QMessageBox.warning(self, "Archivo Vacío", "El archivo no contiene tiquetes.")
+            return
+
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            # --- Seriales (únicos frente a 'Trabajos' y dentro del lote) ---
+            usados = set()
+            filas = []
+            for tiquete in tiquetes:
+                serial_codes = {}
+                for work_type, abbr in WORK_TYPE_ABBREVIATIONS.items():
+                    serial_code = generate_serial_code(tiquete["ticket_number"], tiquete["referencia"], tiquete["color"],
+                                                       tiquete["tallas_cantidades"], abbr)
+                    while serial_code in usados or (self.code_index is not None and serial_code in self.code_index):
+                        serial_code = generate_serial_code(tiquete["ticket_number"], tiquete["referencia"], tiquete["color"],
+                                                           tiquete["tallas_cantidades"], abbr)
+                    usados.add(serial_code)
+                    serial_codes[work_type] = serial_code
+                tiquete["serials"] = serial_codes
+                filas.append(self._fila_trabajos(
+                    serial_codes, "", tiquete["ticket_number"], tiquete["referencia"], tiquete["color"],
+                    tiquete["tallas_cantidades"], sum(tiquete["tallas_cantidades"].values()),
+                    tiquete["valores_trabajo"]
+                ))
+
+            # --- Guardado en 'Trabajos' (antes del PDF: nada se imprime sin estar registrado) ---
+            guardado = self.guardar_trabajos_lote(filas)
+
+            # --- PDF único con todos los tiquetes ---
+            os.makedirs("codes", exist_ok=True)
+            output_filename = f"codes/vales_lote_{tiquetes[0]['ticket_number']}_{tiquetes[-1]['ticket_number']}.pdf"
+            pdf_path = generate_vales_pdf_lote(tiquetes, output_filename)
+        except Exception as e:
+            traceback.print_exc()
+            QMessageBox.critical(self, "Error", f"Error al crear los tiquetes: {e}")
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        aviso_guardado = "" if guardado else (
+            f"\n\nAdvertencia: '{os.path.basename(self.excel_path)}' está abierto en otro programa; "
+            "los tiquetes se guardarán en cuanto se pueda escribir el archivo."
+        )
+        if not pdf_path:
+            QMessageBox.critical(self, "Error",
+                                 f"Se registraron {len(tiquetes)} tiquetes, pero no se pudo generar el PDF.{aviso_guardado}")
+            return
+
+        QMessageBox.information(
+            self, "Operación Exitosa",
+            f"Se crearon {len(tiquetes)} tiquetes.\n\nArchivo guardado en: {pdf_path}{aviso_guardado}"
+        )
+
+        # Opcional: Abrir el PDF generado
+        try:
+            if sys.platform == "win32":
+                os.startfile(os.path.abspath(pdf_path))
+            else:
+                opener = "open" if sys.platform == "darwin" else "xdg-open"
+                subprocess.call([opener, os.path.abspath(pdf_path)])
+        except Exception as e:
+            print(f"No se pudo abrir el PDF automáticamente: {e}")
+
     def find_code_data(self, serial_code):
         """Find data related to a specific serial code in the Excel file"""
         try:
-            # Load Excel file
-            wb = load_workbook(self.excel_path)
-            ws = wb["Trabajos"]  # Explicitly use "Trabajos" sheet
-
-            # Obtener encabezados para buscar índices de columnas
-            headers = [cell.value for cell in ws[1]]
+            # Consulta de solo lectura: se recorre la hoja "Trabajos" en modo read_only
+            headers = self.workbook_session.cabecera("Trabajos")
             try:
                 serial_code_idx = headers.index("Código Serial")
                 num_ticket_idx = headers.index("Número Ticket")
@@ -305,7 +723,7 @@ class MainWindow(QMainWindow):
                 return None
 
             # Search for the serial code in the first column
-            for row in ws.iter_rows(min_row=2, values_only=True):
+            for row in self.workbook_session.filas("Trabajos", min_row=2):
                 if row[serial_code_idx] == serial_code:
                     # Construir diccionario de datos
                     data = {
@@ -726,165 +1144,209 @@ class MainWindow(QMainWindow):
         1. Genera un reporte consolidado por empleado y lo muestra en tableViewVale
         2. Crea hojas individuales por empleado con detalles completos y consolidados
         3. Maneja la nueva estructura donde cada vale tiene valores diferenciados por tipo de trabajo
+
+        La compactación del diario y el cálculo corren en un hilo; la tabla y los
+        mensajes se muestran al terminar, en el hilo de la interfaz y sin tener
+        tomado el libro (el modo ráfaga y el compactador siguen guardando).
+        """
+        if getattr(self, 'hilo_reportes', None) is not None and self.hilo_reportes.isRunning():
+            return
+        if hasattr(self.ui, 'btnActualizarDB'):
+            self.ui.btnActualizarDB.setEnabled(False)
+        self.hilo_reportes = CalentamientoIndices([
+            ("reportes", "Actualizando reportes de empleados...", self._calcular_reportes_empleados),
+        ])
+        self.hilo_reportes.paso_listo.connect(self.on_reportes_listos)
+        self.hilo_reportes.terminado.connect(self.on_reportes_terminado)
+        self.hilo_reportes.start()
+
+    def on_reportes_listos(self, nombre, resultado):
+        """Muestra en el hilo de la interfaz el reporte consolidado (o el aviso de por qué no se generó)."""
+        if "aviso" in resultado:
+            tipo, titulo, mensaje = resultado["aviso"]
+            if tipo == "info":
+                QMessageBox.information(self, titulo, mensaje)
+            else:
+                QMessageBox.warning(self, titulo, mensaje)
+            return
+
+        report_data = resultado["report_data"]
+        # PARTE 1: Actualizar la tabla de previsualización (reporte consolidado)
+        if hasattr(self.ui, 'tableViewVale') and hasattr(self, 'table_model'):
+            # Definir encabezados: fijos + dinámicos basados en WORK_TYPE_ABBREVIATIONS
+            fixed_headers = ["EmpleadoID", "Nombre", "Total Vales", "Total Valor"]
+            work_type_headers = list(WORK_TYPE_ABBREVIATIONS.keys())
+            self.table_model.configurar_columnas(fixed_headers + work_type_headers)
+
+            filas_reporte = []
+            for emp_id, data in report_data.items():
+                row_data = [
+                    emp_id,
+                    data["Nombre"],
+                    data["Total_Vales"],
+                    round(data["Total_Valor"], 2)
+                ] + [data["Trabajos"][work_type] for work_type in WORK_TYPE_ABBREVIATIONS.keys()]
+                filas_reporte.append(row_data)
+            self.table_model.agregar_filas(filas_reporte, indexar=False)
+
+            self.ui.tableViewVale.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            print("Reporte consolidado generado y mostrado en 'tableViewVale'.")
+        else:
+            print("Advertencia: No se pudo actualizar la tabla 'tableViewVale'.")
+
+        QMessageBox.information(
+            self, 
+            "Reportes Actualizados", 
+            f"Se han actualizado exitosamente:\n"
+            f"• Reporte consolidado mostrado en la tabla\n"
+            f"• {len(report_data)} hojas individuales de empleados\n"
+            f"• Consolidados semanales, mensuales y anuales"
+        )
+        print("Reportes de empleados actualizados con éxito (reporte consolidado + hojas individuales).")
+
+    def on_reportes_terminado(self, exito, mensaje):
+        if hasattr(self.ui, 'btnActualizarDB'):
+            self.ui.btnActualizarDB.setEnabled(True)
+        if not exito:
+            print(f"Error al generar los reportes de empleados: {mensaje}")
+            QMessageBox.critical(self, "Error", f"No se pudieron generar los reportes: {mensaje}")
+
+    def _calcular_reportes_empleados(self):
         """
+        Compacta el diario, calcula el reporte consolidado y escribe las hojas
+        'Empleado_*' (como delta del libro). Corre fuera del hilo de la interfaz:
+        no muestra mensajes, los retorna.
+
+        Returns:
+            dict: {"report_data": datos por empleado} o {"aviso": (tipo, título, mensaje)}.
+        """
+        # Pasar a los archivos mensuales los vales del diario para que el reporte los incluya todos
+        print("Actualizando reportes de empleados...")
+        self.vale_journal.compactar()
+        
+        # Verificar si existen las hojas necesarias (lectura sin abrir el libro para escritura)
+        if "Empleados" not in self.workbook_session.nombres_hojas():
+            return {"aviso": ("warning", "Error", "No se encontró la hoja 'Empleados' en el archivo Excel.")}
+
+        # Obtener información de empleados
+        empleados = {}
+        for row in self.workbook_session.filas("Empleados", min_row=2, max_col=5):
+            if len(row) >= 5 and row[4]:  # EmpleadoID existe
+                empleados[row[4]] = {
+                    "Nombre": row[0] or "Sin Nombre",
+                    "Cedula": row[1] or "",
+                    "Celular": row[2] or "",
+                    "Correo": row[3] or ""
+                }
+
+        if not empleados:
+            return {"aviso": ("info", "Info", "No hay empleados registrados en la base de datos.")}
+
+        # LEER Y PROCESAR DATOS DE VALES
+        vales_data = []
+        
+        # Obtener encabezados (los vales están en los archivos mensuales)
+        headers = self.vales_store.headers
+        
+        # Buscar índices de columnas importantes
         try:
-            print("Actualizando reportes de empleados...")
+            empleado_id_idx = headers.index("EmpleadoID")
+            fecha_idx = headers.index("FechaHora_Generacion")
+            valor_idx = headers.index("Suma_Valores_Trabajos")
+
+            id_col_name = "ID_Vale"
+            id_idx = headers.index(id_col_name) if id_col_name in headers else None
             
-            # Cargar el archivo Excel
-            wb = load_workbook(self.excel_path)
+            num_ticket_col_name = "Numero_Ticket_Asociado"
+            num_ticket_idx = headers.index(num_ticket_col_name) if num_ticket_col_name in headers else None
             
-            # Verificar si existen las hojas necesarias
-            if "Vales" not in wb.sheetnames or "Empleados" not in wb.sheetnames:
-                QMessageBox.warning(self, "Error", "No se encontraron las hojas 'Vales' o 'Empleados' en el archivo Excel.")
-                return
+            referencia_col_name = "Referencia_Asociada"
+            referencia_idx = headers.index(referencia_col_name) if referencia_col_name in headers else None
             
-            ws_vales = wb[self.vales_sheet_name]
-            ws_empleados = wb["Empleados"]
-
-            # Obtener información de empleados
-            empleados = {}
-            for row in ws_empleados.iter_rows(min_row=2, max_col=5, values_only=True):
-                if len(row) >= 5 and row[4]:  # EmpleadoID existe
-                    empleados[row[4]] = {
-                        "Nombre": row[0] or "Sin Nombre",
-                        "Cedula": row[1] or "",
-                        "Celular": row[2] or "",
-                        "Correo": row[3] or ""
-                    }
-
-            if not empleados:
-                QMessageBox.information(self, "Info", "No hay empleados registrados en la base de datos.")
-                return
-
-            # LEER Y PROCESAR DATOS DE VALES
-            vales_data = []
-            headers = []
+            talla_col_name = "Resumen_Tallas_Cantidades"
+            talla_idx = headers.index(talla_col_name) if talla_col_name in headers else None
             
-            # Obtener encabezados
-            for cell in ws_vales[1]:
-                headers.append(cell.value)
+            color_col_name = "Color_Trabajo"
+            color_idx = headers.index(color_col_name) if color_col_name in headers else None
             
-            # Buscar índices de columnas importantes
-            try:
-                empleado_id_idx = headers.index("EmpleadoID")
-                fecha_idx = headers.index("FechaHora_Generacion")
-                valor_idx = headers.index("Suma_Valores_Trabajos")
-
-                id_col_name = "ID_Vale"
-                id_idx = headers.index(id_col_name) if id_col_name in headers else None
-                
-                num_ticket_col_name = "Numero_Ticket_Asociado"
-                num_ticket_idx = headers.index(num_ticket_col_name) if num_ticket_col_name in headers else None
-                
-                referencia_col_name = "Referencia_Asociada"
-                referencia_idx = headers.index(referencia_col_name) if referencia_col_name in headers else None
-                
-                talla_col_name = "Resumen_Tallas_Cantidades"
-                talla_idx = headers.index(talla_col_name) if talla_col_name in headers else None
-                
-                color_col_name = "Color_Trabajo"
-                color_idx = headers.index(color_col_name) if color_col_name in headers else None
-                
-                total_producido_col_name = "Total_Producido_Trabajo"
-                total_producido_idx = headers.index(total_producido_col_name) if total_producido_col_name in headers else None
-                
-                codigo_serial_col_name = "Codigo_Serial_Trabajo_Asociado"
-                codigo_serial_idx = headers.index(codigo_serial_col_name) if codigo_serial_col_name in headers else None
-                
-                work_type_col_name = "WorkTypeDetected"
-                work_type_idx = headers.index(work_type_col_name) if work_type_col_name in headers else None
-
-            except ValueError as e:
-                QMessageBox.warning(self, "Error", f"Falta una columna esencial en 'Vales' para generar reportes: {e}")
-                return
+            total_producido_col_name = "Total_Producido_Trabajo"
+            total_producido_idx = headers.index(total_producido_col_name) if total_producido_col_name in headers else None
             
-            # Leer datos de vales
-            for row in ws_vales.iter_rows(min_row=2, values_only=True):
-                if len(row) > empleado_id_idx and row[empleado_id_idx]:
-                    vale_dict = {
-                        "empleado_id": row[empleado_id_idx],
-                        "fecha": row[fecha_idx] if fecha_idx < len(row) else None,
-                        "valor": row[valor_idx] if valor_idx < len(row) else None,
-                        "id": row[id_idx] if id_idx is not None and id_idx < len(row) else None,
-                        "num_ticket": row[num_ticket_idx] if num_ticket_idx is not None and num_ticket_idx < len(row) else None,
-                        "referencia": row[referencia_idx] if referencia_idx is not None and referencia_idx < len(row) else None,
-                        "talla": row[talla_idx] if talla_idx is not None and talla_idx < len(row) else None,
-                        "color": row[color_idx] if color_idx is not None and color_idx < len(row) else None,
-                        "total_producido": row[total_producido_idx] if total_producido_idx is not None and total_producido_idx < len(row) else None,
-                        "codigo_serial": row[codigo_serial_idx] if codigo_serial_idx is not None and codigo_serial_idx < len(row) else None,
-                        "work_type_detected": row[work_type_idx] if work_type_idx is not None and work_type_idx < len(row) else None
-                    }
-                    vales_data.append(vale_dict)
-
-            # Invertir WORK_TYPE_ABBREVIATIONS para mapear códigos a nombres completos
-            work_type_mapping = {v: k for k, v in WORK_TYPE_ABBREVIATIONS.items()}
-
-            # Inicializar datos del reporte consolidado
-            report_data = {}
-            for emp_id in empleados:
-                report_data[emp_id] = {
-                    "Nombre": empleados[emp_id]["Nombre"],
-                    "Total_Vales": 0,
-                    "Total_Valor": 0.0,
-                    "Trabajos": {work_type: 0 for work_type in WORK_TYPE_ABBREVIATIONS.keys()}
-                }
+            codigo_serial_col_name = "Codigo_Serial_Trabajo_Asociado"
+            codigo_serial_idx = headers.index(codigo_serial_col_name) if codigo_serial_col_name in headers else None
+            
+            work_type_col_name = "WorkTypeDetected"
+            work_type_idx = headers.index(work_type_col_name) if work_type_col_name in headers else None
 
-            # Procesar vales para el reporte consolidado
-            for vale in vales_data:
-                emp_id = vale["empleado_id"]
-                if emp_id in report_data:
-                    report_data[emp_id]["Total_Vales"] += 1
-                    
-                    if vale["valor"] is not None:
-                        try:
-                            valor = float(vale["valor"])
-                            report_data[emp_id]["Total_Valor"] += valor
-                        except (ValueError, TypeError):
-                            pass
-                    
-                    work_type = vale["work_type_detected"]
-                    if work_type and work_type in work_type_mapping:
-                        mapped_work_type = work_type_mapping[work_type]
-                        if mapped_work_type in report_data[emp_id]["Trabajos"]:
-                            report_data[emp_id]["Trabajos"][mapped_work_type] += 1
+        except ValueError as e:
+            return {"aviso": ("warning", "Error", f"Falta una columna esencial en 'Vales' para generar reportes: {e}")}
+        
+        # Leer datos de vales (el almacén ya omite los vales anulados)
+        for row in self.vales_store.filas():
+            if len(row) > empleado_id_idx and row[empleado_id_idx]:
+                vale_dict = {
+                    "empleado_id": row[empleado_id_idx],
+                    "fecha": row[fecha_idx] if fecha_idx < len(row) else None,
+                    "valor": row[valor_idx] if valor_idx < len(row) else None,
+                    "id": row[id_idx] if id_idx is not None and id_idx < len(row) else None,
+                    "num_ticket": row[num_ticket_idx] if num_ticket_idx is not None and num_ticket_idx < len(row) else None,
+                    "referencia": row[referencia_idx] if referencia_idx is not None and referencia_idx < len(row) else None,
+                    "talla": row[talla_idx] if talla_idx is not None and talla_idx < len(row) else None,
+                    "color": row[color_idx] if color_idx is not None and color_idx < len(row) else None,
+                    "total_producido": row[total_producido_idx] if total_producido_idx is not None and total_producido_idx < len(row) else None,
+                    "codigo_serial": row[codigo_serial_idx] if codigo_serial_idx is not None and codigo_serial_idx < len(row) else None,
+                    "work_type_detected": row[work_type_idx] if work_type_idx is not None and work_type_idx < len(row) else None
+                }
+                vales_data.append(vale_dict)
+
+        # Invertir WORK_TYPE_ABBREVIATIONS para mapear códigos a nombres completos
+        work_type_mapping = {v: k for k, v in WORK_TYPE_ABBREVIATIONS.items()}
+
+        # Inicializar datos del reporte consolidado
+        report_data = {}
+        for emp_id in empleados:
+            report_data[emp_id] = {
+                "Nombre": empleados[emp_id]["Nombre"],
+                "Total_Vales": 0,
+                "Total_Valor": 0.0,
+                "Trabajos": {work_type: 0 for work_type in WORK_TYPE_ABBREVIATIONS.keys()}
+            }
 
-            # PARTE 1: Actualizar la tabla de previsualización (reporte consolidado)
-            if hasattr(self.ui, 'tableViewVale') and hasattr(self, 'table_model'):
-                self.table_model.clear()
-                # Definir encabezados: fijos + dinámicos basados en WORK_TYPE_ABBREVIATIONS
-                fixed_headers = ["EmpleadoID", "Nombre", "Total Vales", "Total Valor"]
-                work_type_headers = list(WORK_TYPE_ABBREVIATIONS.keys())
-                self.table_model.setHorizontalHeaderLabels(fixed_headers + work_type_headers)
+        # Procesar vales para el reporte consolidado
+        for vale in vales_data:
+            emp_id = vale["empleado_id"]
+            if emp_id in report_data:
+                report_data[emp_id]["Total_Vales"] += 1
                 
-                for emp_id, data in report_data.items():
-                    row_data = [
-                        emp_id,
-                        data["Nombre"],
-                        data["Total_Vales"],
-                        round(data["Total_Valor"], 2)
-                    ] + [data["Trabajos"][work_type] for work_type in WORK_TYPE_ABBREVIATIONS.keys()]
-                    items = [QtGui.QStandardItem(str(value)) for value in row_data]
-                    self.table_model.appendRow(items)
+                if vale["valor"] is not None:
+                    try:
+                        valor = float(vale["valor"])
+                        report_data[emp_id]["Total_Valor"] += valor
+                    except (ValueError, TypeError):
+                        pass
                 
-                self.ui.tableViewVale.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-                print("Reporte consolidado generado y mostrado en 'tableViewVale'.")
-            else:
-                print("Advertencia: No se pudo actualizar la tabla 'tableViewVale'.")
-
-            # PARTE 2: Crear hojas individuales por empleado
+                work_type = vale["work_type_detected"]
+                if work_type and work_type in work_type_mapping:
+                    mapped_work_type = work_type_mapping[work_type]
+                    if mapped_work_type in report_data[emp_id]["Trabajos"]:
+                        report_data[emp_id]["Trabajos"][mapped_work_type] += 1
+
+        # PARTE 2: Crear hojas individuales por empleado (aquí sí se modifica el libro).
+        # Se aplica como delta, para rehacerla sobre la versión de otra estación si guardó antes.
+        def escribir_hojas_empleados(wb):
             for empleado_id, empleado_info in empleados.items():
                 vales_empleado = [vale for vale in vales_data if vale["empleado_id"] == empleado_id]
-                
+            
                 sheet_name = f"Empleado_{empleado_id}"
                 if sheet_name in wb.sheetnames:
                     del wb[sheet_name]
-                
+            
                 emp_ws = wb.create_sheet(title=sheet_name)
-                
+            
                 emp_ws['A1'] = "INFORMACIÓN DEL EMPLEADO"
                 emp_ws['A1'].font = Font(bold=True, size=14)
                 emp_ws.merge_cells('A1:F1')
-                
+            
                 emp_ws['A2'] = "Nombre:"
                 emp_ws['B2'] = empleado_info["Nombre"]
                 emp_ws['A3'] = "Cédula:"
@@ -895,23 +1357,23 @@ class MainWindow(QMainWindow):
                 emp_ws['B5'] = empleado_info["Correo"]
                 emp_ws['A6'] = "ID Empleado:"
                 emp_ws['B6'] = empleado_id
-                
+            
                 for row in range(2, 7):
                     emp_ws[f'A{row}'].font = Font(bold=True)
-                
+            
                 emp_ws['A8'] = "RESUMEN POR TIPO DE TRABAJO"
                 emp_ws['A8'].font = Font(bold=True, size=12)
                 emp_ws.merge_cells('A8:D8')
-                
+            
                 trabajo_resumen = {}
                 valor_total_general = 0
-                
+            
                 for vale in vales_empleado:
                     if vale["work_type_detected"] and vale["valor"] is not None:
                         trabajo = work_type_mapping.get(vale["work_type_detected"], vale["work_type_detected"])
                         if trabajo not in trabajo_resumen:
                             trabajo_resumen[trabajo] = {"cantidad": 0, "valor_total": 0}
-                        
+                    
                         trabajo_resumen[trabajo]["cantidad"] += 1
                         try:
                             valor = float(vale["valor"])
@@ -919,7 +1381,7 @@ class MainWindow(QMainWindow):
                             valor_total_general += valor
                         except (ValueError, TypeError):
                             print(f"Error al convertir valor '{vale['valor']}'")
-                
+            
                 headers_resumen = ["Tipo de Trabajo", "Cantidad de Vales", "Valor Total", "Promedio por Vale"]
                 for col, header in enumerate(headers_resumen, start=1):
                     cell = emp_ws.cell(row=9, column=col)
@@ -927,39 +1389,39 @@ class MainWindow(QMainWindow):
                     cell.font = Font(bold=True)
                     cell.fill = PatternFill(start_color="CCCCFF", end_color="CCCCFF", fill_type="solid")
                     cell.alignment = Alignment(horizontal='center')
-                
+            
                 row_idx = 10
                 for trabajo, datos in sorted(trabajo_resumen.items()):
                     emp_ws.cell(row=row_idx, column=1).value = trabajo
                     emp_ws.cell(row=row_idx, column=2).value = datos["cantidad"]
-                    
+                
                     valor_cell = emp_ws.cell(row=row_idx, column=3)
                     valor_cell.value = datos["valor_total"]
                     valor_cell.number_format = '#,##0'
-                    
+                
                     promedio_cell = emp_ws.cell(row=row_idx, column=4)
                     promedio = datos["valor_total"] / datos["cantidad"] if datos["cantidad"] > 0 else 0
                     promedio_cell.value = promedio
                     promedio_cell.number_format = '#,##0'
-                    
-                    row_idx += 1
                 
+                    row_idx += 1
+            
                 emp_ws.cell(row=row_idx, column=1).value = "TOTAL GENERAL:"
                 emp_ws.cell(row=row_idx, column=1).font = Font(bold=True)
                 emp_ws.cell(row=row_idx, column=2).value = sum(d["cantidad"] for d in trabajo_resumen.values())
                 emp_ws.cell(row=row_idx, column=2).font = Font(bold=True)
-                
+            
                 total_general_cell = emp_ws.cell(row=row_idx, column=3)
                 total_general_cell.value = valor_total_general
                 total_general_cell.font = Font(bold=True)
                 total_general_cell.number_format = '#,##0'
-                
+            
                 detalle_start_row = row_idx + 3
-                
+            
                 emp_ws.cell(row=detalle_start_row, column=1).value = "DETALLE DE VALES"
                 emp_ws.cell(row=detalle_start_row, column=1).font = Font(bold=True, size=12)
                 emp_ws.merge_cells(f'A{detalle_start_row}:J{detalle_start_row}')
-                
+            
                 headers_detalle = ["ID", "Fecha", "# Ticket", "Referencia", "Talla", 
                                 "Color", "Valor", "Total Producido", "Código Serial", "Trabajo"]
                 detalle_start_row += 1
@@ -969,11 +1431,11 @@ class MainWindow(QMainWindow):
                     cell.font = Font(bold=True)
                     cell.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
                     cell.alignment = Alignment(horizontal='center')
-                
+            
                 row_idx = detalle_start_row + 1
                 for vale in vales_empleado:
                     emp_ws.cell(row=row_idx, column=1).value = vale["id"]
-                    
+                
                     if vale["fecha"] is not None:
                         if isinstance(vale["fecha"], dt.datetime):
                             emp_ws.cell(row=row_idx, column=2).value = vale["fecha"].strftime("%Y-%m-%d")
@@ -981,52 +1443,41 @@ class MainWindow(QMainWindow):
                             emp_ws.cell(row=row_idx, column=2).value = str(vale["fecha"])
                     else:
                         emp_ws.cell(row=row_idx, column=2).value = "Sin fecha"
-                    
+                
                     emp_ws.cell(row=row_idx, column=3).value = vale["num_ticket"]
                     emp_ws.cell(row=row_idx, column=4).value = vale["referencia"]
                     emp_ws.cell(row=row_idx, column=5).value = vale["talla"]
                     emp_ws.cell(row=row_idx, column=6).value = vale["color"]
-                    
+                
                     valor_cell = emp_ws.cell(row=row_idx, column=7)
                     valor_cell.value = vale["valor"]
                     valor_cell.number_format = '#,##0'
-                    
+                
                     emp_ws.cell(row=row_idx, column=8).value = vale["total_producido"]
                     emp_ws.cell(row=row_idx, column=9).value = vale["codigo_serial"]
                     emp_ws.cell(row=row_idx, column=10).value = work_type_mapping.get(vale["work_type_detected"], vale["work_type_detected"])
-                    
-                    row_idx += 1
                 
+                    row_idx += 1
+            
                 last_row = row_idx
-                
+            
                 for col in range(1, 11):
                     emp_ws.column_dimensions[chr(64 + col)].width = 15
-                
-                self._create_consolidados(emp_ws, vales_empleado, last_row, work_type_mapping)
-
-            wb.save(self.excel_path)
             
-            QMessageBox.information(
-                self, 
-                "Reportes Actualizados", 
-                f"Se han actualizado exitosamente:\n"
-                f"• Reporte consolidado mostrado en la tabla\n"
-                f"• {len(empleados)} hojas individuales de empleados\n"
-                f"• Consolidados semanales, mensuales y anuales"
-            )
-            
-            print("Reportes de empleados actualizados con éxito (reporte consolidado + hojas individuales).")
-            
-        except Exception as e:
-            print(f"Error al generar los reportes de empleados: {e}")
-            traceback.print_exc()
-            QMessageBox.critical(self, "Error", f"No se pudieron generar los reportes: {e}")
+                self._create_consolidados(emp_ws, empleado_id, last_row, work_type_mapping)
+
+        self.workbook_session.modificar(escribir_hojas_empleados)
+        return {"report_data": report_data}
 
-    def _create_consolidados(self, emp_ws, vales_empleado, start_row, work_type_mapping):
+    def _create_consolidados(self, emp_ws, empleado_id, start_row, work_type_mapping):
         """
         Método auxiliar para crear las tablas de consolidados (semanal, mensual, anual)
         """
         try:
+            # Totales por periodo desde los archivos mensuales de vales, sin los anulados
+            # (solo se recalcula el mes que cambió o que tiene anulaciones nuevas)
+            consolidados = self.vales_store.consolidados(empleado_id)
+
             consolidado_start_row = start_row + 3
             emp_ws.cell(row=consolidado_start_row, column=1).value = "CONSOLIDADO DE PAGOS"
             emp_ws.cell(row=consolidado_start_row, column=1).font = Font(bold=True, size=12)
@@ -1047,27 +1498,7 @@ class MainWindow(QMainWindow):
                 cell.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
                 cell.alignment = Alignment(horizontal='center')
             
-            weekly_data = {}
-            for vale in vales_empleado:
-                if vale["fecha"] is not None and isinstance(vale["fecha"], dt.datetime) and vale["valor"] is not None:
-                    try:
-                        year = vale["fecha"].year
-                        week_num = vale["fecha"].isocalendar()[1]
-                        week_key = f"{year}-W{week_num:02d}"
-                        
-                        start_of_week = vale["fecha"] - dt.timedelta(days=vale["fecha"].weekday())
-                        end_of_week = start_of_week + dt.timedelta(days=6)
-                        
-                        if week_key not in weekly_data:
-                            weekly_data[week_key] = {
-                                "start_date": start_of_week,
-                                "end_date": end_of_week,
-                                "total": 0
-                            }
-                        
-                        weekly_data[week_key]["total"] += float(vale["valor"])
-                    except Exception as e:
-                        print(f"Error procesando fecha semanal: {e}")
+            weekly_data = consolidados["semanal"]
             
             row_idx = consolidado_start_row + 1
             for week_key, data in sorted(weekly_data.items()):
@@ -1093,20 +1524,7 @@ class MainWindow(QMainWindow):
                 cell.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
                 cell.alignment = Alignment(horizontal='center')
             
-            monthly_data = {}
-            for vale in vales_empleado:
-                if vale["fecha"] is not None and isinstance(vale["fecha"], dt.datetime) and vale["valor"] is not None:
-                    try:
-                        year = vale["fecha"].year
-                        month = vale["fecha"].month
-                        month_key = f"{year}-{month:02d}"
-                        
-                        if month_key not in monthly_data:
-                            monthly_data[month_key] = {"year": year, "month": month, "total": 0}
-                        
-                        monthly_data[month_key]["total"] += float(vale["valor"])
-                    except Exception as e:
-                        print(f"Error procesando fecha mensual: {e}")
+            monthly_data = consolidados["mensual"]
             
             month_names = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
                         "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
@@ -1134,16 +1552,7 @@ class MainWindow(QMainWindow):
                 cell.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
                 cell.alignment = Alignment(horizontal='center')
             
-            yearly_data = {}
-            for vale in vales_empleado:
-                if vale["fecha"] is not None and isinstance(vale["fecha"], dt.datetime) and vale["valor"] is not None:
-                    try:
-                        year = vale["fecha"].year
-                        if year not in yearly_data:
-                            yearly_data[year] = 0
-                        yearly_data[year] += float(vale["valor"])
-                    except Exception as e:
-                        print(f"Error procesando fecha anual: {e}")
+            yearly_data = consolidados["anual"]
             
             row_idx += 1
             for year, total in sorted(yearly_data.items()):
@@ -1155,62 +1564,62 @@ class MainWindow(QMainWindow):
                 
         except Exception as e:
             print(f"Error creando consolidados: {e}")
-    def setup_employee_management(self):
-        """Carga empleados en el ComboBox, conecta el botón Registrar Vale y limpia la tabla de previsualización."""
+    def setup_employee_management(self, cargar_empleados=True):
+        """
+        Carga empleados en el ComboBox, conecta el botón Registrar Vale y limpia la tabla de previsualización.
+
+        Con cargar_empleados=False el ComboBox queda en espera y los empleados los
+        carga el calentamiento de índices.
+        """
         try:
             # --- Manejo de Archivo Excel ---
-            try:
-                wb = load_workbook(self.excel_path)
-            except FileNotFoundError:
-                print(f"Advertencia: Archivo Excel no encontrado en {self.excel_path}. Creando uno nuevo.")
-                wb = Workbook()
-                # Usa la hoja activa si es un libro nuevo
-                if "Sheet" in wb.sheetnames and len(wb.sheetnames) == 1:
-                    empleados_ws = wb.active
-                    empleados_ws.title = "Empleados"
-                else:
-                    empleados_ws = wb.create_sheet(title="Empleados")
-                # Añadir encabezados
-                empleados_ws.append(["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"])
-                # Añadir un empleado de ejemplo
-                empleados_ws.append(["Juan Pérez (Ejemplo)", "1234567890", "3001234567", "juan@example.com", "E001"])
-                wb.save(self.excel_path)
-                print(f"Archivo Excel '{self.excel_path}' creado con hoja 'Empleados'.")
-
-            if "Empleados" not in wb.sheetnames:
-                print(f"Creando hoja 'Empleados' en archivo existente: {self.excel_path}")
-                empleados_ws = wb.create_sheet(title="Empleados")
-                empleados_ws.append(["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"])
-                empleados_ws.append(["Juan Pérez (Ejemplo)", "1234567890", "3001234567", "juan@example.com", "E001"])
-                wb.save(self.excel_path)
-            else:
-                empleados_ws = wb["Empleados"]
-                # Asegurarse de que la hoja Empleados tenga las cabeceras básicas si está vacía o corrupta
-                if empleados_ws.max_row == 0 or not all(empleados_ws.cell(row=1, column=c+1).value for c in range(5)):
-                    empleados_ws.delete_rows(1, empleados_ws.max_row)  # Limpiar por si acaso
+            with self.workbook_session.lock:
+                try:
+                    hojas = self.workbook_session.nombres_hojas()
+                except FileNotFoundError:
+                    print(f"Advertencia: Archivo Excel no encontrado en {self.excel_path}. Creando uno nuevo.")
+                    wb = Workbook()
+                    # Usa la hoja activa si es un libro nuevo
+                    if "Sheet" in wb.sheetnames and len(wb.sheetnames) == 1:
+                        empleados_ws = wb.active
+                        empleados_ws.title = "Empleados"
+                    else:
+                        empleados_ws = wb.create_sheet(title="Empleados")
+                    # Añadir encabezados
                     empleados_ws.append(["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"])
-                    wb.save(self.excel_path)
+                    # Añadir un empleado de ejemplo
+                    empleados_ws.append(["Juan Pérez (Ejemplo)", "1234567890", "3001234567", "juan@example.com", "E001"])
+                    self.workbook_session.reemplazar(wb)
+                    print(f"Archivo Excel '{self.excel_path}' creado con hoja 'Empleados'.")
+                    hojas = ["Empleados"]
+
+                if "Empleados" not in hojas:
+                    print(f"Creando hoja 'Empleados' en archivo existente: {self.excel_path}")
+                    def crear_hoja_empleados(wb):
+                        if "Empleados" in wb.sheetnames:
+                            return
+                        empleados_ws = wb.create_sheet(title="Empleados")
+                        empleados_ws.append(["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"])
+                        empleados_ws.append(["Juan Pérez (Ejemplo)", "1234567890", "3001234567", "juan@example.com", "E001"])
+                    self.workbook_session.modificar(crear_hoja_empleados)
+                else:
+                    # Asegurarse de que la hoja Empleados tenga las cabeceras básicas si está vacía o corrupta
+                    cabecera = self.workbook_session.cabecera("Empleados")
+                    if len(cabecera) < 5 or not all(cabecera[:5]):
+                        def reparar_cabecera_empleados(wb):
+                            empleados_ws = wb["Empleados"]
+                            empleados_ws.delete_rows(1, empleados_ws.max_row)  # Limpiar por si acaso
+                            empleados_ws.append(["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"])
+                        self.workbook_session.modificar(reparar_cabecera_empleados)
 
             # --- Configuración del ComboBox ---
             if hasattr(self.ui, 'EmpleadosBox'):
-                self.ui.EmpleadosBox.clear()  # Limpiar items previos
                 self.ui.EmpleadosBox.setMinimumWidth(200)
-
-                employees_loaded = False
-                # Leer las 5 columnas estándar
-                for row in empleados_ws.iter_rows(min_row=2, max_col=5):
-                    # Asegurarse de que la fila tiene al menos las columnas de Nombre (0) y EmpleadoId (4)
-                    if len(row) >= 5 and row[0].value and row[4].value:
-                        name = str(row[0].value)
-                        emp_id = str(row[4].value) if row[4].value else "SIN-ID"
-                        self.ui.EmpleadosBox.addItem(f"{name} ({emp_id})", emp_id)
-                        employees_loaded = True
-
-                if not employees_loaded:
-                    self.ui.EmpleadosBox.addItem("Sin empleados registrados", "")
-                    print("No se cargaron empleados desde la hoja 'Empleados'.")
+                if cargar_empleados:
+                    self._cargar_combo_empleados(self._leer_empleados())
                 else:
-                    print(f"Se cargaron {self.ui.EmpleadosBox.count()} empleados.")
+                    self.ui.EmpleadosBox.clear()
+                    self.ui.EmpleadosBox.addItem("Cargando empleados...", "")
             else:
                 print("ERROR: El QComboBox 'EmpleadosBox' no se encontró en la UI.")
                 if hasattr(self.ui, 'btnRegisterVale'):
@@ -1219,13 +1628,12 @@ class MainWindow(QMainWindow):
 
             # --- Limpiar la tabla de previsualización ---
             if hasattr(self.ui, 'tableViewVale') and hasattr(self, 'table_model'):
-                self.table_model.clear()  # Limpiar todas las filas
                 # Definir los encabezados fijos
                 fixed_headers = ["Código Serial", "Número Ticket", "Referencia", "Tipo Trabajo", "Color", "Total Producido"]
                 # Generar los encabezados dinámicos para los valores de trabajo
                 valor_headers = [f"Valor {work_type}" for work_type in WORK_TYPE_ABBREVIATIONS.keys()]
-                # Combinar encabezados fijos y dinámicos
-                self.table_model.setHorizontalHeaderLabels(fixed_headers + valor_headers)
+                # Combinar encabezados fijos y dinámicos (y vaciar la tabla)
+                self.table_model.configurar_columnas(fixed_headers + valor_headers)
                 self.ui.tableViewVale.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
                 print("Tabla de previsualización 'tableViewVale' limpiada y encabezados actualizados.")
             else:
@@ -1253,6 +1661,30 @@ class MainWindow(QMainWindow):
             print(f"Error inesperado durante setup_employee_management: {e}")
             traceback.print_exc()
 
+    def _leer_empleados(self):
+        """Lista de (nombre, EmpleadoId) de la hoja 'Empleados'. Se puede llamar desde otro hilo."""
+        empleados = []
+        # Leer las 5 columnas estándar
+        for row in self.workbook_session.filas("Empleados", min_row=2, max_col=5):
+            # Asegurarse de que la fila tiene al menos las columnas de Nombre (0) y EmpleadoId (4)
+            if len(row) >= 5 and row[0] and row[4]:
+                empleados.append((str(row[0]), str(row[4])))
+        return empleados
+
+    def _cargar_combo_empleados(self, empleados):
+        """Llena EmpleadosBox con los (nombre, EmpleadoId) dados."""
+        if not hasattr(self.ui, 'EmpleadosBox'):
+            return
+        self.ui.EmpleadosBox.clear()  # Limpiar items previos
+        for name, emp_id in empleados:
+            self.ui.EmpleadosBox.addItem(f"{name} ({emp_id})", emp_id)
+
+        if not empleados:
+            self.ui.EmpleadosBox.addItem("Sin empleados registrados", "")
+            print("No se cargaron empleados desde la hoja 'Empleados'.")
+        else:
+            print(f"Se cargaron {self.ui.EmpleadosBox.count()} empleados.")
+
     def _collect_ticket_data(self, suffix="", ticket_label="A"):
         """
         Función auxiliar para recolectar y validar los datos de un tiquete.
@@ -1503,6 +1935,10 @@ class MainWindow(QMainWindow):
             if reply != QMessageBox.Yes:
                 return
                 
+            # Pasar a disco los vales del diario y los cambios pendientes para que queden en el backup
+            self.vale_journal.compactar()
+            self.workbook_session.flush()
+
             # Obtener rutas usando BackupManager
             excel_path, codes_dir = BackupManager.get_paths()
             
@@ -1568,17 +2004,21 @@ class MainWindow(QMainWindow):
                 QMessageBox.information(self, 'Información', 'No hay archivos para eliminar.')
                 return
             
-            # Crear backup
+            # Crear backup (con los vales del diario y los cambios pendientes ya en el Excel)
             update_progress("Creando backup...")
+            self.vale_journal.compactar()
+            self.workbook_session.flush()
             backup_name = BackupManager.create_backup_sync(excel_path, codes_dir, update_progress)
             
             # Eliminar archivos originales
             update_progress("Eliminando archivos...")
+            self.workbook_session.descartar()
             deleted_files = BackupManager.delete_files(excel_path, codes_dir)
             
             # Recrear estructura
             update_progress("Recreando estructura...")
             self.setup_code_generator()
+            self.iniciar_calentamiento_indices()
             
             QMessageBox.information(
                 self, 
@@ -1608,12 +2048,14 @@ class MainWindow(QMainWindow):
                 QApplication.processEvents()
                 
                 excel_path, codes_dir = BackupManager.get_paths()
+                self.workbook_session.descartar()
                 deleted_files = BackupManager.delete_files(excel_path, codes_dir)
                 
                 # Recrear estructura
                 self.ui.EliminarTODO.setText("Recreando estructura...")
                 QApplication.processEvents()
                 self.setup_code_generator()
+                self.iniciar_calentamiento_indices()
                 
                 QMessageBox.information(
                     self, 
@@ -1641,172 +2083,278 @@ class MainWindow(QMainWindow):
         """
         Maneja el evento cuando se escanea o ingresa un código.
         (Actualizado para usar los nuevos tipos de trabajo)
+
+        En modo ráfaga el código solo se encola: el hilo de escaneo lo valida y lo
+        guarda, y el resultado aparece como una fila de color en la tabla.
+
+        Cada etapa se mide en self.latencias; 'total' excluye el tiempo que los
+        mensajes esperan al usuario.
         """
+        inicio = time.perf_counter()
         if not hasattr(self.ui, 'codeReaderInput'):
             print("ERROR: codeReaderInput no encontrado en UI")
             return
 
         scanned_code = self.ui.codeReaderInput.text().strip()
         if not scanned_code:
-            QMessageBox.warning(self, "Entrada Vacía", "Por favor, escanee o ingrese un código válido.")
+            if not self.modo_rafaga_activo():
+                QMessageBox.warning(self, "Entrada Vacía", "Por favor, escanee o ingrese un código válido.")
             return
 
-        # Cargar el archivo Excel
-        try:
-            wb = load_workbook(self.excel_path)
-            ws_trabajos = wb["Trabajos"]
-            ws_vales = wb[self.vales_sheet_name]
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo abrir el archivo Excel: {e}")
+        # Obtener empleado (Tu lógica existente)
+        if not hasattr(self.ui, 'EmpleadosBox'):
+            QMessageBox.critical(self, "Error de UI", "No se encontró el ComboBox de empleados.")
+            return
+        empleado_id = self.ui.EmpleadosBox.currentData()
+        if not empleado_id:
+            QMessageBox.warning(self, "Empleado No Seleccionado", "Por favor, seleccione un empleado.")
+            self.ui.EmpleadosBox.setFocus()
             return
 
-        # --- Búsqueda Actualizada ---
-        # Usa los NUEVOS tipos de trabajo para buscar
-        work_types = list(WORK_TYPE_ABBREVIATIONS.keys())
-        work_type_columns = {work_type: f"Código_{work_type}" for work_type in work_types}
-        found_row = None
-        work_type_found = None
-
-        headers = [cell.value for cell in ws_trabajos[1]]
-        # --- Fin Búsqueda Actualizada ---
-
-        # VALIDACIÓN 1: Tabla visual (Tu lógica existente)
-        if hasattr(self.ui, 'tableViewVale') and hasattr(self, 'table_model') and self.table_model.rowCount() > 0:
-            for row_idx in range(self.table_model.rowCount()):
-                item = self.table_model.item(row_idx, 0) # Columna 0 es Código Serial
-                if item and item.text() == scanned_code:
-                    QMessageBox.warning(self, "Vale Duplicado", f"El código '{scanned_code}' ya está en la tabla actual.")
-                    self.ui.codeReaderInput.clear()
-                    self.ui.codeReaderInput.setFocus()
-                    return
+        if not self.indices_listos:
+            # Se registra cuando termine el calentamiento de índices
+            self._escaneos_en_espera.append((scanned_code, empleado_id))
+            self.ui.progressCalentamiento.setFormat(
+                f"Cargando índices... ({len(self._escaneos_en_espera)} escaneos en espera)"
+            )
+            self.ui.codeReaderInput.clear()
+            self.ui.codeReaderInput.setFocus()
+            return
 
-        # VALIDACIÓN 2: Hoja "Vales" (Tu lógica existente)
-        if ws_vales.max_row > 1:
-            vales_headers_list = [cell.value for cell in ws_vales[1]]
-            codigo_serial_trabajo_col_name = "Codigo_Serial_Trabajo_Asociado"
-            try:
-                codigo_serial_vales_idx = vales_headers_list.index(codigo_serial_trabajo_col_name)
-                for row_num in range(2, ws_vales.max_row + 1):
-                    cell_value = ws_vales.cell(row=row_num, column=codigo_serial_vales_idx + 1).value
-                    if cell_value == scanned_code:
-                        QMessageBox.warning(self, "Vale Ya Registrado", f"El vale '{scanned_code}' ya fue registrado en Excel.")
-                        self.ui.codeReaderInput.clear()
-                        self.ui.codeReaderInput.setFocus()
-                        return
-            except ValueError:
-                QMessageBox.critical(self, "Error de Configuración", f"La columna '{codigo_serial_trabajo_col_name}' no se encuentra en 'Vales'.")
-                self.ui.codeReaderInput.clear()
-                self.ui.codeReaderInput.setFocus()
-                return
+        if self.modo_rafaga_activo():
+            with self.latencias.medir("sincronizacion"):
+                self.sincronizar_estaciones()
+            self.scan_worker.encolar(scanned_code, empleado_id)
+            self.ui.codeReaderInput.clear()
+            self.ui.codeReaderInput.setFocus()
+            return
 
-        # Búsqueda en "Trabajos" (Tu lógica existente, pero ahora usa work_type_columns actualizado)
-        for row_num, current_row_values in enumerate(ws_trabajos.iter_rows(min_row=2, values_only=True), start=2):
-            for work_type, column_name in work_type_columns.items():
-                try:
-                    col_idx = headers.index(column_name)
-                    if current_row_values[col_idx] == scanned_code:
-                        found_row = current_row_values
-                        work_type_found = work_type
-                        break
-                except (ValueError, IndexError):
-                    # La columna no existe o hay un problema, lo manejamos más adelante
-                    continue
-            if found_row:
-                break
+        # VALIDACIÓN 1: Tabla visual (código -> fila en el modelo, O(1))
+        with self.latencias.medir("validacion_tabla"):
+            en_tabla = hasattr(self, 'table_model') and self.table_model.contiene(scanned_code)
+        if en_tabla:
+            QMessageBox.warning(self, "Vale Duplicado", f"El código '{scanned_code}' ya está en la tabla actual.")
+            self.ui.codeReaderInput.clear()
+            self.ui.codeReaderInput.setFocus()
+            return
+
+        # Incorporar vales y trabajos escritos por otras estaciones
+        with self.latencias.medir("sincronizacion"):
+            self.sincronizar_estaciones()
+
+        # VALIDACIÓN 2 y búsqueda en "Trabajos": vales registrados e índice de códigos, en memoria
+        resultado = self.registro_vales.resolver(scanned_code, empleado_id)
 
-        if not found_row:
-            QMessageBox.warning(self, "Código No Encontrado", f"El código '{scanned_code}' no se encontró en 'Trabajos'.")
+        if resultado.estado == ResultadoEscaneo.CODIGO_INVALIDO:
+            QMessageBox.warning(self, "Código Inválido", resultado.mensaje)
+            self.ui.codeReaderInput.clear()
+            self.ui.codeReaderInput.setFocus()
+            return
+        if resultado.estado == ResultadoEscaneo.YA_REGISTRADO:
+            QMessageBox.warning(self, "Vale Ya Registrado", resultado.mensaje)
+            self.ui.codeReaderInput.clear()
+            self.ui.codeReaderInput.setFocus()
+            return
+        if resultado.estado == ResultadoEscaneo.NO_ENCONTRADO:
+            QMessageBox.warning(self, "Código No Encontrado", resultado.mensaje)
             self.ui.codeReaderInput.clear()
             self.ui.codeReaderInput.setFocus()
             return
+        if resultado.estado == ResultadoEscaneo.DATOS_INCOMPLETOS:
+            QMessageBox.critical(self, "Error de Datos", resultado.mensaje)
+            return
+        if not resultado.valido:
+            QMessageBox.critical(self, "Error de Procesamiento", resultado.mensaje)
+            return
 
-        # --- Extracción de Datos Actualizada ---
+        # Guardar en el diario de vales: durable al retornar, el compactador lo pasa al archivo del mes
         try:
-            def get_value_from_row_safe(header_name, row_data, header_list):
-                try:
-                    idx = header_list.index(header_name)
-                    return row_data[idx]
-                except (ValueError, IndexError):
-                    print(f"Advertencia: Columna '{header_name}' no encontrada.")
-                    return None
-
-            ticket_number = get_value_from_row_safe("Número Ticket", found_row, headers)
-            referencia = get_value_from_row_safe("Referencia", found_row, headers)
-            color = get_value_from_row_safe("Color", found_row, headers)
-            total_producido = get_value_from_row_safe("Total Producido", found_row, headers)
-            # Obtener el valor del trabajo específico encontrado
-            valor_trabajo_especifico = get_value_from_row_safe(f"Valor {work_type_found}", found_row, headers)
-
-            if any(v is None for v in [ticket_number, referencia, color, total_producido, valor_trabajo_especifico]):
-                QMessageBox.critical(self, "Error de Datos", f"Faltan datos esenciales para '{scanned_code}'. Verifique la hoja 'Trabajos'.")
+            self.registro_vales.registrar([resultado])
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"No se pudo guardar el vale: {e}")
+            return
+
+        # --- Actualizar Tabla Visual ---
+        if hasattr(self.ui, 'tableViewVale'):
+            with self.latencias.medir("tabla"):
+                self.table_model.agregar_fila(resultado.fila_tabla)
+        self.latencias.registrar("total", time.perf_counter() - inicio)
+
+        QMessageBox.information(self, "Vale Registrado", resultado.mensaje)
+
+        # Limpiar campo (Tu lógica existente)
+        self.ui.codeReaderInput.clear()
+        self.ui.codeReaderInput.setFocus()
+
+    def modo_rafaga_activo(self):
+        """True si está marcado el modo ráfaga (escaneo continuo sin mensajes)."""
+        return hasattr(self.ui, 'checkModoRafaga') and self.ui.checkModoRafaga.isChecked()
+
+    def mostrar_resultados_escaneo(self, resultados):
+        """Muestra los resultados de un lote (modo ráfaga o importación) como filas de color en la tabla."""
+        if not hasattr(self, 'table_model'):
+            return
+        with self.latencias.medir("tabla_rafaga"):
+            colores_por_defecto = self.COLORES_ESTADO_ESCANEO[ResultadoEscaneo.ERROR]
+            self.table_model.agregar_filas(
+                [r.fila_tabla if r.valido else [r.codigo, r.mensaje] for r in resultados],
+                color=[self.COLORES_ESTADO_ESCANEO.get(r.estado, colores_por_defecto) for r in resultados],
+                tooltip=[r.mensaje for r in resultados],
+                indexar=[r.valido for r in resultados],  # Un escaneo fallido se puede repetir
+            )
+        if hasattr(self.ui, 'tableViewVale'):
+            self.ui.tableViewVale.scrollToBottom()
+        registrados = sum(1 for r in resultados if r.valido)
+        print(f"Lote de {len(resultados)} códigos procesado: {registrados} vales registrados.")
+
+    def anular_vale_seleccionado(self, ultimo=False):
+        """
+        Anula el vale de la fila seleccionada en la tabla (o el último registrado en
+        esta sesión, o el del código que se escriba si no hay ninguno) tras confirmarlo. La anulación es una marca en el diario: los
+        reportes dejan de contar el vale y su código se puede volver a escanear.
+        """
+        if not hasattr(self, 'table_model'):
+            return
+        codigo = None
+        if not ultimo and hasattr(self.ui, 'tableViewVale'):
+            seleccion = self.ui.tableViewVale.selectionModel().selectedIndexes()
+            if seleccion:
+                codigo = self.table_model.valores(seleccion[0].row())[0]
+        if codigo is None:
+            codigo = self.registro_vales.ultimo_codigo()
+        if not codigo:
+            # Sin vales en esta sesión: anular por código (vale de otra sesión o estación)
+            codigo, aceptado = QInputDialog.getText(self, "Anular Vale", "Código del vale a anular:")
+            codigo = codigo.strip()
+            if not aceptado or not codigo:
                 return
 
-            tallas_cantidades = {}
-            for i in range(33, 49):
-                cantidad = get_value_from_row_safe(f"Cant_T{i}", found_row, headers)
-                if cantidad and isinstance(cantidad, (int, float)) and cantidad > 0:
-                    tallas_cantidades[str(i)] = int(cantidad)
-            resumen_tallas = "; ".join([f"T{k}:{v}" for k, v in tallas_cantidades.items()]) or "N/A"
+        respuesta = QMessageBox.question(
+            self, "Anular Vale", f"¿Anular el vale del código '{codigo}'?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if respuesta != QMessageBox.Yes:
+            return
 
+        try:
+            resultado = self.registro_vales.anular(codigo)
         except Exception as e:
-            QMessageBox.critical(self, "Error de Procesamiento", f"Error al procesar datos para '{scanned_code}': {str(e)}")
             traceback.print_exc()
+            QMessageBox.critical(self, "Error al Anular", f"No se pudo anular el vale de '{codigo}': {e}")
+            return
+        if resultado.estado != ResultadoEscaneo.ANULADO:
+            QMessageBox.warning(self, "Anular Vale", resultado.mensaje)
             return
-        # --- Fin Extracción de Datos ---
 
-        # Obtener empleado (Tu lógica existente)
-        if not hasattr(self.ui, 'EmpleadosBox'):
-            QMessageBox.critical(self, "Error de UI", "No se encontró el ComboBox de empleados.")
+        fila = self.table_model.fila_de(codigo)
+        if fila is not None:
+            self.table_model.marcar_fila(fila, color=self.COLORES_ESTADO_ESCANEO[ResultadoEscaneo.ANULADO],
+                                         tooltip=resultado.mensaje, indexar=False)
+        print(resultado.mensaje)
+        self.ui.codeReaderInput.setFocus()
+
+    def importar_codigos_archivo(self):
+        """
+        Registra de una vez los códigos de un archivo de texto o CSV para el empleado
+        seleccionado y muestra un resumen con los códigos no encontrados y repetidos.
+        """
+        if not self.indices_listos:
+            QMessageBox.information(self, "Cargando Índices",
+                                    "Espere a que termine de cargarse el índice de códigos.")
             return
-        empleado_id = self.ui.EmpleadosBox.currentData()
+        empleado_id = self.ui.EmpleadosBox.currentData() if hasattr(self.ui, 'EmpleadosBox') else None
         if not empleado_id:
             QMessageBox.warning(self, "Empleado No Seleccionado", "Por favor, seleccione un empleado.")
-            self.ui.EmpleadosBox.setFocus()
             return
 
-        # Crear fila para "Vales" (Tu lógica existente)
-        id_vale = f"V{int(time.time())}{str(uuid.uuid4())[:4]}"
-        fecha_hora_actual = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        vale_row = [
-            id_vale, empleado_id, fecha_hora_actual, ticket_number, referencia,
-            color, resumen_tallas, total_producido, valor_trabajo_especifico,
-            scanned_code, work_type_found
-        ]
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Importar códigos", "", "Códigos (*.txt *.csv);;Todos los archivos (*)"
+        )
+        if not path:
+            return
 
-        # Guardar en "Vales" (Tu lógica existente)
         try:
-            ws_vales.append(vale_row)
-            wb.save(self.excel_path)
-            QMessageBox.information(self, "Vale Registrado", f"Vale {id_vale} registrado para {work_type_found}.")
+            # Un solo índice vigente para todo el archivo
+            self.sincronizar_estaciones(forzar=True)
+            resultados = self.registro_vales.importar_archivo(path, empleado_id)
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo guardar el vale en Excel: {e}")
+            traceback.print_exc()
+            QMessageBox.critical(self, "Error de Importación", f"No se pudo importar '{os.path.basename(path)}': {e}")
             return
 
-        # --- Actualizar Tabla Visual (Actualizado) ---
-        if hasattr(self.ui, 'tableViewVale'):
-            # Crear la fila con los datos en el ORDEN CORRECTO
-            # (Asegúrate que este orden coincida con el de setup_code_reader)
-            row_data = [
-                scanned_code,
-                ticket_number,
-                referencia,
-                work_type_found, # Tipo de Trabajo encontrado
-                color,
-                total_producido
-            ]
-            # Añadir todos los valores de trabajo, estén o no en la fila
-            for wt in WORK_TYPE_ABBREVIATIONS.keys():
-                row_data.append(get_value_from_row_safe(f"Valor {wt}", found_row, headers))
-
-            items = [QtGui.QStandardItem(str(value) if value is not None else "") for value in row_data]
-            self.table_model.appendRow(items)
-        # --- Fin Actualizar Tabla Visual ---
+        if not resultados:
+            QMessageBox.warning(self, "Archivo Vacío", "El archivo no contiene códigos.")
+            return
+        self.mostrar_resultados_escaneo(resultados)
+
+        resumen = RegistroVales.resumir(resultados)
+        etiquetas = [
+            (ResultadoEscaneo.CODIGO_INVALIDO, "Con formato inválido"),
+            (ResultadoEscaneo.NO_ENCONTRADO, "No encontrados en 'Trabajos'"),
+            (ResultadoEscaneo.YA_REGISTRADO, "Ya registrados"),
+            (ResultadoEscaneo.REPETIDO_EN_LOTE, "Repetidos en el archivo"),
+            (ResultadoEscaneo.DATOS_INCOMPLETOS, "Con datos incompletos"),
+            (ResultadoEscaneo.ERROR, "Con error"),
+        ]
+        lineas = [f"Códigos leídos: {resumen['total']}", f"Vales registrados: {resumen['registrados']}"]
+        for estado, etiqueta in etiquetas:
+            codigos = resumen.get(estado)
+            if codigos:
+                muestra = ", ".join(codigos[:20]) + (f" ... (+{len(codigos) - 20})" if len(codigos) > 20 else "")
+                lineas.append(f"\n{etiqueta} ({len(codigos)}): {muestra}")
+        QMessageBox.information(self, "Importación de Códigos", "\n".join(lineas))
+
 
-        # Limpiar campo (Tu lógica existente)
-        self.ui.codeReaderInput.clear()
-        self.ui.codeReaderInput.setFocus()
 
+    def setup_panel_latencias(self):
+        """Agrega a la página de Configuración una tabla con los percentiles de latencia del escaneo."""
+        if not hasattr(self.ui, 'create_user') or not hasattr(self.ui, 'verticalLayout_11'):
+            print("Advertencia: página de Configuración no encontrada; no se muestra el panel de latencias.")
+            return
 
+        grupo = QGroupBox("Latencia del escaneo (ms)", self.ui.create_user)
+        grupo.setMaximumHeight(230)
+        layout = QVBoxLayout(grupo)
+
+        self.ui.tablaLatencias = QTableWidget(0, 7, grupo)
+        self.ui.tablaLatencias.setHorizontalHeaderLabels(["Etapa", "N", "p50", "p95", "p99", "Máx", "Media"])
+        self.ui.tablaLatencias.verticalHeader().setVisible(False)
+        self.ui.tablaLatencias.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.ui.tablaLatencias.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.ui.tablaLatencias)
+
+        botones = QHBoxLayout()
+        btn_actualizar = QPushButton("Actualizar", grupo)
+        btn_actualizar.clicked.connect(self.actualizar_panel_latencias)
+        btn_exportar = QPushButton("Guardar JSON", grupo)
+        btn_exportar.clicked.connect(self.exportar_latencias)
+        botones.addWidget(btn_actualizar)
+        botones.addWidget(btn_exportar)
+        layout.addLayout(botones)
+
+        self.ui.verticalLayout_11.addWidget(grupo)
+
+    def actualizar_panel_latencias(self):
+        """Vuelve a llenar la tabla de latencias con los percentiles actuales."""
+        if not hasattr(self.ui, 'tablaLatencias'):
+            return
+        resumen = self.latencias.resumen()
+        self.ui.tablaLatencias.setRowCount(len(resumen))
+        columnas = ["n", "p50_ms", "p95_ms", "p99_ms", "max_ms", "media_ms"]
+        for fila, (etapa, datos) in enumerate(resumen.items()):
+            self.ui.tablaLatencias.setItem(fila, 0, QTableWidgetItem(etapa))
+            for col, clave in enumerate(columnas, start=1):
+                valor = datos.get(clave)
+                self.ui.tablaLatencias.setItem(fila, col, QTableWidgetItem("" if valor is None else str(valor)))
+
+    def exportar_latencias(self):
+        """Guarda los percentiles de latencia en el archivo JSON de la estación."""
+        try:
+            ruta = self.latencias.volcar()
+            self.actualizar_panel_latencias()
+            QMessageBox.information(self, "Latencias Guardadas", f"Percentiles guardados en:\n{os.path.abspath(ruta)}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"No se pudieron guardar las latencias: {e}")
 
     def setup_add_employee_button(self):
         """Conecta el botón de agregar empleado (si lo tienes)"""
@@ -1856,23 +2404,23 @@ class MainWindow(QMainWindow):
             empleado_id = f"E{cedula[-4:]}{unique_id}".upper()
             
             # Cargar Excel y verificar duplicados
-            wb = load_workbook(self.excel_path)
-            
-            if "Empleados" not in wb.sheetnames:
-                empleados_ws = wb.create_sheet(title="Empleados")
-                empleados_ws.append(["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"])
-            else:
-                empleados_ws = wb["Empleados"]
-            
-            # Verificar si la cédula ya existe
-            for row in empleados_ws.iter_rows(min_row=2, max_col=5):
-                if row[1].value and str(row[1].value) == cedula:
-                    QMessageBox.warning(self, "Empleado Existente", f"Ya existe un empleado con cédula {cedula}")
-                    return
-            
-            # Agregar empleado
-            empleados_ws.append([nombre, cedula, celular, correo, empleado_id])
-            wb.save(self.excel_path)
+            with self.workbook_session.lock:
+                if "Empleados" in self.workbook_session.nombres_hojas():
+                    # Verificar si la cédula ya existe (lectura sin abrir el libro para escritura)
+                    existe = any(
+                        valor and str(valor) == cedula
+                        for (valor,) in self.workbook_session.filas("Empleados", min_row=2, min_col=2, max_col=2)
+                    )
+                    if existe:
+                        QMessageBox.warning(self, "Empleado Existente", f"Ya existe un empleado con cédula {cedula}")
+                        return
+                
+                # Agregar empleado (como delta: se re-aplica si otra estación guardó antes)
+                def agregar_empleado(wb):
+                    if "Empleados" not in wb.sheetnames:
+                        wb.create_sheet(title="Empleados").append(["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"])
+                    wb["Empleados"].append([nombre, cedula, celular, correo, empleado_id])
+                self.workbook_session.modificar(agregar_empleado)
             
             # Limpiar campos
             self.ui.Nombre_Empleado.clear()
@@ -1907,7 +2455,7 @@ class MainWindow(QMainWindow):
                 return
 
             total_vales = self.table_model.rowCount()
-            self.table_model.removeRows(0, total_vales)
+            self.table_model.limpiar()
 
             QMessageBox.information(
                 self, "Vales Registrados",
@@ -1948,6 +2496,7 @@ class MainWindow(QMainWindow):
         elif btnWidget.objectName() == "btn_widgets":
             # Asegúrate de que la página sea la correcta, por ejemplo self.ui.page_settings
             self.ui.stackedWidget.setCurrentWidget(self.ui.create_user) # Cambia create_user por tu página de configuración
+            self.actualizar_panel_latencias()
             UIFunctions.resetStyle(self, "btn_widgets") # Corregido: antes decía "create_user"
             btnWidget.setStyleSheet(UIFunctions.selectMenu(btnWidget.styleSheet()))
     # Window event handlers
@@ -1983,6 +2532,32 @@ class MainWindow(QMainWindow):
         """Handle key press events"""
         print('Key: ' + str(event.key()) + ' | Text Press: ' + str(event.text()))
 
+    def closeEvent(self, event):
+        """Detiene el compactador y pasa al Excel los vales pendientes del diario"""
+        if getattr(self, 'calentamiento', None) is not None:
+            self.calentamiento.wait()  # Solo lee; termina por sí solo
+        if getattr(self, 'hilo_reportes', None) is not None:
+            self.hilo_reportes.wait()  # Su delta del libro debe quedar antes de cerrar la sesión
+        try:
+            self.latencias.volcar()
+        except Exception as e:
+            print(f"No se pudieron guardar las latencias del escaneo: {e}")
+        try:
+            # Terminar de guardar los códigos que quedaron en la cola del modo ráfaga
+            self.scan_worker.detener()
+            self.scan_worker.wait()
+        except Exception as e:
+            print(f"No se pudo detener el hilo de escaneo: {e}")
+        try:
+            self.vale_journal.detener(compactar=True)
+        except Exception as e:
+            print(f"No se pudieron compactar los vales pendientes (quedan en el diario): {e}")
+        try:
+            self.workbook_session.cerrar()
+        except Exception as e:
+            print(f"No se pudieron guardar los cambios pendientes en Excel: {e}")
+        return super(MainWindow, self).closeEvent(event)
+
     def resizeEvent(self, event):
         """Handle resize events"""
         self.resizeFunction()
@@ -1993,6 +2568,7 @@ class MainWindow(QMainWindow):
         print('Height: ' + str(self.height()) + ' | Width: ' + str(self.width()))
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Procesos de qr_batch en el ejecutable empaquetado
     app = QApplication(sys.argv)
     QtGui.QFontDatabase.addApplicationFont('fonts/segoeui.ttf')
     QtGui.QFontDatabase.addApplicationFont('fonts/segoeuib.ttf')
@@ -10,16 +10,19 @@ class AutocompletadoManager:
     Clase para manejar el autocompletado de QLineEdit basado en datos de Excel
     """
     
-    def __init__(self, excel_path, sheet_name="Trabajos"):
+    def __init__(self, excel_path, sheet_name="Trabajos", storage=None):
         """
         Inicializar el manager de autocompletado
         
         Args:
             excel_path (str): Ruta al archivo Excel
             sheet_name (str): Nombre de la hoja de Excel
+            storage: Motor de almacenamiento con valores_unicos(tabla, columna) (opcional).
+                     Si se indica, se consulta en lugar de leer el Excel con pandas.
         """
         self.excel_path = excel_path
         self.sheet_name = sheet_name
+        self.storage = storage
         self.completers = {}  # Diccionario para almacenar los completers por campo
         
     def obtener_valores_unicos(self, columna):
@@ -33,6 +36,9 @@ class AutocompletadoManager:
             list: Lista de valores únicos
         """
         try:
+            if self.storage is not None:
+                return self.storage.valores_unicos(self.sheet_name, columna)
+
             if not os.path.exists(self.excel_path):
                 print(f"Advertencia: El archivo Excel no se encuentra en {self.excel_path}")
                 return []
@@ -34,4 +34,23 @@ CAMPOS_VALOR_TRABAJO_MAP = {
     "Ensuelado": "CampoValorEnsuelado",
     "Plantillas TERRY": "CampoValorPlantillas",
     "Empaque": "CampoValorEmpaque",
-}
\ No newline at end of file
+}
+
+# Cabeceras de las hojas (y tablas) de la base de datos.
+TRABAJOS_HEADERS = (
+    ["Código Serial", "Número Ticket", "Referencia", "Color"]
+    + [f"Cant_T{i}" for i in range(33, 49)]
+    + ["Total Producido"]
+    + [f"Valor {wt}" for wt in WORK_TYPE_ABBREVIATIONS.keys()]
+    + ["Tipo Código", "Ruta Imagen"]
+    + [f"Código_{wt}" for wt in WORK_TYPE_ABBREVIATIONS.keys()]
+)
+
+VALES_HEADERS = [
+    "ID_Vale", "EmpleadoID", "FechaHora_Generacion", "Numero_Ticket_Asociado",
+    "Referencia_Asociada", "Color_Trabajo", "Resumen_Tallas_Cantidades",
+    "Total_Producido_Trabajo", "Suma_Valores_Trabajos", "Codigo_Serial_Trabajo_Asociado",
+    "WorkTypeDetected"
+]
+
+EMPLEADOS_HEADERS = ["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"]
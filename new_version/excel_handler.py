@@ -2,13 +2,17 @@ import os
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from PySide2.QtWidgets import QMessageBox
+from workbook_session import WorkbookSession
+from serial_codes import columnas_para_codigo
 
 class ExcelHandler:
-    def __init__(self, excel_path="trabajos_database.xlsx"):
+    def __init__(self, excel_path="trabajos_database.xlsx", session=None):
         self.excel_path = excel_path
         self.trabajos_sheet_name = "Trabajos"
         self.vales_sheet_name = "Vales"
         self.empleados_sheet_name = "Empleados"
+        # Un solo libro abierto; se recarga solo si el archivo cambia y los guardados se agrupan
+        self.session = session or WorkbookSession(excel_path)
 
     def inicializar_database(self, trabajos_headers, vales_headers, empleados_headers):
         """
@@ -27,33 +31,54 @@ class ExcelHandler:
             # Hoja de Empleados
             ws_empleados = wb.create_sheet(title=self.empleados_sheet_name)
             ws_empleados.append(empleados_headers)
-            wb.save(self.excel_path)
+            self.session.reemplazar(wb)
             print(f"Archivo '{self.excel_path}' creado con todas las hojas.")
         else:
             # Verificar y crear hojas si faltan en un archivo existente
-            wb = load_workbook(self.excel_path)
-            sheets_to_check = {
-                self.trabajos_sheet_name: trabajos_headers,
-                self.vales_sheet_name: vales_headers,
-                self.empleados_sheet_name: empleados_headers,
-            }
-            for sheet_name, headers in sheets_to_check.items():
-                if sheet_name not in wb.sheetnames:
-                    ws = wb.create_sheet(title=sheet_name)
-                    ws.append(headers)
-                    print(f"Hoja '{sheet_name}' creada.")
-            wb.save(self.excel_path)
+            with self.session.lock:
+                hojas = self.session.nombres_hojas()
+                sheets_to_check = {
+                    self.trabajos_sheet_name: trabajos_headers,
+                    self.vales_sheet_name: vales_headers,
+                    self.empleados_sheet_name: empleados_headers,
+                }
+                for sheet_name, headers in sheets_to_check.items():
+                    if sheet_name not in hojas:
+                        self.session.modificar(self._creador_de_hoja(sheet_name, headers))
+                        print(f"Hoja '{sheet_name}' creada.")
+
+    @staticmethod
+    def _creador_de_hoja(sheet_name, headers):
+        """Delta que crea una hoja con su cabecera si aún no existe."""
+        def crear(wb):
+            if sheet_name not in wb.sheetnames:
+                wb.create_sheet(title=sheet_name).append(headers)
+        return crear
+
+    def _anexar_fila(self, sheet_name, row_data):
+        """
+        Añade una fila al libro de la sesión (como delta) y la escribe a disco de
+        inmediato: es un guardado explícito del usuario, así que un error se debe
+        ver ahora y no perderse en el guardado diferido.
+
+        Raises:
+            PermissionError: Si el archivo está abierto en otro programa. La fila
+                             queda en el libro y se reintenta con un guardado diferido.
+        """
+        self.session.anexar(sheet_name, row_data)
+        try:
+            self.session.flush()
+        except Exception:
+            self.session.marcar_modificado()  # Reintento diferido, como en WorkbookSession._guardar_diferido
+            raise
 
     def guardar_trabajo(self, row_data):
         """Guarda una nueva fila en la hoja 'Trabajos'."""
         try:
-            wb = load_workbook(self.excel_path)
-            ws = wb[self.trabajos_sheet_name]
-            ws.append(row_data)
-            wb.save(self.excel_path)
+            self._anexar_fila(self.trabajos_sheet_name, row_data)
             return True
         except PermissionError:
-            QMessageBox.critical(None, "Error al Guardar", f"Permiso denegado para escribir en '{self.excel_path}'. Asegúrese de que no esté abierto.")
+            QMessageBox.critical(None, "Error al Guardar", f"Permiso denegado para escribir en '{self.excel_path}'. Asegúrese de que no esté abierto. El trabajo quedó pendiente y se guardará al cerrarlo.")
             return False
         except Exception as e:
             QMessageBox.critical(None, "Error de Excel", f"Error al guardar trabajo: {e}")
@@ -62,11 +87,11 @@ class ExcelHandler:
     def guardar_vale(self, vale_data):
         """Guarda un nuevo vale en la hoja 'Vales'."""
         try:
-            wb = load_workbook(self.excel_path)
-            ws = wb[self.vales_sheet_name]
-            ws.append(vale_data)
-            wb.save(self.excel_path)
+            self._anexar_fila(self.vales_sheet_name, vale_data)
             return True
+        except PermissionError:
+            QMessageBox.critical(None, "Error al Guardar", f"Permiso denegado para escribir en '{self.excel_path}'. Asegúrese de que no esté abierto. El vale quedó pendiente y se guardará al cerrarlo.")
+            return False
         except Exception as e:
             QMessageBox.critical(None, "Error de Excel", f"Error al guardar vale: {e}")
             return False
@@ -74,11 +99,11 @@ class ExcelHandler:
     def guardar_empleado(self, empleado_data):
         """Guarda un nuevo empleado en la hoja 'Empleados'."""
         try:
-            wb = load_workbook(self.excel_path)
-            ws = wb[self.empleados_sheet_name]
-            ws.append(empleado_data)
-            wb.save(self.excel_path)
+            self._anexar_fila(self.empleados_sheet_name, empleado_data)
             return True
+        except PermissionError:
+            QMessageBox.critical(None, "Error al Guardar", f"Permiso denegado para escribir en '{self.excel_path}'. Asegúrese de que no esté abierto. El empleado quedó pendiente y se guardará al cerrarlo.")
+            return False
         except Exception as e:
             QMessageBox.critical(None, "Error de Excel", f"Error al guardar empleado: {e}")
             return False
@@ -86,13 +111,11 @@ class ExcelHandler:
     def leer_empleados(self):
         """Lee todos los empleados de la hoja 'Empleados'."""
         try:
-            wb = load_workbook(self.excel_path, read_only=True)
-            if self.empleados_sheet_name not in wb.sheetnames:
+            if self.empleados_sheet_name not in self.session.nombres_hojas():
                 return []
-            ws = wb[self.empleados_sheet_name]
             empleados = []
             # min_row=2 para saltar la cabecera
-            for row in ws.iter_rows(min_row=2, max_col=5, values_only=True):
+            for row in self.session.filas(self.empleados_sheet_name, min_row=2, max_col=5):
                  if row[0] and row[4]: # Asegurarse que Nombre y ID existan
                     empleados.append({"nombre": row[0], "id": row[4]})
             return empleados
@@ -103,22 +126,30 @@ class ExcelHandler:
     # ... Aquí irían más funciones de lectura como find_code_data, is_vale_registered, etc.
     # Por ejemplo:
     def buscar_trabajo_por_codigo(self, scanned_code, work_type_columns):
-        """Busca un trabajo por su código serial en cualquiera de las columnas de tipo de trabajo."""
+        """
+        Busca un trabajo por su código serial. Si el código trae la abreviatura de un
+        tipo de trabajo solo se revisa esa columna; un código mal formado se
+        rechaza sin leer el archivo.
+        """
+        columnas = columnas_para_codigo(scanned_code, work_type_columns)
+        if not columnas:
+            return None, None
         try:
-            wb = load_workbook(self.excel_path, read_only=True)
-            ws = wb[self.trabajos_sheet_name]
-            headers = [cell.value for cell in ws[1]]
-            
-            for row_values in ws.iter_rows(min_row=2, values_only=True):
-                for work_type, column_name in work_type_columns.items():
-                    try:
-                        col_idx = headers.index(column_name)
-                        if row_values[col_idx] == scanned_code:
-                            # Encontrado! Retornamos la fila y el tipo de trabajo.
-                            return dict(zip(headers, row_values)), work_type
-                    except (ValueError, IndexError):
-                        continue # La columna no existe o la fila es corta, seguir buscando
+            headers = self.session.cabecera(self.trabajos_sheet_name)
+            # Posición de cada columna a revisar (las que no existen se omiten)
+            posiciones = [(work_type, headers.index(column_name))
+                          for work_type, column_name in columnas if column_name in headers]
+
+            for row_values in self.session.filas(self.trabajos_sheet_name, min_row=2):
+                for work_type, col_idx in posiciones:
+                    if col_idx < len(row_values) and row_values[col_idx] == scanned_code:
+                        # Encontrado! Retornamos la fila y el tipo de trabajo.
+                        return dict(zip(headers, row_values)), work_type
             return None, None # No encontrado
         except Exception as e:
             QMessageBox.critical(None, "Error de Búsqueda", f"Error al buscar código: {e}")
-            return None, None
\ No newline at end of file
+            return None, None
+
+    def cerrar(self):
+        """Escribe a disco los cambios pendientes de la sesión."""
+        self.session.cerrar()
@@ -4,6 +4,8 @@ import uuid
 import hashlib
 import qrcode
 from PySide2.QtWidgets import QMessageBox, QApplication
+from serial_codes import componer_codigo
+from qr_batch import guardar_qr_lote
 
 def generate_qr_code(data, subfolder_name=None):
     """
@@ -72,6 +74,29 @@ def generate_barcode(serial_code, subfolder_name=None):
         print(f"Error crítico al generar código QR: {e}")
         return None
 
+def qr_code_path(data, subfolder_name=None):
+    """Ruta donde generate_qr_code() guarda el QR de 'data'."""
+    folder = os.path.join("codes", subfolder_name) if subfolder_name else "codes"
+    safe_data = data.replace('/', '_').replace(' ', '_').replace('\\', '_').replace(':', '_')
+    return os.path.join(folder, f"qr_{safe_data}.png")
+
+def generate_barcodes(serial_codes, subfolder_name=None):
+    """
+    Genera los QR de varios códigos a la vez (repartidos entre los núcleos si
+    son muchos, ver qr_batch.codificar_qr_lote) con los mismos parámetros que
+    generate_qr_code().
+
+    Returns:
+        list: Ruta de cada QR, en el mismo orden (None si falla).
+    """
+    serial_codes = list(serial_codes)
+    try:
+        rutas = [qr_code_path(code, subfolder_name) for code in serial_codes]
+        return guardar_qr_lote(serial_codes, rutas, nivel="L")
+    except Exception as e:
+        print(f"Error generando los códigos QR: {e}")
+        return [None] * len(serial_codes)
+
 def shorten_serial_code(code: str, length: int = 8) -> str:
     """Return a short hash from a given code"""
     hash_object = hashlib.sha1(code.encode())
@@ -89,17 +114,8 @@ def generate_serial_code(ticket_number, referencia, color, tallas_cantidades, wo
             break
 
     unique_id_segment = str(uuid.uuid4().hex)[:6]
-    safe_ticket = ticket_number.replace('-', '')[:3]
-    safe_ref = referencia.replace('-', '')[:2]
-
-    serial_code = (
-        f"{safe_ticket}-"
-        f"{safe_ref}-"
-        f"{work_type_abbr}-"
-        f"{talla_char}-"
-        f"{unique_id_segment}"
-    )
-    return serial_code.upper()
+    # serial_codes.decodificar_codigo() lee este mismo formato al escanear
+    return componer_codigo(ticket_number, referencia, work_type_abbr, talla_char, unique_id_segment)
 
 # Main loop (assuming it's part of a class)
 def generate_codes(self, ticket_number, referencia, color, tallas_cantidades, valores_trabajo):
@@ -113,13 +129,15 @@ def generate_codes(self, ticket_number, referencia, color, tallas_cantidades, va
     # Itera sobre el diccionario de abreviaturas actualizado
     for work_type, abbr in self.WORK_TYPE_ABBREVIATIONS.items():
         if work_type in valores_trabajo:
-            serial_code = generate_serial_code(ticket_number, referencia, color, tallas_cantidades, abbr)
-            barcode_path = generate_barcode(serial_code, subfolder_name=subfolder_name_for_codes)
-            if not barcode_path:
-                QMessageBox.critical(self, "Error", f"Error al generar el código QR para {work_type}.")
-                return
-            serial_codes[work_type] = serial_code
-            barcode_paths[work_type] = barcode_path
+            serial_codes[work_type] = generate_serial_code(ticket_number, referencia, color, tallas_cantidades, abbr)
+
+    # Los QR de todos los tipos de trabajo se generan en un solo lote
+    paths = generate_barcodes(serial_codes.values(), subfolder_name=subfolder_name_for_codes)
+    for work_type, barcode_path in zip(serial_codes, paths):
+        if not barcode_path:
+            QMessageBox.critical(self, "Error", f"Error al generar el código QR para {work_type}.")
+            return
+        barcode_paths[work_type] = barcode_path
 
     return serial_codes, barcode_paths
 
@@ -0,0 +1,122 @@
+# latencias.py
+
+import os
+import json
+import math
+import time
+import threading
+import datetime as dt
+from collections import deque
+from contextlib import contextmanager
+
+
+class HistogramaLatencia:
+    """
+    Latencias recientes de una etapa, con percentiles sobre una ventana móvil.
+
+    Solo se guardan las últimas 'ventana' muestras (en segundos), así que los
+    percentiles reflejan el comportamiento actual y la memoria queda acotada.
+    """
+
+    def __init__(self, ventana=2000):
+        self._muestras = deque(maxlen=ventana)
+        self.total = 0  # Muestras registradas desde el inicio (no solo las de la ventana)
+
+    def agregar(self, segundos):
+        self._muestras.append(segundos)
+        self.total += 1
+
+    def percentil(self, p, ordenadas=None):
+        """Percentil p (0-100) de la ventana, en segundos; None si no hay muestras."""
+        ordenadas = ordenadas if ordenadas is not None else sorted(self._muestras)
+        if not ordenadas:
+            return None
+        pos = min(len(ordenadas) - 1, max(0, math.ceil(p / 100 * len(ordenadas)) - 1))  # Rango más cercano
+        return ordenadas[pos]
+
+    def resumen(self):
+        """Diccionario con n, p50, p95, p99, máximo y media de la ventana, en milisegundos."""
+        ordenadas = sorted(self._muestras)
+        if not ordenadas:
+            return {"n": 0, "total": self.total}
+        ms = lambda s: round(s * 1000, 3)
+        return {
+            "n": len(ordenadas),
+            "total": self.total,
+            "p50_ms": ms(self.percentil(50, ordenadas)),
+            "p95_ms": ms(self.percentil(95, ordenadas)),
+            "p99_ms": ms(self.percentil(99, ordenadas)),
+            "max_ms": ms(ordenadas[-1]),
+            "media_ms": ms(sum(ordenadas) / len(ordenadas)),
+        }
+
+
+class MedidorLatencias:
+    """
+    Mide cuánto tarda cada etapa de una operación (p. ej. el escaneo de un vale)
+    con un reloj monotónico y acumula un HistogramaLatencia por etapa.
+
+    Uso:
+        with medidor.medir("busqueda"):
+            ...
+
+    Es seguro usarlo desde varios hilos (la interfaz y el hilo del modo ráfaga).
+    """
+
+    def __init__(self, ventana=2000, json_path=None):
+        """
+        Args:
+            ventana (int): Muestras recientes que se conservan por etapa.
+            json_path (str): Archivo donde volcar() escribe los percentiles.
+        """
+        self.ventana = ventana
+        self.json_path = json_path
+        self._lock = threading.Lock()
+        self._etapas = {}  # Nombre -> HistogramaLatencia, en orden de aparición
+
+    def registrar(self, etapa, segundos):
+        """Añade una muestra (en segundos) a una etapa."""
+        with self._lock:
+            histograma = self._etapas.get(etapa)
+            if histograma is None:
+                histograma = self._etapas[etapa] = HistogramaLatencia(self.ventana)
+            histograma.agregar(segundos)
+
+    @contextmanager
+    def medir(self, etapa):
+        """Mide el bloque 'with' y lo registra en la etapa, aunque lance una excepción."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio)
+
+    def resumen(self):
+        """Percentiles de todas las etapas: {etapa: {"n", "p50_ms", ...}}."""
+        with self._lock:
+            return {etapa: histograma.resumen() for etapa, histograma in self._etapas.items()}
+
+    def volcar(self, json_path=None):
+        """
+        Escribe los percentiles en un archivo JSON (temporal + renombrado atómico).
+
+        Returns:
+            str: Ruta del archivo escrito, o None si no hay ruta configurada.
+        """
+        json_path = json_path or self.json_path
+        if not json_path:
+            return None
+        datos = {
+            "generado": dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "etapas": self.resumen(),
+        }
+        tmp_path = json_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, json_path)
+        return json_path
+
+    def reiniciar(self):
+        """Descarta todas las muestras."""
+        with self._lock:
+            self._etapas = {}
@@ -1,4 +1,6 @@
+import os
 import sys
+import socket
 from PySide2 import QtWidgets, QtGui
 from PySide2.QtCore import Qt, QEvent
 # GUI FILE
@@ -13,12 +15,16 @@ from generate_pdf import *
 from ui_manager import UIManager
 from generateCodes import *
 # Importaciones de los nuevos módulos
-from excel_handler import ExcelHandler
+from sqlite_handler import SQLiteHandler
 from employee_manager import EmployeeManager
 from vale_manager import ValeManager
+from latencias import MedidorLatencias
 # from code_manager import CodeManager # Si decides crearlo
 from autocomplete_manager import AutocompletadoManager
-from config import TIPOS_DE_TRABAJO, WORK_TYPE_ABBREVIATIONS, CAMPOS_VALOR_TRABAJO_MAP
+from config import (
+    TIPOS_DE_TRABAJO, WORK_TYPE_ABBREVIATIONS, CAMPOS_VALOR_TRABAJO_MAP,
+    TRABAJOS_HEADERS, VALES_HEADERS, EMPLEADOS_HEADERS
+)
 
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
@@ -29,11 +35,17 @@ class MainWindow(QtWidgets.QMainWindow):
         self.table_model = None # El modelo de la tabla de vales vivirá aquí
 
         # --- INICIALIZACIÓN DE GESTORES ---
-        self.excel_handler = ExcelHandler()
+        # SQLite es el almacenamiento principal; el .xlsx solo se usa para exportar/importar
+        self.excel_handler = SQLiteHandler()
         self.ui_manager = UIManager(self)
         self.employee_manager = EmployeeManager(self.excel_handler, self.ui_manager)
-        self.vale_manager = ValeManager(self.excel_handler, self.ui_manager)
-        self.autocompletado_manager = AutocompletadoManager(excel_path=self.excel_handler.excel_path, sheet_name="Trabajos")
+        # Latencia de cada etapa del escaneo (percentiles en la página de Configuración y en JSON)
+        estacion = os.environ.get("DRIVERQR_ESTACION") or socket.gethostname()
+        self.latencias = MedidorLatencias(
+            json_path=f"{os.path.splitext(self.excel_handler.excel_path)[0]}_latencias_{estacion}.json"
+        )
+        self.vale_manager = ValeManager(self.excel_handler, self.ui_manager, medidor=self.latencias)
+        self.autocompletado_manager = AutocompletadoManager(excel_path=self.excel_handler.excel_path, sheet_name="Trabajos", storage=self.excel_handler)
 
         # --- CONFIGURACIÓN INICIAL ---
         self.setup_application()
@@ -47,12 +59,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui_manager.setup_window()
         self.ui_manager.setup_menus_and_buttons()
 
-        # 2. Inicializar la base de datos Excel
-        # Define tus cabeceras aquí o impórtalas desde config.py
-        trabajos_headers = ["Código Serial", "Número Ticket", "Referencia", "Color", ...]
-        vales_headers = ["ID_Vale", "EmpleadoID", "FechaHora_Generacion", ...]
-        empleados_headers = ["Nombre", "Cedula", "Celular", "Correo", "EmpleadoId"]
-        self.excel_handler.inicializar_database(trabajos_headers, vales_headers, empleados_headers)
+        # 2. Inicializar la base de datos (las cabeceras vienen de config.py)
+        self.excel_handler.inicializar_database(TRABAJOS_HEADERS, VALES_HEADERS, EMPLEADOS_HEADERS)
 
         # 3. Configurar la vista del lector de códigos
         vale_table_headers = ["Código", "Ticket", "Referencia", "Trabajo", "Color", "Producido", "Valor"]
@@ -63,6 +71,12 @@ class MainWindow(QtWidgets.QMainWindow):
         
         # 5. Configurar autocompletado
         self.setup_autocompletado_fields()
+
+        # 6. Panel de latencias del escaneo en la página de Configuración
+        self.ui_manager.setup_panel_latencias(self.latencias)
+
+        # 7. Exportar / importar la base de datos en .xlsx bajo demanda
+        self.ui_manager.setup_panel_excel()
         
     # --- HANDLERS DE EVENTOS (DELEGAN A LOS GESTORES) ---
 
@@ -82,11 +96,11 @@ class MainWindow(QtWidgets.QMainWindow):
         scanned_code = self.ui.codeReaderInput.text().strip()
         empleado_id = self.ui.EmpleadosBox.currentData()
         
-        # Obtener códigos ya en la tabla para evitar duplicados
-        current_codes = [self.table_model.item(row, 0).text() for row in range(self.table_model.rowCount())]
+        # El modelo de la tabla responde 'codigo in modelo' en O(1), sin armar una lista por escaneo
+        current_codes = self.table_model
         
         # Definir las columnas donde buscar (deberían venir de config.py)
-        work_type_columns = {wt: f"Código_{abbr}" for wt, abbr in WORK_TYPE_ABBREVIATIONS.items()}
+        work_type_columns = {wt: f"Código_{wt}" for wt in WORK_TYPE_ABBREVIATIONS.keys()}
 
         self.vale_manager.process_scanned_code(scanned_code, empleado_id, current_codes, work_type_columns)
         self.ui.codeReaderInput.clear()
@@ -108,6 +122,32 @@ class MainWindow(QtWidgets.QMainWindow):
         """Se activa al pulsar 'Actualizar DB'."""
         self.employee_manager.generate_and_update_reports()
 
+    def exportar_base_excel(self):
+        """Se activa al pulsar 'Exportar a Excel': escribe todas las tablas en un .xlsx."""
+        ruta = self.ui_manager.pedir_ruta_excel(True, self.excel_handler.excel_path)
+        if not ruta:
+            return
+        if self.excel_handler.exportar_a_excel(ruta):
+            QtWidgets.QMessageBox.information(self, "Exportación Completa", f"Base de datos exportada a:\n{os.path.abspath(ruta)}")
+
+    def importar_base_excel(self):
+        """Se activa al pulsar 'Importar desde Excel': añade las filas de un .xlsx a las tablas."""
+        ruta = self.ui_manager.pedir_ruta_excel(False, os.path.dirname(os.path.abspath(self.excel_handler.excel_path)))
+        if not ruta:
+            return
+        respuesta = QtWidgets.QMessageBox.question(
+            self, "Importar desde Excel",
+            f"Las filas de '{os.path.basename(ruta)}' se añadirán a la base de datos actual "
+            "(las que ya existan quedarán repetidas). ¿Desea continuar?",
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No
+        )
+        if respuesta != QtWidgets.QMessageBox.Yes:
+            return
+        importadas = self.excel_handler.importar_desde_excel(ruta)
+        if importadas:
+            self.employee_manager.load_employees_to_ui()
+            QtWidgets.QMessageBox.information(self, "Importación Completa", f"{importadas} filas importadas desde '{os.path.basename(ruta)}'.")
+
     def eliminar_todo_con_backup(self):
         """Lógica para eliminar la base de datos con backup."""
         # Esta lógica puede ir en un módulo 'backup_manager.py'
@@ -134,6 +174,14 @@ class MainWindow(QtWidgets.QMainWindow):
         elif btnWidget.objectName() == "btn_new_user":
             self.ui.stackedWidget.setCurrentWidget(self.ui.page_widgets)
 
+    def closeEvent(self, event):
+        try:
+            self.latencias.volcar()
+        except Exception as e:
+            print(f"No se pudieron guardar las latencias del escaneo: {e}")
+        self.excel_handler.cerrar()
+        super().closeEvent(event)
+
     def mousePressEvent(self, event):
         self.dragPos = event.globalPos()
 
@@ -0,0 +1,241 @@
+import os
+import sqlite3
+import datetime as dt
+from openpyxl import Workbook, load_workbook
+from PySide2.QtWidgets import QMessageBox
+from serial_codes import columnas_para_codigo
+
+
+class SQLiteHandler:
+    """
+    Motor de almacenamiento sobre sqlite3 con la misma interfaz que ExcelHandler.
+
+    Las hojas 'Trabajos', 'Vales' y 'Empleados' se guardan como tablas indexadas y
+    cada escritura es una transacción de una sola fila. El archivo .xlsx queda
+    solo como formato de exportación e importación bajo demanda.
+
+    Solo lo usa new_version (una estación por base de datos). La aplicación
+    principal sigue sobre el .xlsx (WorkbookSession, ValesShardStore), porque
+    varias estaciones comparten el archivo en una carpeta de red y SQLite en modo
+    WAL no funciona sobre un sistema de archivos de red.
+    """
+
+    def __init__(self, db_path="trabajos_database.sqlite3", excel_path="trabajos_database.xlsx"):
+        self.db_path = db_path
+        self.excel_path = excel_path
+        self.trabajos_sheet_name = "Trabajos"
+        self.vales_sheet_name = "Vales"
+        self.empleados_sheet_name = "Empleados"
+        self.headers = {}  # Nombre de tabla -> lista de columnas en orden
+
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    @staticmethod
+    def _q(nombre):
+        """Escapa un nombre de tabla o columna (las cabeceras llevan espacios y tildes)."""
+        return '"' + str(nombre).replace('"', '""') + '"'
+
+    @staticmethod
+    def _normalizar(valor):
+        """Convierte los valores que sqlite3 no guarda de forma nativa."""
+        if isinstance(valor, dt.datetime):
+            return valor.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(valor, (dt.date, dt.time)):
+            return valor.isoformat()
+        return valor
+
+    def _columnas_indexadas(self, tabla, headers):
+        """Columnas por las que se busca: códigos seriales, IDs, cédula y fecha."""
+        if tabla == self.trabajos_sheet_name:
+            return [h for h in headers if h.startswith("Código")]
+        if tabla == self.vales_sheet_name:
+            return [h for h in ("Codigo_Serial_Trabajo_Asociado", "EmpleadoID", "FechaHora_Generacion") if h in headers]
+        return [h for h in ("Cedula", "EmpleadoId") if h in headers]
+
+    def _crear_tabla(self, tabla, headers):
+        columnas = ", ".join(self._q(h) for h in headers)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self._q(tabla)} ({columnas})")
+        # Añadir columnas nuevas si la tabla ya existía con otra cabecera
+        existentes = [row[1] for row in self.conn.execute(f"PRAGMA table_info({self._q(tabla)})")]
+        for header in headers:
+            if header not in existentes:
+                self.conn.execute(f"ALTER TABLE {self._q(tabla)} ADD COLUMN {self._q(header)}")
+        for header in self._columnas_indexadas(tabla, headers):
+            nombre_indice = f"idx_{tabla}_{header}".replace(" ", "_")
+            self.conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self._q(nombre_indice)} ON {self._q(tabla)} ({self._q(header)})"
+            )
+        self.headers[tabla] = list(headers)
+
+    def inicializar_database(self, trabajos_headers, vales_headers, empleados_headers):
+        """
+        Crea las tablas e índices si no existen. Si la base de datos está vacía y
+        existe el archivo Excel, importa su contenido una sola vez.
+        """
+        with self.conn:
+            self._crear_tabla(self.trabajos_sheet_name, trabajos_headers)
+            self._crear_tabla(self.vales_sheet_name, vales_headers)
+            self._crear_tabla(self.empleados_sheet_name, empleados_headers)
+
+        vacia = all(
+            self.conn.execute(f"SELECT 1 FROM {self._q(t)} LIMIT 1").fetchone() is None
+            for t in self.headers
+        )
+        if vacia and os.path.exists(self.excel_path):
+            print(f"Importando datos existentes desde '{self.excel_path}'...")
+            self.importar_desde_excel(self.excel_path)
+
+    def _insertar(self, tabla, row_data):
+        headers = self.headers[tabla]
+        valores = [self._normalizar(v) for v in list(row_data)[:len(headers)]]
+        columnas = ", ".join(self._q(h) for h in headers[:len(valores)])
+        marcadores = ", ".join("?" for _ in valores)
+        with self.conn:
+            self.conn.execute(f"INSERT INTO {self._q(tabla)} ({columnas}) VALUES ({marcadores})", valores)
+
+    def guardar_trabajo(self, row_data):
+        """Guarda una nueva fila en la tabla 'Trabajos'."""
+        try:
+            self._insertar(self.trabajos_sheet_name, row_data)
+            return True
+        except sqlite3.Error as e:
+            QMessageBox.critical(None, "Error de Base de Datos", f"Error al guardar trabajo: {e}")
+            return False
+
+    def guardar_vale(self, vale_data):
+        """Guarda un nuevo vale en la tabla 'Vales'."""
+        try:
+            self._insertar(self.vales_sheet_name, vale_data)
+            return True
+        except sqlite3.Error as e:
+            QMessageBox.critical(None, "Error de Base de Datos", f"Error al guardar vale: {e}")
+            return False
+
+    def guardar_empleado(self, empleado_data):
+        """Guarda un nuevo empleado en la tabla 'Empleados'."""
+        try:
+            self._insertar(self.empleados_sheet_name, empleado_data)
+            return True
+        except sqlite3.Error as e:
+            QMessageBox.critical(None, "Error de Base de Datos", f"Error al guardar empleado: {e}")
+            return False
+
+    def leer_empleados(self):
+        """Lee todos los empleados de la tabla 'Empleados'."""
+        try:
+            cursor = self.conn.execute(
+                f'SELECT "Nombre", "EmpleadoId" FROM {self._q(self.empleados_sheet_name)} ORDER BY rowid'
+            )
+            return [{"nombre": nombre, "id": emp_id} for nombre, emp_id in cursor if nombre and emp_id]
+        except sqlite3.Error as e:
+            print(f"Error al leer empleados: {e}")
+            return []
+
+    def buscar_trabajo_por_codigo(self, scanned_code, work_type_columns):
+        """
+        Busca un trabajo por su código serial usando el índice de cada columna de tipo
+        de trabajo. Si el código trae la abreviatura de un tipo de trabajo se hace una
+        sola consulta; un código mal formado se rechaza sin consultar.
+        """
+        try:
+            tabla = self.trabajos_sheet_name
+            headers = self.headers[tabla]
+            for work_type, column_name in columnas_para_codigo(scanned_code, work_type_columns):
+                if column_name not in headers:
+                    continue
+                row_values = self.conn.execute(
+                    f"SELECT {', '.join(self._q(h) for h in headers)} FROM {self._q(tabla)} "
+                    f"WHERE {self._q(column_name)} = ? LIMIT 1",
+                    (scanned_code,)
+                ).fetchone()
+                if row_values:
+                    return dict(zip(headers, row_values)), work_type
+            return None, None
+        except sqlite3.Error as e:
+            QMessageBox.critical(None, "Error de Búsqueda", f"Error al buscar código: {e}")
+            return None, None
+
+    def valores_unicos(self, tabla, columna):
+        """Valores distintos (no vacíos) de una columna, para el autocompletado."""
+        if columna not in self.headers.get(tabla, []):
+            return []
+        cursor = self.conn.execute(
+            f"SELECT DISTINCT {self._q(columna)} FROM {self._q(tabla)} WHERE {self._q(columna)} IS NOT NULL"
+        )
+        return [str(valor).strip() for (valor,) in cursor if str(valor).strip()]
+
+    # --- EXPORTACIÓN / IMPORTACIÓN EXCEL ---
+
+    def exportar_a_excel(self, excel_path=None):
+        """
+        Escribe todas las tablas en un archivo .xlsx (una hoja por tabla).
+
+        Returns:
+            str: Ruta del archivo generado o None si falla.
+        """
+        excel_path = excel_path or self.excel_path
+        try:
+            wb = Workbook(write_only=True)
+            for tabla, headers in self.headers.items():
+                ws = wb.create_sheet(title=tabla)
+                ws.append(headers)
+                cursor = self.conn.execute(
+                    f"SELECT {', '.join(self._q(h) for h in headers)} FROM {self._q(tabla)} ORDER BY rowid"
+                )
+                for row_values in cursor:
+                    ws.append(list(row_values))
+            wb.save(excel_path)
+            print(f"Base de datos exportada a '{excel_path}'.")
+            return excel_path
+        except PermissionError:
+            QMessageBox.critical(None, "Error al Exportar", f"Permiso denegado para escribir en '{excel_path}'. Asegúrese de que no esté abierto.")
+            return None
+        except Exception as e:
+            QMessageBox.critical(None, "Error al Exportar", f"Error al exportar a Excel: {e}")
+            return None
+
+    def importar_desde_excel(self, excel_path=None):
+        """
+        Añade a las tablas las filas de las hojas del mismo nombre en un archivo .xlsx,
+        emparejando las columnas por nombre, en una sola transacción.
+
+        Returns:
+            int: Número de filas importadas.
+        """
+        excel_path = excel_path or self.excel_path
+        importadas = 0
+        try:
+            wb = load_workbook(excel_path, read_only=True)
+            with self.conn:
+                for tabla, headers in self.headers.items():
+                    if tabla not in wb.sheetnames:
+                        continue
+                    filas = wb[tabla].iter_rows(values_only=True)
+                    cabecera = next(filas, None)
+                    if not cabecera:
+                        continue
+                    posiciones = [(h, cabecera.index(h)) for h in headers if h in cabecera]
+                    if not posiciones:
+                        continue
+                    columnas = ", ".join(self._q(h) for h, _ in posiciones)
+                    marcadores = ", ".join("?" for _ in posiciones)
+                    datos = (
+                        [self._normalizar(row[idx]) if idx < len(row) else None for _, idx in posiciones]
+                        for row in filas if any(v is not None for v in row)
+                    )
+                    cursor = self.conn.executemany(
+                        f"INSERT INTO {self._q(tabla)} ({columnas}) VALUES ({marcadores})", datos
+                    )
+                    importadas += cursor.rowcount
+            wb.close()
+            print(f"{importadas} filas importadas desde '{excel_path}'.")
+            return importadas
+        except Exception as e:
+            QMessageBox.critical(None, "Error al Importar", f"Error al importar desde Excel: {e}")
+            return 0
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos."""
+        self.conn.close()
@@ -1,11 +1,14 @@
 # ui_manager.py
+import os
 from PySide2 import QtCore, QtGui, QtWidgets
 from PySide2.QtCore import QPropertyAnimation, QSize, Qt
-from PySide2.QtGui import QFont, QIcon, QColor, QStandardItemModel, QStandardItem
+from PySide2.QtGui import QFont, QIcon, QColor
 from PySide2.QtWidgets import (
     QPushButton, QSizePolicy, QGraphicsDropShadowEffect, QSizeGrip,
-    QHeaderView, QVBoxLayout, QTableView
+    QHeaderView, QVBoxLayout, QTableView, QGroupBox, QHBoxLayout,
+    QTableWidget, QTableWidgetItem, QAbstractItemView, QMessageBox, QFileDialog
 )
+from vale_table_model import ValeTableModel
 
 # Puedes importar tus estilos si los tienes en un archivo separado
 from ui_styles import Style 
@@ -190,15 +193,106 @@ class UIManager:
         for emp in employees:
             self.ui.EmpleadosBox.addItem(f"{emp['nombre']} ({emp['id']})", emp['id'])
 
+    def setup_code_reader_view(self, headers):
+        """Crea la tabla de previsualización de vales dentro de WidgetTabla."""
+        self.main_window.table_model = ValeTableModel(headers)
+        if not hasattr(self.ui, 'WidgetTabla'):
+            print("Warning: WidgetTabla not found in UI")
+            return
+        layout = self.ui.WidgetTabla.layout() or QVBoxLayout(self.ui.WidgetTabla)
+        if not hasattr(self.ui, 'tableViewVale'):
+            self.ui.tableViewVale = QTableView(self.ui.WidgetTabla)
+            self.ui.tableViewVale.setMinimumHeight(200)
+            layout.addWidget(self.ui.tableViewVale)
+        self.ui.tableViewVale.setModel(self.main_window.table_model)
+        self.ui.tableViewVale.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
     def add_row_to_vale_table(self, row_data):
         """Añade una fila a la tabla de previsualización de vales."""
-        items = [QStandardItem(str(value) if value is not None else "") for value in row_data]
-        self.main_window.table_model.appendRow(items)
+        self.main_window.table_model.agregar_fila(row_data)
     
     def clear_vale_table(self):
         """Limpia la tabla de previsualización de vales."""
-        if hasattr(self.main_window, 'table_model'):
-            self.main_window.table_model.removeRows(0, self.main_window.table_model.rowCount())
+        if getattr(self.main_window, 'table_model', None) is not None:
+            self.main_window.table_model.limpiar()
+
+    def setup_panel_latencias(self, latencias):
+        """Agrega a la página de Configuración una tabla con los percentiles de latencia del escaneo."""
+        if not hasattr(self.ui, 'create_user') or not hasattr(self.ui, 'verticalLayout_11'):
+            print("Advertencia: página de Configuración no encontrada; no se muestra el panel de latencias.")
+            return
+        self.latencias = latencias
+
+        grupo = QGroupBox("Latencia del escaneo (ms)", self.ui.create_user)
+        grupo.setMaximumHeight(230)
+        layout = QVBoxLayout(grupo)
+
+        self.ui.tablaLatencias = QTableWidget(0, 7, grupo)
+        self.ui.tablaLatencias.setHorizontalHeaderLabels(["Etapa", "N", "p50", "p95", "p99", "Máx", "Media"])
+        self.ui.tablaLatencias.verticalHeader().setVisible(False)
+        self.ui.tablaLatencias.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.ui.tablaLatencias.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.ui.tablaLatencias)
+
+        botones = QHBoxLayout()
+        btn_actualizar = QPushButton("Actualizar", grupo)
+        btn_actualizar.clicked.connect(self.actualizar_panel_latencias)
+        btn_exportar = QPushButton("Guardar JSON", grupo)
+        btn_exportar.clicked.connect(self.exportar_latencias)
+        botones.addWidget(btn_actualizar)
+        botones.addWidget(btn_exportar)
+        layout.addLayout(botones)
+
+        self.ui.verticalLayout_11.addWidget(grupo)
+
+    def actualizar_panel_latencias(self):
+        """Vuelve a llenar la tabla de latencias con los percentiles actuales."""
+        if not hasattr(self.ui, 'tablaLatencias'):
+            return
+        resumen = self.latencias.resumen()
+        self.ui.tablaLatencias.setRowCount(len(resumen))
+        columnas = ["n", "p50_ms", "p95_ms", "p99_ms", "max_ms", "media_ms"]
+        for fila, (etapa, datos) in enumerate(resumen.items()):
+            self.ui.tablaLatencias.setItem(fila, 0, QTableWidgetItem(etapa))
+            for col, clave in enumerate(columnas, start=1):
+                valor = datos.get(clave)
+                self.ui.tablaLatencias.setItem(fila, col, QTableWidgetItem("" if valor is None else str(valor)))
+
+    def exportar_latencias(self):
+        """Guarda los percentiles de latencia en el archivo JSON de la estación."""
+        try:
+            ruta = self.latencias.volcar()
+            self.actualizar_panel_latencias()
+            QMessageBox.information(self.main_window, "Latencias Guardadas", f"Percentiles guardados en:\n{os.path.abspath(ruta)}")
+        except Exception as e:
+            QMessageBox.critical(self.main_window, "Error", f"No se pudieron guardar las latencias: {e}")
+
+    def setup_panel_excel(self):
+        """Agrega a la página de Configuración los botones para exportar e importar la base de datos en .xlsx."""
+        if not hasattr(self.ui, 'create_user') or not hasattr(self.ui, 'verticalLayout_11'):
+            print("Advertencia: página de Configuración no encontrada; no se muestra el panel de Excel.")
+            return
+
+        grupo = QGroupBox("Base de datos en Excel", self.ui.create_user)
+        botones = QHBoxLayout(grupo)
+        btn_exportar = QPushButton("Exportar a Excel", grupo)
+        btn_exportar.clicked.connect(self.main_window.exportar_base_excel)
+        btn_importar = QPushButton("Importar desde Excel", grupo)
+        btn_importar.clicked.connect(self.main_window.importar_base_excel)
+        botones.addWidget(btn_exportar)
+        botones.addWidget(btn_importar)
+
+        self.ui.verticalLayout_11.addWidget(grupo)
+
+    def pedir_ruta_excel(self, guardar, ruta_inicial):
+        """Pide al usuario un archivo .xlsx para exportar (guardar=True) o importar. Retorna la ruta o None."""
+        if guardar:
+            ruta, _ = QFileDialog.getSaveFileName(self.main_window, "Exportar a Excel", ruta_inicial, "Excel (*.xlsx)")
+            if ruta and not ruta.lower().endswith(".xlsx"):
+                ruta += ".xlsx"
+        else:
+            ruta, _ = QFileDialog.getOpenFileName(self.main_window, "Importar desde Excel", ruta_inicial, "Excel (*.xlsx)")
+        return ruta or None
 
     def clear_employee_form(self):
         """Limpia los campos del formulario de agregar empleado."""
@@ -2,16 +2,21 @@ import time
 import uuid
 import datetime as dt
 from PySide2.QtWidgets import QMessageBox
+from latencias import MedidorLatencias
 
 class ValeManager:
-    def __init__(self, excel_handler, ui_manager):
+    def __init__(self, excel_handler, ui_manager, medidor=None):
         self.excel_handler = excel_handler
         self.ui_manager = ui_manager
+        # Latencia por etapa del escaneo; self.latencias.volcar(ruta) escribe los percentiles en JSON
+        self.latencias = medidor or MedidorLatencias()
 
     def process_scanned_code(self, scanned_code, empleado_id, current_table_codes, work_type_columns):
         """
         Procesa un código escaneado: valida, busca, y si es válido, lo registra y actualiza la UI.
+        Cada etapa se mide en self.latencias; 'total' excluye el tiempo de los mensajes.
         """
+        inicio = time.perf_counter()
         if not scanned_code:
             QMessageBox.warning(None, "Entrada Vacía", "Por favor, ingrese un código.")
             return
@@ -21,7 +26,9 @@ class ValeManager:
             return
 
         # 1. Validar si ya está en la tabla de la UI
-        if scanned_code in current_table_codes:
+        with self.latencias.medir("validacion_tabla"):
+            en_tabla = scanned_code in current_table_codes
+        if en_tabla:
             QMessageBox.warning(None, "Vale Duplicado", f"El código '{scanned_code}' ya está en la lista actual.")
             return
         
@@ -29,14 +36,15 @@ class ValeManager:
         # ... Aquí iría una llamada a self.excel_handler.is_vale_already_registered(scanned_code) ...
 
         # 3. Buscar el código en la hoja "Trabajos"
-        trabajo_data, work_type_found = self.excel_handler.buscar_trabajo_por_codigo(scanned_code, work_type_columns)
+        with self.latencias.medir("busqueda"):
+            trabajo_data, work_type_found = self.excel_handler.buscar_trabajo_por_codigo(scanned_code, work_type_columns)
 
         if not trabajo_data:
             QMessageBox.warning(None, "Código No Encontrado", f"El código '{scanned_code}' no se encontró en la base de datos de trabajos.")
             return
             
         # 4. Extraer datos y crear la fila para la hoja "Vales"
-        id_vale = f"V{int(time.time())}{str(uuid.uuid4())[:4]}"
+        id_vale = f"V{uuid.uuid4().hex}"  # Sin colisiones aunque se registren muchos vales en el mismo segundo
         fecha_hora = dt.datetime.now()
         
         # Simplificando la extracción de datos
@@ -53,10 +61,14 @@ class ValeManager:
         ]
         
         # 5. Guardar en Excel
-        if self.excel_handler.guardar_vale(vale_row_to_save):
+        with self.latencias.medir("guardado"):
+            guardado = self.excel_handler.guardar_vale(vale_row_to_save)
+        if guardado:
             # 6. Actualizar la tabla de la UI si se guardó correctamente
             row_for_ui = [scanned_code, ticket_number, referencia, work_type_found, color, total_producido, valor_trabajo]
-            self.ui_manager.add_row_to_vale_table(row_for_ui)
+            with self.latencias.medir("tabla"):
+                self.ui_manager.add_row_to_vale_table(row_for_ui)
+            self.latencias.registrar("total", time.perf_counter() - inicio)
             QMessageBox.information(None, "Vale Registrado", f"Vale para '{work_type_found}' registrado exitosamente.")
         else:
             QMessageBox.critical(None, "Error", "No se pudo guardar el vale en la base de datos.")
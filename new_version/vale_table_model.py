@@ -0,0 +1,142 @@
+# vale_table_model.py
+
+from PySide2.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PySide2.QtGui import QBrush, QColor
+
+
+class ValeTableModel(QAbstractTableModel):
+    """
+    Modelo de la tabla de previsualización de vales (tableViewVale).
+
+    Cada fila se guarda como una tupla de textos, sin un QStandardItem por celda,
+    y un diccionario código -> fila hace que comprobar si un código ya está en la
+    tabla sea O(1). Añadir filas al final solo avisa a la vista de las filas
+    nuevas, así que la tabla puede tener miles de vales sin que la interfaz se
+    vuelva lenta.
+    """
+
+    def __init__(self, headers=None, parent=None):
+        super().__init__(parent)
+        self._headers = list(headers or [])
+        self._filas = []        # Tuplas de textos, una por fila
+        self._colores = []      # Color de fondo por fila (o None)
+        self._pinceles = {}     # Color -> QBrush, compartido por todas las filas de ese color
+        self._tooltips = []     # Texto de ayuda por fila (o None)
+        self._fila_por_codigo = {}  # Código (columna 0) -> índice de fila
+
+    # --- INTERFAZ DE QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._filas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        fila = index.row()
+        if role == Qt.DisplayRole:
+            valores = self._filas[fila]
+            return valores[index.column()] if index.column() < len(valores) else ""
+        if role == Qt.BackgroundRole:
+            color = self._colores[fila]
+            if color is None:
+                return None
+            if color not in self._pinceles:
+                self._pinceles[color] = QBrush(QColor(color))
+            return self._pinceles[color]
+        if role == Qt.ToolTipRole:
+            return self._tooltips[fila]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._headers[section] if section < len(self._headers) else None
+        return str(section + 1)
+
+    # --- OPERACIONES ---
+
+    def configurar_columnas(self, headers):
+        """Cambia los encabezados y vacía la tabla (como clear() + setHorizontalHeaderLabels())."""
+        self.beginResetModel()
+        self._headers = list(headers)
+        self._vaciar()
+        self.endResetModel()
+
+    def agregar_fila(self, valores, color=None, tooltip=None, indexar=True):
+        """Añade una fila al final. Ver agregar_filas()."""
+        self.agregar_filas([valores], color=color, tooltip=tooltip, indexar=indexar)
+
+    def agregar_filas(self, filas, color=None, tooltip=None, indexar=True):
+        """
+        Añade varias filas al final con un solo aviso a la vista.
+
+        Args:
+            filas (iterable): Listas de valores; la columna 0 es el código.
+            color (str o list): Color de fondo para todas las filas, o uno por fila.
+            tooltip (str o list): Texto de ayuda para todas las filas, o uno por fila.
+            indexar (bool o list): Registrar el código de la fila para contiene(), para
+                                   todas las filas o uno por fila (p. ej. no se indexan
+                                   las filas de escaneos fallidos).
+        """
+        filas = [tuple("" if v is None else str(v) for v in valores) for valores in filas]
+        if not filas:
+            return
+        colores = color if isinstance(color, list) else [color] * len(filas)
+        tooltips = tooltip if isinstance(tooltip, list) else [tooltip] * len(filas)
+        indexados = indexar if isinstance(indexar, list) else [indexar] * len(filas)
+
+        inicio = len(self._filas)
+        self.beginInsertRows(QModelIndex(), inicio, inicio + len(filas) - 1)
+        for pos, valores in enumerate(filas):
+            if indexados[pos] and valores:
+                self._fila_por_codigo.setdefault(valores[0], inicio + pos)
+            self._filas.append(valores)
+            self._colores.append(colores[pos] or None)
+            self._tooltips.append(tooltips[pos])
+        self.endInsertRows()
+
+    def marcar_fila(self, fila, color=None, tooltip=None, indexar=True):
+        """
+        Cambia el color y el texto de ayuda de una fila. Con indexar=False su
+        código deja de contar para contiene() (p. ej. un vale anulado).
+        """
+        self._colores[fila] = color or None
+        self._tooltips[fila] = tooltip
+        if not indexar and self._filas[fila] and self._fila_por_codigo.get(self._filas[fila][0]) == fila:
+            del self._fila_por_codigo[self._filas[fila][0]]
+        self.dataChanged.emit(self.index(fila, 0), self.index(fila, len(self._headers) - 1),
+                              [Qt.BackgroundRole, Qt.ToolTipRole])
+
+    def contiene(self, codigo):
+        """True si el código está en una fila indexada de la tabla (O(1))."""
+        return codigo in self._fila_por_codigo
+
+    __contains__ = contiene
+
+    def fila_de(self, codigo):
+        """Índice de la fila del código, o None."""
+        return self._fila_por_codigo.get(codigo)
+
+    def valores(self, fila):
+        """Textos de una fila."""
+        return self._filas[fila]
+
+    def codigos(self):
+        """Códigos indexados, en orden de fila."""
+        return sorted(self._fila_por_codigo, key=self._fila_por_codigo.get)
+
+    def limpiar(self):
+        """Quita todas las filas y conserva los encabezados."""
+        self.beginResetModel()
+        self._vaciar()
+        self.endResetModel()
+
+    def _vaciar(self):
+        self._filas = []
+        self._colores = []
+        self._tooltips = []
+        self._fila_por_codigo = {}
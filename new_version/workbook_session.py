@@ -0,0 +1,326 @@
+# workbook_session.py
+
+import os
+import threading
+from filelock import FileLock
+from openpyxl import load_workbook
+
+
+class WorkbookSession:
+    """
+    Sesión de larga duración sobre un libro de Excel.
+
+    Mantiene un único Workbook abierto y compartido por toda la aplicación. Solo lo
+    vuelve a cargar si el archivo cambió en disco (mtime o tamaño), y agrupa los
+    guardados: varias modificaciones seguidas producen una sola escritura.
+
+    Todo acceso al libro debe hacerse con 'lock' tomado, porque el guardado diferido
+    y el compactador de vales corren en otros hilos.
+
+    Las consultas usan filas(), que lee en modo read_only sin cargar el libro
+    completo; libro() solo hace falta para modificarlo.
+
+    Varias estaciones pueden compartir el archivo (p. ej. en una carpeta de red).
+    Los cambios hechos con modificar()/anexar() se guardan como deltas; al guardar
+    se toma un bloqueo de archivo ('<excel>.lock') y, si otra estación escribió
+    desde la última carga, se parte del archivo actual y se vuelven a aplicar los
+    deltas, así que ningún cambio se pierde. 'version_externa' aumenta cada vez que
+    se incorporan cambios de otra estación, para invalidar cachés derivadas.
+    """
+
+    def __init__(self, excel_path, retardo_guardado=1.0, timeout_bloqueo=30):
+        """
+        Args:
+            excel_path (str): Ruta del archivo Excel.
+            retardo_guardado (float): Segundos de inactividad antes de escribir a disco.
+            timeout_bloqueo (float): Segundos máximos de espera por el bloqueo del archivo.
+        """
+        self.excel_path = excel_path
+        self.retardo_guardado = retardo_guardado
+        self.lock = threading.RLock()
+        self.bloqueo_archivo = FileLock(excel_path + ".lock", timeout=timeout_bloqueo)
+        self.version_externa = 0
+        self._wb = None
+        self._firma = None       # (mtime_ns, tamaño) del archivo cuando se cargó/guardó
+        self._modificado = False
+        self._timer = None
+        self._al_guardar = []    # Funciones (wb, firma) llamadas tras cada guardado
+        self._deltas = []        # Funciones wb -> None aplicadas desde el último guardado
+        self._sin_delta = False  # Hubo cambios hechos con marcar_modificado() que no se pueden re-aplicar
+
+    def _firma_en_disco(self):
+        stat = os.stat(self.excel_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def libro(self):
+        """
+        Retorna el Workbook abierto, recargándolo solo si el archivo cambió en disco.
+
+        Raises:
+            FileNotFoundError: Si el archivo no existe y no hay un libro en memoria.
+        """
+        with self.lock:
+            try:
+                firma = self._firma_en_disco()
+            except FileNotFoundError:
+                if self._wb is None or not self._modificado:
+                    self._wb = None
+                    raise
+                return self._wb
+
+            if self._wb is None or firma != self._firma:
+                if self._wb is not None and self._modificado:
+                    # Hay cambios sin guardar: se combinan con el archivo al guardar
+                    return self._wb
+                if self._wb is not None:
+                    self.version_externa += 1
+                self._wb = load_workbook(self.excel_path)
+                self._firma = firma
+            return self._wb
+
+    def cambio_externo(self):
+        """
+        True si otra estación (u otro programa) escribió el archivo desde la última
+        carga o guardado de esta sesión. Si no hay cambios locales, el libro en
+        memoria se descarta para que la siguiente lectura use el archivo nuevo.
+        """
+        with self.lock:
+            try:
+                firma = self._firma_en_disco()
+            except FileNotFoundError:
+                return False
+            if self._firma is None:
+                self._firma = firma
+                return False
+            if firma == self._firma:
+                return False
+            if not self._modificado:
+                self._wb = None
+                self._firma = firma
+                self.version_externa += 1
+            return True
+
+    def firma_actual(self):
+        """
+        Firma del archivo en disco si el libro no tiene cambios sin guardar; None en
+        otro caso (o si el archivo no existe). Sirve para saber si una copia derivada
+        del archivo, como la columnar, sigue al día.
+        """
+        with self.lock:
+            if self._modificado:
+                return None
+            try:
+                return self._firma_en_disco()
+            except FileNotFoundError:
+                return None
+
+    def al_guardar(self, funcion):
+        """Registra funcion(wb, firma), que se llama con el lock y el bloqueo del archivo tomados después de cada guardado."""
+        self._al_guardar.append(funcion)
+
+    def _libro_vigente(self):
+        """True si el libro en memoria refleja el archivo (o tiene cambios sin guardar)."""
+        if self._wb is None:
+            return False
+        if self._modificado:
+            return True
+        try:
+            return self._firma_en_disco() == self._firma
+        except FileNotFoundError:
+            return False
+
+    # --- LECTURA ---
+
+    def nombres_hojas(self):
+        """Nombres de las hojas del libro, sin cargarlo en modo escritura."""
+        with self.lock:
+            if self._libro_vigente():
+                return list(self._wb.sheetnames)
+            wb = load_workbook(self.excel_path, read_only=True)
+            try:
+                return list(wb.sheetnames)
+            finally:
+                wb.close()
+
+    def filas(self, sheet_name, min_row=1, max_row=None, min_col=None, max_col=None):
+        """
+        Lista con las filas (solo valores) de una hoja.
+
+        Si el libro ya está en memoria y vigente se lee de él; si no, el archivo se
+        abre con read_only=True y solo se recorre la hoja pedida, sin construir las
+        celdas ni los estilos del resto (p. ej. las hojas 'Empleado_*'). El libro en
+        modo escritura queda reservado para las modificaciones.
+
+        Las filas se copian con el lock tomado y se retornan ya liberado, así que
+        el llamador puede recorrerlas (o dejarlas a medias) sin bloquear la sesión.
+
+        Raises:
+            FileNotFoundError: Si el archivo no existe y no hay un libro en memoria.
+            KeyError: Si la hoja no existe.
+        """
+        with self.lock:
+            if self._libro_vigente():
+                ws = self._wb[sheet_name]
+                return list(ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col,
+                                         max_col=max_col, values_only=True))
+
+            wb = load_workbook(self.excel_path, read_only=True)
+            try:
+                ws = wb[sheet_name]
+                return list(ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col,
+                                         max_col=max_col, values_only=True))
+            finally:
+                wb.close()
+
+    def cabecera(self, sheet_name):
+        """Primera fila de una hoja como lista (vacía si la hoja no tiene filas)."""
+        filas = self.filas(sheet_name, max_row=1)
+        return list(filas[0]) if filas else []
+
+    # --- ESCRITURA ---
+
+    def reemplazar(self, wb):
+        """Usa un libro nuevo (p. ej. recién creado) y lo guarda de inmediato."""
+        with self.lock:
+            self._wb = wb
+            self.guardar()
+
+    def modificar(self, funcion):
+        """
+        Aplica funcion(wb) al libro, la registra como delta y programa un guardado.
+        Si otra estación guarda antes, la función se vuelve a aplicar sobre su versión.
+
+        Returns:
+            Lo que retorne la función.
+        """
+        with self.lock:
+            resultado = funcion(self.libro())
+            self._deltas.append(funcion)
+            self._programar_guardado()
+            return resultado
+
+    def anexar(self, sheet_name, fila):
+        """Añade una fila al final de una hoja (como delta)."""
+        fila = list(fila)
+        self.modificar(lambda wb: wb[sheet_name].append(fila))
+
+    def marcar_modificado(self):
+        """
+        Programa un guardado diferido tras modificar libro() directamente; cada
+        llamada reinicia la espera. Estos cambios no se pueden re-aplicar: si otra
+        estación escribió antes, el archivo se sobrescribe. Preferir modificar().
+        """
+        with self.lock:
+            self._sin_delta = True
+            self._programar_guardado()
+
+    def _programar_guardado(self):
+        with self.lock:
+            self._modificado = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.retardo_guardado, self._guardar_diferido)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _guardar_diferido(self):
+        try:
+            self.flush()
+        except PermissionError:
+            print(f"No se pudo guardar '{self.excel_path}': el archivo está abierto en otro programa. Se reintentará.")
+            self.marcar_modificado()
+        except Exception as e:
+            print(f"Error al guardar '{self.excel_path}': {e}")
+
+    def guardar(self):
+        """Escribe el libro a disco ahora (archivo temporal + renombrado atómico)."""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._wb is None:
+                return
+            with self.bloqueo_archivo:
+                try:
+                    firma = self._firma_en_disco()
+                except FileNotFoundError:
+                    firma = None
+                if firma is not None and self._firma is not None and firma != self._firma and self._modificado:
+                    if self._sin_delta:
+                        print(f"Advertencia: '{self.excel_path}' cambió en disco; se sobrescribe con los cambios locales.")
+                    else:
+                        # Otra estación guardó: partir de su versión y re-aplicar los cambios locales
+                        wb = load_workbook(self.excel_path)
+                        for funcion in self._deltas:
+                            funcion(wb)
+                        self._wb = wb
+                        self.version_externa += 1
+                tmp_path = f"{self.excel_path}.{os.getpid()}.tmp"
+                self._wb.save(tmp_path)
+                os.replace(tmp_path, self.excel_path)
+                self._firma = self._firma_en_disco()
+                self._modificado = False
+                self._deltas = []
+                self._sin_delta = False
+                # Con el bloqueo aún tomado: p. ej. la copia columnar se escribe sin que
+                # otra estación guarde (y reescriba su copia) a la vez
+                for funcion in self._al_guardar:
+                    try:
+                        funcion(self._wb, self._firma)
+                    except Exception as e:
+                        print(f"Error tras guardar '{self.excel_path}': {e}")
+
+    def flush(self):
+        """Guarda solo si hay cambios pendientes."""
+        with self.lock:
+            if self._modificado:
+                self.guardar()
+
+    def descartar(self):
+        """Olvida el libro en memoria (p. ej. tras eliminar el archivo)."""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._wb = None
+            self._firma = None
+            self._modificado = False
+            self._deltas = []
+            self._sin_delta = False
+
+    def cerrar(self):
+        """Guarda los cambios pendientes antes de salir."""
+        self.flush()
+
+
+# --- BLOQUE DE TESTEO (varias estaciones como procesos) ---
+def _estacion_de_prueba(excel_path, estacion, filas):
+    session = WorkbookSession(excel_path, retardo_guardado=0.05)
+    for i in range(filas):
+        session.anexar("Trabajos", [f"{estacion}-{i}", estacion, i])
+        if i % 5 == 0:
+            session.guardar()
+    session.cerrar()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from multiprocessing import Process
+    from openpyxl import Workbook
+
+    carpeta = tempfile.mkdtemp()
+    excel_path = os.path.join(carpeta, "prueba.xlsx")
+    wb = Workbook()
+    wb.active.title = "Trabajos"
+    wb.active.append(["Código Serial", "Estación", "N"])
+    WorkbookSession(excel_path).reemplazar(wb)
+
+    estaciones, filas = 4, 25
+    procesos = [Process(target=_estacion_de_prueba, args=(excel_path, f"E{n}", filas)) for n in range(estaciones)]
+    for p in procesos:
+        p.start()
+    for p in procesos:
+        p.join()
+
+    guardadas = list(WorkbookSession(excel_path).filas("Trabajos", min_row=2))
+    print(f"Filas esperadas: {estaciones * filas}, filas guardadas: {len(guardadas)}")
@@ -0,0 +1,118 @@
+"""
+Codificación de muchos QR a la vez, repartida entre todos los núcleos.
+
+Al crear tiquetes por lotes cada uno necesita un QR por tipo de trabajo; en
+lugar de codificarlos uno tras otro, codificar_qr_lote() los reparte en un
+ProcessPoolExecutor y retorna los PNG en el mismo orden de los textos.
+"""
+import io
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import qrcode
+
+NIVELES_CORRECCION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+def codificar_qr_png(datos, nivel="M", box_size=10, border=4):
+    """
+    Codifica el QR de un texto como PNG en memoria (bytes). Con los valores por
+    defecto da la misma imagen que qrcode.make().
+    """
+    qr = qrcode.QRCode(error_correction=NIVELES_CORRECCION[nivel], box_size=box_size, border=border)
+    qr.add_data(datos)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer)
+    return buffer.getvalue()
+
+
+def matriz_qr(datos, nivel="M", border=4):
+    """Módulos del QR de un texto (filas de booleanos, True = negro), con su borde."""
+    qr = qrcode.QRCode(error_correction=NIVELES_CORRECCION[nivel], border=border)
+    qr.add_data(datos)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def _mapear(funcion, textos, procesos=None, min_paralelo=64):
+    """funcion(texto) de cada texto, en un ProcessPoolExecutor si son al menos 'min_paralelo'."""
+    procesos = procesos or os.cpu_count() or 1
+    if procesos > 1 and len(textos) >= min_paralelo:
+        chunksize = max(1, len(textos) // (procesos * 4))
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            return list(pool.map(funcion, textos, chunksize=chunksize))
+    return [funcion(texto) for texto in textos]
+
+
+def codificar_qr_lote(textos, cache=None, procesos=None, min_paralelo=64, **opciones):
+    """
+    Codifica los QR de una lista de textos.
+
+    Los textos repetidos se codifican una vez y los que ya están en la caché no se
+    codifican. Si quedan al menos 'min_paralelo' por codificar se reparten en un
+    ProcessPoolExecutor (arrancar los procesos no compensa para pocos QR).
+
+    Args:
+        textos (list): Textos a codificar.
+        cache (QRCache): Caché donde buscar y guardar las imágenes (opcional).
+        procesos (int): Procesos del pool (por defecto, uno por núcleo).
+        min_paralelo (int): QR por codificar a partir de los cuales se usa el pool.
+        **opciones: nivel, box_size y border de codificar_qr_png().
+
+    Returns:
+        list: Bytes PNG de cada texto, en el mismo orden.
+    """
+    imagenes = {}
+    pendientes = []
+    for texto in dict.fromkeys(textos):
+        datos = cache.buscar(texto) if cache is not None else None
+        if datos is None:
+            pendientes.append(texto)
+        else:
+            imagenes[texto] = datos
+
+    codificados = _mapear(partial(codificar_qr_png, **opciones), pendientes, procesos, min_paralelo)
+
+    for texto, datos in zip(pendientes, codificados):
+        imagenes[texto] = datos
+        if cache is not None:
+            cache.guardar(texto, datos)
+    return [imagenes[texto] for texto in textos]
+
+
+def matrices_qr_lote(textos, procesos=None, min_paralelo=64, **opciones):
+    """
+    Matrices (ver matriz_qr) de una lista de textos, en el mismo orden; como
+    codificar_qr_lote pero para dibujar los QR como vectores.
+    """
+    unicos = list(dict.fromkeys(textos))
+    matrices = dict(zip(unicos, _mapear(partial(matriz_qr, **opciones), unicos, procesos, min_paralelo)))
+    return [matrices[texto] for texto in textos]
+
+
+def guardar_qr_lote(textos, rutas, **opciones):
+    """
+    Codifica los QR de una lista de textos (ver codificar_qr_lote) y escribe cada
+    uno en su ruta.
+
+    Returns:
+        list: La ruta de cada texto, o None si no se pudo escribir.
+    """
+    resultado = []
+    for ruta, datos in zip(rutas, codificar_qr_lote(textos, **opciones)):
+        try:
+            os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+            with open(ruta, "wb") as f:
+                f.write(datos)
+            resultado.append(ruta)
+        except OSError as e:
+            print(f"Error al guardar la imagen QR '{ruta}': {e}")
+            resultado.append(None)
+    return resultado
@@ -0,0 +1,152 @@
+# qr_cache.py
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class QRCache:
+    """
+    Caché de imágenes QR direccionada por contenido.
+
+    La clave es el hash del texto codificado (más la variante de la imagen), así
+    que reimprimir un tiquete o repetir una referencia no vuelve a codificar sus
+    QR. Las entradas recientes se guardan en memoria (LRU) y todas en disco, en
+    'directorio/<2 primeros caracteres>/<hash>.png'. Cuando el disco supera
+    'max_bytes' se borran primero los archivos usados hace más tiempo.
+    """
+
+    def __init__(self, directorio, codificar, variante="png", max_memoria=512, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            directorio (str): Carpeta de la caché en disco (None: solo memoria).
+            codificar (callable): Función texto -> bytes de la imagen.
+            variante (str): Distingue imágenes del mismo texto con otro formato o tamaño.
+            max_memoria (int): Máximo de imágenes en memoria.
+            max_bytes (int): Tamaño máximo de la caché en disco.
+        """
+        self.directorio = directorio
+        self.codificar = codificar
+        self.variante = variante
+        self.max_memoria = max_memoria
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._memoria = OrderedDict()  # Clave -> bytes, de la menos a la más reciente
+        self._bytes_disco = None       # Se calcula al primer guardado
+        self.aciertos = 0
+        self.fallos = 0
+
+    def clave(self, texto):
+        return hashlib.sha256(f"{self.variante}\0{texto}".encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], f"{clave}.png")
+
+    def obtener(self, texto):
+        """Bytes de la imagen QR de un texto: de memoria, de disco o recién codificada."""
+        datos = self.buscar(texto)
+        if datos is None:
+            datos = self.codificar(texto)
+            self.guardar(texto, datos)
+        return datos
+
+    def buscar(self, texto):
+        """Bytes de la imagen si ya está en memoria o en disco, o None (no codifica)."""
+        clave = self.clave(texto)
+        with self._lock:
+            if clave in self._memoria:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return self._memoria[clave]
+
+        datos = self._leer_disco(clave)
+        with self._lock:
+            if datos is None:
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+        self._recordar(clave, datos)
+        return datos
+
+    def guardar(self, texto, datos):
+        """Guarda una imagen ya codificada (p. ej. en otro proceso)."""
+        clave = self.clave(texto)
+        self._guardar_disco(clave, datos)
+        self._recordar(clave, datos)
+
+    def _recordar(self, clave, datos):
+        with self._lock:
+            self._memoria[clave] = datos
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def _leer_disco(self, clave):
+        if self.directorio is None:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as f:
+                datos = f.read()
+            os.utime(ruta)  # Marca de uso reciente para el desalojo
+            return datos
+        except OSError:
+            return None
+
+    def _guardar_disco(self, clave, datos):
+        if self.directorio is None:
+            return
+        ruta = self._ruta(clave)
+        try:
+            anterior = os.path.getsize(ruta)  # Se reemplaza: su tamaño deja de contar
+        except OSError:
+            anterior = 0
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            tmp_path = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(datos)
+            os.replace(tmp_path, ruta)
+        except OSError as e:
+            print(f"No se pudo guardar el QR en la caché '{self.directorio}': {e}")
+            return
+
+        with self._lock:
+            if self._bytes_disco is None:
+                self._bytes_disco = sum(tamano for _, tamano, _ in self._archivos_disco())
+            else:
+                self._bytes_disco += len(datos) - anterior
+            if self._bytes_disco > self.max_bytes:
+                self._desalojar()
+
+    def _archivos_disco(self):
+        """(fecha de uso, tamaño, ruta) de cada imagen en disco."""
+        archivos = []
+        for raiz, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                if not nombre.endswith(".png"):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    stat = os.stat(ruta)
+                except OSError:
+                    continue
+                archivos.append((stat.st_mtime, stat.st_size, ruta))
+        return archivos
+
+    def _desalojar(self):
+        """Borra las imágenes usadas hace más tiempo hasta bajar al 80% del máximo. Llamar con self._lock tomado."""
+        archivos = sorted(self._archivos_disco())
+        total = sum(tamano for _, tamano, _ in archivos)
+        objetivo = self.max_bytes * 0.8
+        for _, tamano, ruta in archivos:
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except OSError:
+                pass
+        self._bytes_disco = total
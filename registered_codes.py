@@ -0,0 +1,135 @@
+# registered_codes.py
+
+import math
+import hashlib
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom compacto para códigos seriales.
+
+    Responde "seguro que no está" o "puede que esté"; nunca da falsos negativos.
+    """
+
+    def __init__(self, capacidad=1_000_000, tasa_error=0.001):
+        """
+        Args:
+            capacidad (int): Número de códigos esperados.
+            tasa_error (float): Probabilidad aceptada de falso positivo.
+        """
+        capacidad = max(1, capacidad)
+        self.num_bits = max(8, int(-capacidad * math.log(tasa_error) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacidad * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _posiciones(self, codigo):
+        digest = hashlib.blake2b(str(codigo).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def agregar(self, codigo):
+        for pos in self._posiciones(codigo):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, codigo):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._posiciones(codigo))
+
+
+class RegisteredCodes:
+    """
+    Conjunto de códigos seriales que ya tienen un vale registrado.
+
+    Se carga una vez desde la columna 'Codigo_Serial_Trabajo_Asociado' de la hoja
+    'Vales' y se actualiza con cada vale nuevo, para que comprobar un duplicado sea O(1).
+
+    Con usar_bloom=True solo se guarda un filtro de Bloom (unos pocos bytes por
+    código, útil con millones de vales históricos). Las respuestas negativas son
+    inmediatas; las positivas se confirman con 'verificador' si se indica.
+    """
+
+    COLUMNA_CODIGO = "Codigo_Serial_Trabajo_Asociado"
+
+    def __init__(self, usar_bloom=False, capacidad=1_000_000, tasa_error=0.001, verificador=None):
+        """
+        Args:
+            usar_bloom (bool): Guardar solo el filtro de Bloom en lugar del conjunto exacto.
+            capacidad (int): Vales esperados (dimensiona el filtro).
+            tasa_error (float): Tasa de falsos positivos del filtro.
+            verificador (callable): Función codigo -> bool para confirmar un positivo del filtro.
+        """
+        self.usar_bloom = usar_bloom
+        self.capacidad = capacidad
+        self.tasa_error = tasa_error
+        self.verificador = verificador
+        self._codigos = set()
+        self._bloom = BloomFilter(capacidad, tasa_error) if usar_bloom else None
+        self._quitados = set()  # Con el filtro de Bloom: códigos de vales anulados
+        self._total = 0
+
+    def construir(self, ws_vales):
+        """
+        Carga los códigos desde la hoja 'Vales' leyendo solo la columna del código serial.
+
+        Raises:
+            ValueError: Si la hoja no tiene la columna 'Codigo_Serial_Trabajo_Asociado'.
+        """
+        headers = [cell.value for cell in ws_vales[1]]
+        col_idx = headers.index(self.COLUMNA_CODIGO) + 1
+        valores = ws_vales.iter_rows(min_row=2, min_col=col_idx, max_col=col_idx, values_only=True)
+        self.construir_desde_valores(valor for (valor,) in valores)
+
+    def construir_desde_filas(self, headers, filas):
+        """
+        Carga los códigos a partir de la cabecera de 'Vales' y un iterable de filas.
+
+        Raises:
+            ValueError: Si la cabecera no tiene la columna 'Codigo_Serial_Trabajo_Asociado'.
+        """
+        idx = list(headers).index(self.COLUMNA_CODIGO)
+        self.construir_desde_valores(fila[idx] for fila in filas if idx < len(fila))
+
+    def construir_desde_valores(self, codigos):
+        """Reinicia el conjunto con los códigos de un iterable."""
+        self._codigos = set()
+        self._bloom = BloomFilter(self.capacidad, self.tasa_error) if self.usar_bloom else None
+        self._quitados = set()
+        self._total = 0
+        for codigo in codigos:
+            self.agregar(codigo)
+
+    def agregar(self, codigo):
+        """Marca un código como registrado."""
+        if not codigo:
+            return
+        self._total += 1
+        if self._bloom is not None:
+            self._bloom.agregar(codigo)
+            self._quitados.discard(codigo)
+        else:
+            self._codigos.add(codigo)
+
+    def quitar(self, codigo):
+        """
+        Deja de marcar un código como registrado (su vale se anuló). El filtro de
+        Bloom no permite quitar, así que en ese modo se recuerda aparte.
+        """
+        if not codigo:
+            return
+        if self._bloom is not None:
+            if codigo not in self._quitados and codigo in self._bloom:
+                self._quitados.add(codigo)
+                self._total = max(0, self._total - 1)
+        else:
+            self._codigos.discard(codigo)
+
+    def __contains__(self, codigo):
+        if self._bloom is not None:
+            if codigo in self._quitados or codigo not in self._bloom:
+                return False
+            return self.verificador(codigo) if self.verificador else True
+        return codigo in self._codigos
+
+    def __len__(self):
+        return self._total if self._bloom is not None else len(self._codigos)
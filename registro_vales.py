@@ -0,0 +1,391 @@
+# registro_vales.py
+
+import csv
+import traceback
+import uuid
+import threading
+import datetime as dt
+from contextlib import nullcontext
+
+from config import WORK_TYPE_ABBREVIATIONS
+from serial_codes import es_codigo_aceptable, control_valido
+
+
+class ResultadoEscaneo:
+    """Resultado de validar (y registrar) un código escaneado."""
+
+    REGISTRADO = "registrado"
+    CODIGO_INVALIDO = "codigo_invalido"
+    YA_REGISTRADO = "ya_registrado"
+    REPETIDO_EN_LOTE = "repetido_en_lote"
+    NO_ENCONTRADO = "no_encontrado"
+    DATOS_INCOMPLETOS = "datos_incompletos"
+    ERROR = "error"
+    ANULADO = "anulado"
+
+    def __init__(self, codigo, estado, mensaje, vale_row=None, fila_tabla=None):
+        self.codigo = codigo
+        self.estado = estado
+        self.mensaje = mensaje
+        self.vale_row = vale_row        # Fila para 'Vales' (solo si el código es válido)
+        self.fila_tabla = fila_tabla    # Valores para la tabla visual de vales
+
+    @property
+    def valido(self):
+        return self.vale_row is not None
+
+    def __repr__(self):
+        return f"ResultadoEscaneo({self.codigo!r}, {self.estado!r})"
+
+
+# Nombres de columna aceptados para el código serial en un archivo CSV de importación
+COLUMNAS_CODIGO_IMPORTACION = ("codigo", "código", "codigo serial", "código serial",
+                               "codigo_serial_trabajo_asociado", "serial")
+
+
+def leer_codigos_archivo(path):
+    """
+    Lee los códigos seriales de un archivo de texto (uno por línea) o CSV.
+
+    En un CSV se usa la columna cuyo encabezado sea 'Código', 'Código Serial', etc.;
+    si no hay encabezado reconocible se toma la primera columna. Se ignoran las
+    líneas vacías y se conserva el orden (y las repeticiones) del archivo.
+
+    Returns:
+        list: Códigos leídos.
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        contenido = f.read()
+    if not contenido.strip():
+        return []
+
+    try:
+        dialecto = csv.Sniffer().sniff(contenido[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel  # Un código por línea: no hay delimitador que detectar
+    filas = [fila for fila in csv.reader(contenido.splitlines(), dialecto) if any(c.strip() for c in fila)]
+    if not filas:
+        return []
+
+    columna = 0
+    encabezado = [c.strip().lower() for c in filas[0]]
+    for nombre in COLUMNAS_CODIGO_IMPORTACION:
+        if nombre in encabezado:
+            columna = encabezado.index(nombre)
+            filas = filas[1:]
+            break
+
+    return [fila[columna].strip() for fila in filas if columna < len(fila) and fila[columna].strip()]
+
+
+def procesar_cola(cola, registro, al_procesar, entradas_de=None, sincronizar=None,
+                  medir=None, etapa="lote", avisar=print):
+    """
+    Bucle de un hilo que registra vales por lotes (modo ráfaga, lector sin
+    interfaz e ingesta): toma lotes de una ColaLotes hasta que se cierre,
+    sincroniza con las otras estaciones una vez por lote, registra sus entradas
+    con registrar_entradas() y entrega los resultados a al_procesar(lote, resultados).
+
+    Un error en un lote no termina el hilo: si falla el registro, todas sus
+    entradas se entregan como ERROR; si falla al_procesar, se informa y se sigue.
+
+    Args:
+        cola (ColaLotes): Cola de la que se toman los lotes.
+        registro (RegistroVales): Servicio que valida y registra los vales.
+        al_procesar (callable): Recibe cada lote y sus resultados, en orden.
+        entradas_de (callable): Convierte un lote en su lista de (código, empleado);
+                                por defecto el lote ya es esa lista.
+        sincronizar (callable): Se llama antes de cada lote (opcional).
+        medir (callable): medir(etapa) de un MedidorLatencias (opcional).
+        etapa (str): Nombre de la etapa medida para el registro de cada lote.
+        avisar (callable): Función que muestra los mensajes de error (print, log...).
+    """
+    medir = medir or (lambda _etapa: nullcontext())
+    while True:
+        lote = cola.tomar_lote()
+        if lote is None:
+            break
+        entradas = []
+        try:
+            entradas = entradas_de(lote) if entradas_de else lote
+            if sincronizar:
+                try:
+                    with medir("sincronizacion"):
+                        sincronizar()
+                except Exception as e:
+                    avisar(f"No se pudo sincronizar con otras estaciones: {e}")
+            with medir(etapa):
+                resultados = registro.registrar_entradas(entradas)
+        except Exception as e:
+            traceback.print_exc()
+            avisar(f"Error al procesar un lote de {len(entradas)} códigos: {e}")
+            resultados = [ResultadoEscaneo(codigo, ResultadoEscaneo.ERROR, f"Error al procesar '{codigo}': {e}")
+                          for codigo, _ in entradas]
+        try:
+            al_procesar(lote, resultados)
+        except Exception as e:
+            traceback.print_exc()
+            avisar(f"Error al entregar los resultados de un lote: {e}")
+
+
+class RegistroVales:
+    """
+    Valida códigos escaneados y registra sus vales, sin depender de la interfaz.
+
+    Lo usan tanto el escaneo normal (un código, con mensajes) como el modo ráfaga,
+    que valida y guarda los códigos por lotes en un hilo aparte: todos los vales de
+    un lote se escriben en el diario con una sola sincronización a disco.
+    """
+
+    def __init__(self, obtener_indice, vales_registrados, vale_journal, medidor=None, max_vales_sesion=200):
+        """
+        Args:
+            obtener_indice (callable): Retorna el CodeIndex vigente de 'Trabajos'
+                                       (se reconstruye cuando otra estación lo cambia).
+            vales_registrados (RegisteredCodes): Códigos que ya tienen vale.
+            vale_journal (ValeJournal): Diario donde se registran los vales.
+            medidor (MedidorLatencias): Si se indica, mide las etapas 'duplicados',
+                                        'busqueda' y 'guardado'.
+            max_vales_sesion (int): Vales recientes que se guardan en memoria para
+                                    anular() y ultimo_codigo(); los más antiguos se
+                                    buscan en el diario y los archivos mensuales.
+        """
+        self.obtener_indice = obtener_indice
+        self.vales_registrados = vales_registrados
+        self.vale_journal = vale_journal
+        self.medidor = medidor
+        self.lock = threading.RLock()  # La interfaz y el hilo del modo ráfaga registran a la vez
+        self.max_vales_sesion = max_vales_sesion
+        self._vales_sesion = {}  # Código -> fila de los últimos vales registrados (en orden de registro)
+
+    def _medir(self, etapa):
+        return self.medidor.medir(etapa) if self.medidor else nullcontext()
+
+    def resolver(self, codigo, empleado_id):
+        """
+        Valida un código contra los vales registrados y el índice de 'Trabajos' y,
+        si es válido, arma la fila del vale. No guarda nada.
+
+        Returns:
+            ResultadoEscaneo
+        """
+        if not es_codigo_aceptable(codigo):
+            return ResultadoEscaneo(codigo, ResultadoEscaneo.CODIGO_INVALIDO,
+                                    f"El código '{codigo}' no tiene un formato válido.")
+        if not control_valido(codigo):
+            return ResultadoEscaneo(codigo, ResultadoEscaneo.CODIGO_INVALIDO,
+                                    f"El código '{codigo}' no pasó la verificación (posible lectura errónea). "
+                                    f"Vuelva a escanearlo.")
+
+        with self._medir("duplicados"):
+            ya_registrado = codigo in self.vales_registrados
+        if ya_registrado:
+            return ResultadoEscaneo(codigo, ResultadoEscaneo.YA_REGISTRADO,
+                                    f"El vale '{codigo}' ya fue registrado.")
+
+        with self._medir("busqueda"):
+            return self._resolver_en_indice(codigo, empleado_id)
+
+    def _resolver_en_indice(self, codigo, empleado_id):
+        """Busca el código en 'Trabajos' y arma la fila del vale."""
+        code_index = self.obtener_indice()
+        found_row, work_type_found = code_index.buscar(codigo)
+        if not found_row:
+            return ResultadoEscaneo(codigo, ResultadoEscaneo.NO_ENCONTRADO,
+                                    f"El código '{codigo}' no se encontró en 'Trabajos'.")
+
+        try:
+            ticket_number = code_index.valor("Número Ticket", found_row)
+            referencia = code_index.valor("Referencia", found_row)
+            color = code_index.valor("Color", found_row)
+            total_producido = code_index.valor("Total Producido", found_row)
+            # Valor del trabajo específico encontrado
+            valor_trabajo_especifico = code_index.valor(f"Valor {work_type_found}", found_row)
+
+            if any(v is None for v in [ticket_number, referencia, color, total_producido, valor_trabajo_especifico]):
+                return ResultadoEscaneo(codigo, ResultadoEscaneo.DATOS_INCOMPLETOS,
+                                        f"Faltan datos esenciales para '{codigo}'. Verifique la hoja 'Trabajos'.")
+
+            tallas_cantidades = {}
+            for i in range(33, 49):
+                cantidad = code_index.valor(f"Cant_T{i}", found_row)
+                if cantidad and isinstance(cantidad, (int, float)) and cantidad > 0:
+                    tallas_cantidades[str(i)] = int(cantidad)
+            resumen_tallas = "; ".join([f"T{k}:{v}" for k, v in tallas_cantidades.items()]) or "N/A"
+        except Exception as e:
+            return ResultadoEscaneo(codigo, ResultadoEscaneo.ERROR,
+                                    f"Error al procesar datos para '{codigo}': {str(e)}")
+
+        id_vale = f"V{uuid.uuid4().hex}"  # Sin colisiones aunque se registren muchos vales en el mismo segundo
+        fecha_hora_actual = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        vale_row = [
+            id_vale, empleado_id, fecha_hora_actual, ticket_number, referencia,
+            color, resumen_tallas, total_producido, valor_trabajo_especifico,
+            codigo, work_type_found
+        ]
+
+        # Misma disposición que las columnas de tableViewVale
+        fila_tabla = [codigo, ticket_number, referencia, work_type_found, color, total_producido]
+        for wt in WORK_TYPE_ABBREVIATIONS.keys():
+            fila_tabla.append(code_index.valor(f"Valor {wt}", found_row))
+
+        return ResultadoEscaneo(codigo, ResultadoEscaneo.REGISTRADO,
+                                f"Vale {id_vale} registrado para {work_type_found}.",
+                                vale_row=vale_row, fila_tabla=fila_tabla)
+
+    def registrar(self, resultados):
+        """
+        Guarda en el diario los vales de los resultados válidos, con una sola
+        sincronización a disco, y los marca como registrados.
+
+        Raises:
+            OSError: Si no se pudo escribir el diario (ningún vale queda registrado).
+        """
+        with self.lock:
+            # Otro hilo pudo registrar el mismo código después de resolver()
+            for resultado in resultados:
+                if resultado.valido and resultado.codigo in self.vales_registrados:
+                    resultado.estado = ResultadoEscaneo.YA_REGISTRADO
+                    resultado.mensaje = f"El vale '{resultado.codigo}' ya fue registrado."
+                    resultado.vale_row = None
+            validos = [r for r in resultados if r.valido]
+            if not validos:
+                return
+            with self._medir("guardado"):
+                self.vale_journal.registrar_lote([r.vale_row for r in validos])
+            for resultado in validos:
+                self.vales_registrados.agregar(resultado.codigo)
+                self._vales_sesion[resultado.codigo] = resultado.vale_row
+            # Acotado: el lector sin interfaz y la ingesta corren por semanas
+            while len(self._vales_sesion) > self.max_vales_sesion:
+                del self._vales_sesion[next(iter(self._vales_sesion))]
+
+    def registrar_lote(self, codigos, empleado_id):
+        """
+        Valida y registra un lote de códigos del mismo empleado.
+
+        Un código repetido dentro del lote solo se registra la primera vez. Si falla
+        la escritura del diario, los códigos válidos se reportan como error.
+
+        Returns:
+            list: Un ResultadoEscaneo por código, en el mismo orden.
+        """
+        with self.lock:
+            resultados = []
+            vistos = set()
+            for codigo in codigos:
+                if codigo in vistos:
+                    resultados.append(ResultadoEscaneo(codigo, ResultadoEscaneo.REPETIDO_EN_LOTE,
+                                                       f"El código '{codigo}' se escaneó más de una vez."))
+                    continue
+                vistos.add(codigo)
+                resultados.append(self.resolver(codigo, empleado_id))
+
+            try:
+                self.registrar(resultados)
+            except Exception as e:
+                for resultado in resultados:
+                    if resultado.valido:
+                        resultado.estado = ResultadoEscaneo.ERROR
+                        resultado.mensaje = f"No se pudo guardar el vale: {e}"
+                        resultado.vale_row = None
+        return resultados
+
+    def registrar_entradas(self, entradas):
+        """
+        Registra un lote de pares (código, empleado) que pueden ser de varios
+        empleados, con un registrar_lote() por empleado.
+
+        Returns:
+            list: Un ResultadoEscaneo por entrada, en el mismo orden.
+        """
+        por_empleado = {}
+        for posicion, (codigo, empleado_id) in enumerate(entradas):
+            por_empleado.setdefault(empleado_id, []).append((posicion, codigo))
+
+        resultados = [None] * len(entradas)
+        for empleado_id, items in por_empleado.items():
+            try:
+                lote = self.registrar_lote([codigo for _, codigo in items], empleado_id)
+            except Exception as e:
+                traceback.print_exc()
+                lote = [ResultadoEscaneo(codigo, ResultadoEscaneo.ERROR, f"Error al procesar '{codigo}': {e}")
+                        for _, codigo in items]
+            for (posicion, _), resultado in zip(items, lote):
+                resultados[posicion] = resultado
+        return resultados
+
+    def importar_archivo(self, path, empleado_id):
+        """
+        Registra para un empleado todos los códigos de un archivo (texto o CSV),
+        p. ej. los recogidos sin conexión en un lector portátil.
+
+        Todos los códigos se resuelven contra el índice vigente y los vales válidos
+        se guardan juntos, con una sola escritura del diario: o quedan todos o ninguno.
+
+        Returns:
+            list: Un ResultadoEscaneo por código del archivo, en orden.
+        """
+        return self.registrar_lote(leer_codigos_archivo(path), empleado_id)
+
+    def anular(self, codigo):
+        """
+        Anula el vale registrado para un código (p. ej. se escaneó el código
+        equivocado). El vale se busca entre los recientes de esta sesión, los
+        pendientes del diario y los archivos mensuales, así que se pueden anular vales de sesiones
+        anteriores o de otras estaciones (una vez compactados). Solo se anexa una
+        marca al diario, así que es inmediato sin importar el tamaño de la base de
+        datos; el código se puede volver a escanear.
+
+        Returns:
+            ResultadoEscaneo: ANULADO, o NO_ENCONTRADO si no hay un vale vigente
+                              para ese código.
+
+        Raises:
+            OSError: Si no se pudo escribir el diario (el vale sigue vigente).
+        """
+        with self.lock:
+            vale_row = self._vales_sesion.get(codigo) or self._buscar_vale_registrado(codigo)
+            if vale_row is None:
+                return ResultadoEscaneo(codigo, ResultadoEscaneo.NO_ENCONTRADO,
+                                        f"No hay un vale registrado para '{codigo}'.")
+            fecha = vale_row[2]
+            if isinstance(fecha, dt.datetime):
+                fecha = fecha.strftime("%Y-%m-%d %H:%M:%S")
+            self.vale_journal.anular(vale_row[0], codigo=codigo, fecha=fecha)
+            self._vales_sesion.pop(codigo, None)
+            self.vales_registrados.quitar(codigo)
+        return ResultadoEscaneo(codigo, ResultadoEscaneo.ANULADO, f"Vale {vale_row[0]} anulado.")
+
+    def _buscar_vale_registrado(self, codigo):
+        """
+        Fila del vale vigente de un código fuera de esta sesión: primero en el diario
+        (aún no compactado) y luego en los archivos mensuales, en ese orden para no
+        perder un vale que se esté compactando entre ambas lecturas.
+        """
+        for fila in reversed(self.vale_journal.pendientes()):
+            if len(fila) > self.vale_journal.CODIGO_SERIAL_IDX and fila[self.vale_journal.CODIGO_SERIAL_IDX] == codigo:
+                return fila
+        store = getattr(self.vale_journal, "store", None)
+        return store.buscar_vale(codigo) if store is not None else None
+
+    def ultimo_codigo(self):
+        """Código del último vale registrado (y no anulado) en esta sesión, o None."""
+        with self.lock:
+            return next(reversed(self._vales_sesion), None)
+
+    @staticmethod
+    def resumir(resultados):
+        """
+        Agrupa los resultados de un lote por estado.
+
+        Returns:
+            dict: {"total": n, "registrados": n, estado: [códigos], ...} (solo estados presentes)
+        """
+        resumen = {"total": len(resultados), "registrados": 0}
+        for resultado in resultados:
+            if resultado.estado == ResultadoEscaneo.REGISTRADO:
+                resumen["registrados"] += 1
+            else:
+                resumen.setdefault(resultado.estado, []).append(resultado.codigo)
+        return resumen
@@ -0,0 +1,51 @@
+"""
+Hilo del modo ráfaga: valida y guarda los códigos escaneados por lotes, sin
+bloquear la interfaz ni mostrar un mensaje por código.
+"""
+from PySide2.QtCore import QThread, Signal
+
+from cola_lotes import ColaLotes
+from registro_vales import procesar_cola
+
+
+class ScanWorker(QThread):
+    """
+    Consume una cola de códigos escaneados y los procesa por lotes.
+
+    El lector puede disparar códigos sin pausa: encolar() retorna de inmediato y
+    el hilo toma todo lo que haya en la cola (hasta 'lote' códigos), registra los
+    vales válidos con una sola escritura del diario y emite los resultados. La
+    sincronización con otras estaciones la hace la ventana, en su hilo, antes de
+    encolar.
+    """
+    procesados = Signal(list)  # Lista de ResultadoEscaneo, en orden de escaneo
+
+    def __init__(self, registro, lote=50, espera=0.15, medidor=None):
+        """
+        Args:
+            registro (RegistroVales): Servicio que valida y registra los vales.
+            lote (int): Máximo de códigos por lote.
+            espera (float): Segundos que se esperan a más códigos antes de procesar un lote.
+            medidor (MedidorLatencias): Si se indica, mide 'lote_rafaga'.
+        """
+        super().__init__()
+        self.registro = registro
+        self.medidor = medidor
+        self._cola = ColaLotes(lote, espera)
+
+    def encolar(self, codigo, empleado_id):
+        """Añade un código escaneado a la cola (no bloquea)."""
+        self._cola.poner((codigo, empleado_id))
+
+    def pendientes(self):
+        """Códigos en cola aún sin procesar (aproximado)."""
+        return self._cola.pendientes()
+
+    def detener(self):
+        """Pide al hilo que termine después de procesar lo que quede en la cola."""
+        self._cola.cerrar()
+
+    def run(self):
+        procesar_cola(self._cola, self.registro, lambda _lote, resultados: self.procesados.emit(resultados),
+                      medir=self.medidor.medir if self.medidor else None, etapa="lote_rafaga",
+                      avisar=lambda mensaje: print(f"Modo ráfaga: {mensaje}"))
@@ -0,0 +1,129 @@
+"""
+Lector de códigos sin interfaz gráfica, para estaciones que solo tienen un
+lector USB (que escribe como un teclado) y ninguna pantalla.
+
+Lee un código por línea desde la entrada estándar o desde una tubería con nombre
+(FIFO), lo valida con la misma lógica que el escaneo de la ventana principal
+(RegistroVales) y registra los vales por lotes en el diario de la estación. No
+importa PySide2: arranca en milisegundos.
+
+Uso:
+    python scanner_daemon.py --empleado 1234567
+    python scanner_daemon.py --empleado 1234567 --fifo /tmp/lector
+    python scanner_daemon.py --empleado 1234567 < codigos.txt
+
+La base de datos debe existir (la crea la aplicación principal).
+"""
+import os
+import sys
+import signal
+import argparse
+import threading
+
+from estacion_vales import EstacionVales, log
+from cola_lotes import ColaLotes
+from registro_vales import procesar_cola
+
+
+class ScannerDaemon:
+    """
+    Une la lectura de líneas con el registro por lotes: un hilo lee los códigos
+    y los encola; otro toma lotes, sincroniza una vez por lote y registra todos
+    los vales válidos del lote con una sola escritura del diario.
+    """
+
+    def __init__(self, estacion, empleado_id, lote=50, espera=0.15):
+        self.estacion = estacion
+        self.empleado_id = empleado_id
+        self.cola = ColaLotes(lote, espera)
+        self.registrados = 0
+        self.rechazados = 0
+        self._hilo = None
+
+    def iniciar(self):
+        self.estacion.iniciar()
+        self._hilo = threading.Thread(target=self._bucle, name="ScannerDaemon", daemon=True)
+        self._hilo.start()
+
+    def encolar(self, linea):
+        codigo = linea.strip()
+        if codigo:
+            self.cola.poner((codigo, self.empleado_id))
+
+    def leer(self, flujo):
+        """Encola cada línea no vacía de un flujo de texto hasta que se termine."""
+        for linea in flujo:
+            self.encolar(linea)
+
+    def _bucle(self):
+        procesar_cola(self.cola, self.estacion.registro, self._informar, sincronizar=self.estacion.sincronizar,
+                      medir=self.estacion.latencias.medir, etapa="lote_lector", avisar=log)
+
+    def _informar(self, entradas, resultados):
+        for resultado in resultados:
+            if resultado.valido:
+                self.registrados += 1
+                log(f"OK {resultado.codigo}: {resultado.mensaje}")
+            else:
+                self.rechazados += 1
+                log(f"{resultado.estado.upper()} {resultado.codigo}: {resultado.mensaje}")
+
+    def detener(self):
+        """Procesa lo que quede en la cola y cierra la estación."""
+        self.cola.cerrar()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
+        self.estacion.cerrar()
+        log(f"Lector detenido: {self.registrados} vales registrados, {self.rechazados} códigos rechazados.")
+
+
+def leer_fifo(daemon, fifo_path):
+    """Lee de una tubería con nombre; cuando el escritor la cierra, se vuelve a abrir."""
+    if not os.path.exists(fifo_path):
+        os.mkfifo(fifo_path)
+    while True:
+        with open(fifo_path, "r", encoding="utf-8") as fifo:
+            daemon.leer(fifo)
+
+
+def _terminar(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registra vales leyendo códigos sin interfaz gráfica.")
+    parser.add_argument("--empleado", required=True, help="ID (cédula) del empleado al que se asignan los vales.")
+    parser.add_argument("--excel", default="trabajos_database.xlsx", help="Archivo Excel de la base de datos.")
+    parser.add_argument("--estacion", default=None, help="Nombre de la estación (archivo del diario).")
+    parser.add_argument("--fifo", default=None, help="Leer de esta tubería con nombre en lugar de la entrada estándar.")
+    parser.add_argument("--lote", type=int, default=50, help="Máximo de códigos por escritura.")
+    parser.add_argument("--espera", type=float, default=0.15, help="Segundos de espera para juntar un lote.")
+    args = parser.parse_args(argv)
+
+    try:
+        estacion = EstacionVales(args.excel, args.estacion)
+    except (OSError, ValueError, KeyError) as e:
+        log(f"ERROR: {e}")
+        return 1
+    log(f"Lector '{estacion.estacion}' listo: {len(estacion.code_index)} códigos, "
+        f"{len(estacion.vales_registrados)} vales registrados, empleado {args.empleado}.")
+
+    # Detenerse igual con Ctrl+C o con la señal del servicio del sistema
+    signal.signal(signal.SIGTERM, _terminar)
+    daemon = ScannerDaemon(estacion, args.empleado, lote=args.lote, espera=args.espera)
+    daemon.iniciar()
+    try:
+        if args.fifo:
+            leer_fifo(daemon, args.fifo)
+        else:
+            daemon.leer(sys.stdin)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.detener()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
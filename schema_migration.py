@@ -0,0 +1,142 @@
+# schema_migration.py
+
+import os
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+
+
+def necesita_migracion(headers_actuales, headers_esperados):
+    """
+    True si la cabecera de la hoja no empieza con las columnas esperadas.
+    Las columnas adicionales al final (conservadas de una migración anterior) no cuentan.
+    """
+    actuales = list(headers_actuales)
+    return actuales[:len(headers_esperados)] != list(headers_esperados)
+
+
+def calcular_cabecera(headers_actuales, headers_esperados, renombres=None):
+    """
+    Calcula la cabecera migrada y de dónde sale cada columna.
+
+    Las columnas se emparejan por nombre (aplicando antes 'renombres'). Las columnas
+    antiguas que ya no existen en la cabecera esperada se conservan al final, para
+    no perder datos; también las que no tienen nombre (quedan sin nombre) y las
+    de nombre repetido.
+
+    Returns:
+        tuple: (cabecera nueva, lista con el índice de origen de cada columna o None si es nueva)
+    """
+    renombres = renombres or {}
+    origen_por_nombre = {}
+    for idx, nombre in enumerate(headers_actuales):
+        if nombre is None:
+            continue
+        nombre = renombres.get(nombre, nombre)
+        origen_por_nombre.setdefault(nombre, idx)
+
+    cabecera = list(headers_esperados)
+    origenes = [origen_por_nombre.get(nombre) for nombre in cabecera]
+    usados = {idx for idx in origenes if idx is not None}
+    for idx, nombre in enumerate(headers_actuales):
+        if idx not in usados:
+            cabecera.append(renombres.get(nombre, nombre) if nombre is not None else None)
+            origenes.append(idx)
+    return cabecera, origenes
+
+
+def _copiar_celda(ws_destino, celda):
+    """Copia valor y estilo de una celda de solo lectura a una hoja de solo escritura."""
+    if celda.value is None and not getattr(celda, "has_style", False):
+        return None
+    nueva = WriteOnlyCell(ws_destino, value=celda.value)
+    if getattr(celda, "has_style", False):
+        nueva.font = celda.font
+        nueva.fill = celda.fill
+        nueva.border = celda.border
+        nueva.alignment = celda.alignment
+        nueva.number_format = celda.number_format
+    return nueva
+
+
+def migrar_cabecera(excel_path, sheet_name, headers_esperados, renombres=None, progreso=None, cada=5000):
+    """
+    Reescribe una hoja con una cabecera nueva en una sola pasada de streaming.
+
+    Cada columna se mueve a su nueva posición según su nombre, así que ningún dato
+    queda bajo una cabecera equivocada. El libro se lee con read_only=True y se
+    escribe con write_only=True (memoria acotada, sin importar el número de filas)
+    en un archivo temporal que reemplaza al original con un renombrado atómico.
+    Si la migración se interrumpe, el original queda intacto y basta con volver a
+    ejecutarla.
+
+    Ninguna columna se pierde: las que no tienen nombre en la cabecera se conservan
+    al final (sin nombre) y los valores de filas más largas que la cabecera se
+    copian después de todas las columnas, en su mismo orden.
+
+    Las demás hojas se copian con sus valores y estilos de celda; las hojas de
+    reporte 'Empleado_*' recuperan combinaciones de celdas y anchos la próxima vez
+    que se actualicen los reportes.
+
+    Args:
+        excel_path (str): Ruta del archivo Excel.
+        sheet_name (str): Hoja a migrar.
+        headers_esperados (list): Cabecera nueva.
+        renombres (dict): Nombre antiguo -> nombre nuevo, para columnas renombradas.
+        progreso (callable): Función (filas migradas) llamada cada 'cada' filas.
+
+    Returns:
+        dict: {"filas": filas migradas, "cabecera": cabecera final, "nuevas": columnas sin datos previos,
+               "sin_nombre": columnas con datos conservadas sin nombre}
+    """
+    origen = load_workbook(excel_path, read_only=True)
+    tmp_path = excel_path + ".migracion.tmp"
+    try:
+        destino = Workbook(write_only=True)
+        resultado = None
+        for nombre_hoja in origen.sheetnames:
+            ws_origen = origen[nombre_hoja]
+            ws_destino = destino.create_sheet(title=nombre_hoja)
+
+            if nombre_hoja != sheet_name:
+                for fila in ws_origen.iter_rows():
+                    ws_destino.append([_copiar_celda(ws_destino, celda) for celda in fila])
+                continue
+
+            filas = ws_origen.iter_rows(values_only=True)
+            headers_actuales = list(next(filas, ()))
+            cabecera, origenes = calcular_cabecera(headers_actuales, headers_esperados, renombres)
+            ws_destino.append(cabecera)
+
+            ancho = len(headers_actuales)
+            sin_nombre = set()  # Posiciones de origen de columnas sin nombre que tienen datos
+            migradas = 0
+            for fila in filas:
+                nueva = [
+                    fila[idx] if idx is not None and idx < len(fila) else None
+                    for idx in origenes
+                ]
+                # Valores a la derecha de la última cabecera: se copian al final, en su orden
+                nueva.extend(fila[ancho:])
+                for idx, valor in enumerate(fila):
+                    if valor is not None and (idx >= ancho or headers_actuales[idx] is None):
+                        sin_nombre.add(idx)
+                ws_destino.append(nueva)
+                migradas += 1
+                if progreso and migradas % cada == 0:
+                    progreso(migradas)
+
+            resultado = {
+                "filas": migradas,
+                "cabecera": cabecera,
+                "nuevas": [nombre for nombre, idx in zip(cabecera, origenes) if idx is None],
+                "sin_nombre": len(sin_nombre),
+            }
+
+        if resultado is None:
+            raise KeyError(f"La hoja '{sheet_name}' no existe en '{excel_path}'.")
+        destino.save(tmp_path)
+    finally:
+        origen.close()
+
+    os.replace(tmp_path, excel_path)
+    return resultado
@@ -0,0 +1,135 @@
+# serial_codes.py
+
+import re
+
+from config import WORK_TYPE_ABBREVIATIONS
+
+# Tipo de trabajo por abreviatura ('CT' -> 'Corte', ...)
+TIPO_POR_ABREVIATURA = {abbr: work_type for work_type, abbr in WORK_TYPE_ABBREVIATIONS.items()}
+
+# Formato de generate_serial_code: TKT-RE-ABBR-T-XXXXXX-C
+#   TKT: hasta 3 caracteres del ticket, RE: hasta 2 de la referencia (sin guiones),
+#   ABBR: abreviatura del tipo de trabajo, T: primer dígito de la talla o 'X',
+#   XXXXXX: 6 dígitos hexadecimales aleatorios,
+#   C: carácter de control (ISO 7064 MOD 37,36) de todo lo anterior.
+# Los códigos impresos antes del carácter de control (sin '-C') se siguen aceptando.
+_PATRON_CODIGO = re.compile(r"^([^-]{0,3})-([^-]{0,2})-([A-Z]{2})-([0-9X])-([0-9A-F]{6})(?:-([0-9A-Z]))?$")
+
+LARGO_MAXIMO = 64  # Ningún código válido (actual o anterior) es más largo
+
+_ALFABETO_CONTROL = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_VALOR_CONTROL = {c: i for i, c in enumerate(_ALFABETO_CONTROL)}
+
+
+class CodigoSerial:
+    """Partes de un código serial con el formato actual."""
+
+    def __init__(self, codigo, ticket, referencia, abreviatura, talla, unico, control=None):
+        self.codigo = codigo
+        self.ticket = ticket              # Prefijo del número de ticket
+        self.referencia = referencia      # Prefijo de la referencia
+        self.abreviatura = abreviatura
+        self.work_type = TIPO_POR_ABREVIATURA[abreviatura]
+        self.talla = talla
+        self.unico = unico
+        self.control = control            # Carácter de control, o None en códigos anteriores
+
+    def __repr__(self):
+        return f"CodigoSerial({self.codigo!r}, work_type={self.work_type!r})"
+
+
+def caracter_control(cuerpo):
+    """
+    Carácter de control (ISO 7064 MOD 37,36) de un código sin los guiones:
+    detecta cualquier carácter cambiado y casi todos los pares intercambiados.
+    Los caracteres fuera de 0-9/A-Z (p. ej. 'Ñ' en el ticket) también cuentan.
+    """
+    p = 36
+    for c in cuerpo:
+        if c == '-':
+            continue
+        valor = _VALOR_CONTROL.get(c, ord(c) % 36)
+        p = (p + valor) % 36 or 36
+        p = (p * 2) % 37
+    return _ALFABETO_CONTROL[(37 - p) % 36]
+
+
+def componer_codigo(ticket_number, referencia, work_type_abbr, talla_char, unique_id_segment):
+    """Arma un código serial con el formato actual, con su carácter de control (lo usa generate_serial_code)."""
+    # Sin guiones (separan las partes) ni espacios (un lector los corta o los cambia)
+    safe_ticket = "".join(str(ticket_number).split()).replace('-', '')[:3]
+    safe_ref = "".join(str(referencia).split()).replace('-', '')[:2]
+    cuerpo = f"{safe_ticket}-{safe_ref}-{work_type_abbr}-{talla_char}-{unique_id_segment}".upper()
+    return f"{cuerpo}-{caracter_control(cuerpo)}"
+
+
+def control_valido(codigo):
+    """
+    False si el código tiene el formato actual con carácter de control y este no
+    corresponde (lectura errónea de un vale gastado). Los códigos sin carácter de
+    control (anteriores) se dan por válidos. Cuesta microsegundos: va antes de
+    cualquier búsqueda.
+    """
+    coincidencia = _PATRON_CODIGO.match(codigo) if isinstance(codigo, str) else None
+    if not coincidencia or coincidencia.group(6) is None:
+        return True
+    return caracter_control(codigo[:-2]) == coincidencia.group(6)
+
+
+def es_codigo_aceptable(codigo):
+    """
+    Validación barata antes de cualquier búsqueda: texto no vacío, de largo
+    razonable, imprimible y sin espacios al inicio ni al final (p. ej. descarta la
+    basura que envía un lector mal configurado). No exige el formato actual y
+    admite espacios internos, para aceptar códigos antiguos (tickets o referencias
+    con espacios).
+    """
+    return (
+        isinstance(codigo, str)
+        and 0 < len(codigo) <= LARGO_MAXIMO
+        and codigo.isprintable()
+        and codigo == codigo.strip()
+    )
+
+
+def decodificar_codigo(codigo):
+    """
+    Extrae el tipo de trabajo (por su abreviatura) y el prefijo del ticket de un
+    código con el formato actual (con o sin carácter de control).
+
+    Returns:
+        CodigoSerial, o None si el código no tiene el formato actual (código
+        antiguo), su abreviatura no corresponde a ningún tipo de trabajo o su
+        carácter de control no corresponde.
+    """
+    if not isinstance(codigo, str):
+        return None
+    coincidencia = _PATRON_CODIGO.match(codigo)
+    if not coincidencia:
+        return None
+    ticket, referencia, abreviatura, talla, unico, control = coincidencia.groups()
+    if abreviatura not in TIPO_POR_ABREVIATURA:
+        return None
+    if control is not None and caracter_control(codigo[:-2]) != control:
+        return None
+    return CodigoSerial(codigo, ticket, referencia, abreviatura, talla, unico, control)
+
+
+def columnas_para_codigo(codigo, work_type_columns):
+    """
+    Columnas donde buscar un código escaneado.
+
+    Args:
+        work_type_columns (dict): Tipo de trabajo -> nombre de la columna 'Código_<tipo>'.
+
+    Returns:
+        list: Pares (tipo de trabajo, columna). Vacía si el código no es aceptable
+              o su carácter de control no corresponde; solo la columna de su tipo
+              si trae una abreviatura conocida; todas (código antiguo) en otro caso.
+    """
+    if not es_codigo_aceptable(codigo) or not control_valido(codigo):
+        return []
+    decodificado = decodificar_codigo(codigo)
+    if decodificado is not None and decodificado.work_type in work_type_columns:
+        return [(decodificado.work_type, work_type_columns[decodificado.work_type])]
+    return list(work_type_columns.items())
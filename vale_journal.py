@@ -0,0 +1,241 @@
+# vale_journal.py
+
+import os
+import json
+import threading
+import datetime as dt
+
+
+class ValeJournal:
+    """
+    Diario de vales de solo-anexado con compactación en segundo plano.
+
+    Cada vale se escribe como una línea JSON en un archivo pequeño y se sincroniza
+    a disco (fsync) antes de confirmarlo, sin reescribir el Excel. Un hilo en
+    segundo plano pasa los vales pendientes, por lotes, a los archivos mensuales
+    de vales (ValesShardStore).
+
+    El archivo del diario y la lista en memoria contienen siempre los mismos
+    vales: los que aún no están en los archivos mensuales.
+
+    Anular un vale también es una línea del diario (una marca con su ID_Vale),
+    así que es inmediato. Si el vale sigue en el diario, la compactación
+    simplemente no lo pasa; si ya estaba en un archivo mensual, la marca se
+    entrega al almacén, que lo omite en las consultas y lo borra cuando reescribe
+    ese mes.
+    """
+
+    CODIGO_SERIAL_IDX = 9  # Posición de 'Codigo_Serial_Trabajo_Asociado' en la fila del vale
+
+    def __init__(self, journal_path, store, intervalo=2.0, lote=200):
+        """
+        Args:
+            journal_path (str): Ruta del archivo del diario (.jsonl).
+            store (ValesShardStore): Almacén mensual donde se compactan los vales.
+            intervalo (float): Segundos entre compactaciones automáticas.
+            lote (int): Máximo de vales que se pasan al Excel en cada guardado.
+        """
+        self.journal_path = journal_path
+        self.store = store
+        self.intervalo = intervalo
+        self.lote = lote
+
+        self._lock = threading.Lock()  # Protege el diario (archivo + memoria)
+        self._compactando = threading.Lock()  # Una sola compactación a la vez
+        self._pendientes = []
+        self._codigos_pendientes = set()
+        self._anulaciones = []       # Marcas aún no entregadas al almacén
+        self._ids_anulados = set()
+        self._detener = threading.Event()
+        self._despertar = threading.Event()
+        self._hilo = None
+
+        self._cargar()
+        self._archivo = open(self.journal_path, "a", encoding="utf-8")
+
+    def _cargar(self):
+        """Recupera los vales que quedaron en el diario (p. ej. tras un cierre inesperado)."""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for linea in f:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    entrada = json.loads(linea)
+                except json.JSONDecodeError:
+                    # Última línea incompleta por un corte de luz: se descarta
+                    print(f"Advertencia: línea inválida en el diario de vales: {linea[:80]}")
+                    continue
+                if entrada.get("tipo") == "anulacion":
+                    self._agregar_anulacion(entrada)
+                else:
+                    self._agregar_en_memoria(entrada["fila"])
+        if self._pendientes:
+            print(f"Diario de vales: {len(self._pendientes)} vales pendientes de compactar.")
+
+    def _agregar_en_memoria(self, fila):
+        self._pendientes.append(fila)
+        if len(fila) > self.CODIGO_SERIAL_IDX and fila[self.CODIGO_SERIAL_IDX] and fila[0] not in self._ids_anulados:
+            self._codigos_pendientes.add(fila[self.CODIGO_SERIAL_IDX])
+
+    def _agregar_anulacion(self, marca):
+        marca = {k: v for k, v in marca.items() if k != "tipo"}
+        self._anulaciones.append(marca)
+        self._ids_anulados.add(marca["id_vale"])
+        self._recalcular_codigos()
+
+    def _recalcular_codigos(self):
+        self._codigos_pendientes = {
+            fila[self.CODIGO_SERIAL_IDX] for fila in self._pendientes
+            if len(fila) > self.CODIGO_SERIAL_IDX and fila[self.CODIGO_SERIAL_IDX]
+            and fila[0] not in self._ids_anulados
+        }
+
+    def registrar(self, vale_row):
+        """
+        Anexa un vale al diario y lo sincroniza a disco. Cuando retorna, el vale es durable.
+        """
+        self.registrar_lote([vale_row])
+
+    def registrar_lote(self, vale_rows):
+        """
+        Anexa varios vales al diario con una sola sincronización a disco. Cuando
+        retorna, todos los vales son durables.
+        """
+        filas = [list(vale_row) for vale_row in vale_rows]
+        if not filas:
+            return
+        lineas = "".join(
+            json.dumps({"tipo": "vale", "fila": fila}, ensure_ascii=False, default=str) + "\n"
+            for fila in filas
+        )
+        with self._lock:
+            self._archivo.write(lineas)
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+            for fila in filas:
+                self._agregar_en_memoria(fila)
+        if len(self._pendientes) >= self.lote:
+            self._despertar.set()
+
+    def anular(self, id_vale, codigo=None, fecha=None):
+        """
+        Anexa al diario una marca de anulación del vale 'id_vale' y la sincroniza a
+        disco. No reescribe nada: cuando retorna, la anulación es durable.
+
+        Args:
+            id_vale (str): ID_Vale del vale anulado.
+            codigo (str): Código serial del vale (para volver a permitir su escaneo).
+            fecha: FechaHora_Generacion del vale (indica en qué archivo mensual está).
+        """
+        marca = {
+            "id_vale": id_vale,
+            "codigo": codigo,
+            "fecha": fecha,
+            "anulado_en": dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        linea = json.dumps(dict(marca, tipo="anulacion"), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._archivo.write(linea)
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+            self._agregar_anulacion(marca)
+
+    def contiene_codigo(self, codigo):
+        """True si el código está en un vale aún no compactado (y no anulado)."""
+        with self._lock:
+            return codigo in self._codigos_pendientes
+
+    def pendientes(self):
+        """Copia de las filas de vales aún no compactadas y no anuladas, en orden de registro."""
+        with self._lock:
+            return [list(fila) for fila in self._pendientes if fila[0] not in self._ids_anulados]
+
+    def compactar(self, maximo=None):
+        """
+        Pasa hasta 'maximo' vales pendientes (todos si es None) a los archivos
+        mensuales, con un guardado por mes, y después los elimina del diario.
+
+        Los vales anulados del lote no se pasan; las marcas de vales que ya no
+        están en el diario se entregan al almacén en el mismo guardado.
+
+        Returns:
+            int: Número de vales y marcas procesados.
+        """
+        with self._compactando:
+            with self._lock:
+                lote = [list(fila) for fila in self._pendientes[:maximo]]
+                ids_resto = {fila[0] for fila in self._pendientes[len(lote):]}
+                ids_lote = {fila[0] for fila in lote}
+                marcas = [dict(marca) for marca in self._anulaciones if marca["id_vale"] not in ids_resto]
+            if not lote and not marcas:
+                return 0
+
+            # Si un guardado anterior terminó pero no se alcanzó a recortar el diario,
+            # el almacén omite los vales cuyo ID ya tiene.
+            ids_marcas = {marca["id_vale"] for marca in marcas}
+            self.store.anexar(
+                [fila for fila in lote if fila[0] not in ids_marcas],
+                anulaciones=[marca for marca in marcas if marca["id_vale"] not in ids_lote],
+            )
+
+            with self._lock:
+                del self._pendientes[:len(lote)]
+                # Siguen en el diario las marcas de vales que aún no se compactan
+                ids_pendientes = {fila[0] for fila in self._pendientes}
+                self._anulaciones = [
+                    marca for marca in self._anulaciones
+                    if marca["id_vale"] not in ids_marcas or marca["id_vale"] in ids_pendientes
+                ]
+                self._ids_anulados = {marca["id_vale"] for marca in self._anulaciones}
+                self._recalcular_codigos()
+                self._reescribir_diario()
+        return len(lote) + len(marcas)
+
+    def _reescribir_diario(self):
+        """Reescribe el diario con los vales y marcas que siguen pendientes. Llamar con self._lock tomado."""
+        self._archivo.close()
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for fila in self._pendientes:
+                f.write(json.dumps({"tipo": "vale", "fila": fila}, ensure_ascii=False, default=str) + "\n")
+            for marca in self._anulaciones:
+                f.write(json.dumps(dict(marca, tipo="anulacion"), ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._archivo = open(self.journal_path, "a", encoding="utf-8")
+
+    # --- COMPACTADOR EN SEGUNDO PLANO ---
+
+    def iniciar(self):
+        """Arranca el hilo compactador."""
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="ValeJournalCompactor", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                while self.compactar(self.lote) and not self._detener.is_set():
+                    pass
+            except PermissionError:
+                print(f"Diario de vales: un archivo de '{self.store.directorio}' está abierto en otro programa, se reintentará.")
+            except Exception as e:
+                print(f"Error al compactar el diario de vales: {e}")
+
+    def detener(self, compactar=True):
+        """Detiene el hilo y, opcionalmente, compacta lo que quede pendiente."""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
+        if compactar:
+            self.compactar()
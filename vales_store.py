@@ -0,0 +1,521 @@
+# vales_store.py
+
+import os
+import re
+import json
+import threading
+import datetime as dt
+from filelock import FileLock
+from openpyxl import Workbook, load_workbook
+from columnar_snapshot import ColumnarSnapshot
+
+
+class ValesShardStore:
+    """
+    Vales particionados en un archivo Excel por mes ('vales_AAAA-MM.xlsx').
+
+    Los vales nuevos solo tocan el archivo del mes en curso, que se mantiene
+    pequeño sin importar cuántos años de historia haya. Las consultas con rango
+    de fechas abren únicamente los meses que lo intersectan, y los consolidados
+    por empleado se calculan una vez por mes y se reutilizan mientras ese archivo
+    no cambie (en la práctica, solo se recalcula el mes en curso).
+
+    Los vales sin una fecha reconocible van a 'vales_sin_fecha.xlsx', que solo
+    se incluye en las consultas sin rango.
+
+    Junto a cada archivo se guarda una copia columnar (ColumnarSnapshot) que las
+    lecturas usan mientras esté al día, sin volver a interpretar el XML.
+
+    Varias estaciones pueden compartir la carpeta: cada escritura toma un bloqueo
+    de archivo ('.lock'), vuelve a leer el mes del disco y solo añade sus vales.
+    Un vale cuyo código ya registró otra estación se descarta en ese momento.
+
+    Anular un vale no reescribe ningún archivo mensual: se anexa una marca con su
+    ID a 'vales_anulados.jsonl' y las consultas omiten esos vales. La fila se
+    borra de verdad la próxima vez que una compactación reescribe ese mes (en la
+    práctica, el mes en curso a los pocos segundos), y entonces se retira la marca.
+    """
+
+    COLUMNAS_NUMERICAS = ("Total_Producido_Trabajo", "Suma_Valores_Trabajos")
+
+    SIN_FECHA = "sin_fecha"
+    _PATRON_SHARD = re.compile(r"^vales_(\d{4}-\d{2}|sin_fecha)\.xlsx$")
+
+    def __init__(self, directorio, headers, sheet_name="Vales", timeout_bloqueo=30):
+        """
+        Args:
+            directorio (str): Carpeta donde se guardan los archivos por mes.
+            headers (list): Cabecera de la hoja 'Vales'.
+            sheet_name (str): Nombre de la hoja dentro de cada archivo.
+            timeout_bloqueo (float): Segundos máximos de espera por el bloqueo de la carpeta.
+        """
+        self.directorio = directorio
+        self.headers = list(headers)
+        self.sheet_name = sheet_name
+        self.fecha_idx = self.headers.index("FechaHora_Generacion")
+        self.empleado_idx = self.headers.index("EmpleadoID")
+        self.valor_idx = self.headers.index("Suma_Valores_Trabajos")
+        self.codigo_idx = self.headers.index("Codigo_Serial_Trabajo_Asociado")
+
+        self._lock = threading.RLock()
+        self.bloqueo_archivo = FileLock(os.path.join(directorio, ".lock"), timeout=timeout_bloqueo)
+        self.ruta_anulaciones = os.path.join(directorio, "vales_anulados.jsonl")
+        self._resumenes = {}   # Mes -> (firma del archivo y sus anulados, consolidados del mes)
+        self._codigos = {}     # Mes -> (firma del archivo y sus anulados, códigos del mes)
+        self._entregados = {}  # Mes -> firma ya entregada por codigos_actualizados()
+        self._anulaciones = (None, {})      # (firma del archivo de anulaciones, ID_Vale -> marca)
+        self._anulaciones_entregadas = set()  # ID_Vale ya entregados por codigos_anulados_actualizados()
+
+    # --- PARTICIONES ---
+
+    @staticmethod
+    def fecha_de(valor):
+        """Convierte la fecha de un vale (datetime o texto 'AAAA-MM-DD HH:MM:SS') a datetime, o None."""
+        if isinstance(valor, dt.datetime):
+            return valor
+        if isinstance(valor, dt.date):
+            return dt.datetime(valor.year, valor.month, valor.day)
+        if isinstance(valor, str) and valor.strip():
+            try:
+                return dt.datetime.fromisoformat(valor.strip())
+            except ValueError:
+                return None
+        return None
+
+    def clave_mes(self, fecha):
+        """Mes ('AAAA-MM') al que pertenece una fecha, o SIN_FECHA."""
+        fecha = self.fecha_de(fecha)
+        return fecha.strftime("%Y-%m") if fecha else self.SIN_FECHA
+
+    def ruta_shard(self, clave):
+        return os.path.join(self.directorio, f"vales_{clave}.xlsx")
+
+    def ruta_snapshot(self, clave):
+        return os.path.join(self.directorio, f"vales_{clave}.snapshot")
+
+    def meses(self, desde=None, hasta=None):
+        """
+        Meses con archivo que intersectan el rango [desde, hasta), en orden.
+        Sin rango se incluyen todos, y el de vales sin fecha al final.
+        """
+        if not os.path.isdir(self.directorio):
+            return []
+        claves = []
+        for nombre in os.listdir(self.directorio):
+            coincidencia = self._PATRON_SHARD.match(nombre)
+            if coincidencia:
+                claves.append(coincidencia.group(1))
+
+        sin_rango = desde is None and hasta is None
+        fechadas = sorted(c for c in claves if c != self.SIN_FECHA)
+        if desde is not None:
+            fechadas = [c for c in fechadas if c >= self.clave_mes(desde)]
+        if hasta is not None:
+            fechadas = [c for c in fechadas if c <= self.clave_mes(hasta)]
+        if sin_rango and self.SIN_FECHA in claves:
+            fechadas.append(self.SIN_FECHA)
+        return fechadas
+
+    def _meses_contiguos(self, clave):
+        """El mes indicado, el anterior y el siguiente (solo él mismo si es SIN_FECHA)."""
+        if clave == self.SIN_FECHA:
+            return [clave]
+        anio, mes = (int(parte) for parte in clave.split("-"))
+        indice = anio * 12 + mes - 1
+        return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in (indice - 1, indice, indice + 1)]
+
+    @staticmethod
+    def _firma(path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    # --- ESCRITURA ---
+
+    def anexar(self, filas, omitir_duplicados=True, anulaciones=()):
+        """
+        Añade vales a los archivos de sus meses (un guardado por mes afectado).
+
+        Los vales cuyo ID ya está en el archivo de su mes se omiten, así que repetir
+        la misma llamada tras un cierre inesperado no duplica filas. También se omiten
+        los vales cuyo código ya está registrado (p. ej. por otra estación), salvo
+        con omitir_duplicados=False. Esa revisión solo abre los meses que se
+        escriben y sus vecinos: dos estaciones que registran el mismo código a la
+        vez lo hacen con fechas cercanas, y los códigos más antiguos ya los rechaza
+        el escaneo con el conjunto de códigos registrados de la estación.
+
+        Las marcas de 'anulaciones' se guardan primero. Al reescribir un mes se
+        borran de él los vales anulados y se retiran sus marcas; las de meses que
+        no se tocan quedan para una compactación posterior.
+
+        Returns:
+            int: Número de vales añadidos.
+        """
+        por_mes = {}
+        for fila in filas:
+            fila = list(fila)
+            fecha = fila[self.fecha_idx] if self.fecha_idx < len(fila) else None
+            por_mes.setdefault(self.clave_mes(fecha), []).append(fila)
+
+        anadidos = 0
+        os.makedirs(self.directorio, exist_ok=True)
+        with self._lock, self.bloqueo_archivo:
+            if anulaciones:
+                self._guardar_anulaciones(anulaciones)
+            anulados = self._cargar_anulaciones()
+
+            registrados = set()
+            if omitir_duplicados:
+                existentes = set(self.meses())
+                vecinos = set()
+                for clave in por_mes:
+                    vecinos.update(self._meses_contiguos(clave))
+                for clave in vecinos & existentes:
+                    registrados |= self._codigos_mes(clave)[1]
+
+            resueltas = set()
+            for clave, filas_mes in por_mes.items():
+                path = self.ruta_shard(clave)
+                if os.path.exists(path):
+                    wb = load_workbook(path)
+                    ws = wb[self.sheet_name]
+                else:
+                    wb = Workbook()
+                    ws = wb.active
+                    ws.title = self.sheet_name
+                    ws.append(self.headers)
+
+                # Reconciliar las anulaciones de este mes, ya que el archivo se reescribe de todos modos
+                # Una fila ya guardada (p. ej. al repetir una compactación) se reconoce por
+                # su ID_Vale y su código a la vez: un ID repetido con otro código es otro vale
+                guardados = set()
+                a_borrar = []
+                for numero, fila in enumerate(ws.iter_rows(min_row=2, max_col=self.codigo_idx + 1, values_only=True), start=2):
+                    if fila[0] in anulados:
+                        a_borrar.append(numero)
+                        resueltas.add(fila[0])
+                    else:
+                        guardados.add((fila[0], fila[self.codigo_idx] if self.codigo_idx < len(fila) else None))
+                for numero in reversed(a_borrar):
+                    ws.delete_rows(numero)
+
+                for fila in filas_mes:
+                    codigo = fila[self.codigo_idx] if self.codigo_idx < len(fila) else None
+                    if (fila[0], codigo) in guardados:
+                        continue
+                    if fila[0] in anulados:
+                        resueltas.add(fila[0])
+                        continue
+                    if omitir_duplicados and codigo and codigo in registrados:
+                        print(f"Vale {fila[0]} descartado: el código '{codigo}' ya fue registrado en otra estación.")
+                        continue
+                    ws.append(fila)
+                    guardados.add((fila[0], codigo))
+                    if codigo:
+                        registrados.add(codigo)
+                    anadidos += 1
+
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                wb.save(tmp_path)
+                os.replace(tmp_path, path)
+                self._escribir_snapshot(clave, ws.iter_rows(min_row=2, values_only=True))
+
+            if resueltas:
+                self._retirar_anulaciones(resueltas)
+        return anadidos
+
+    # --- ANULACIONES ---
+
+    def _cargar_anulaciones(self):
+        """Marcas de anulación vigentes (ID_Vale -> marca), releídas solo si el archivo cambió."""
+        try:
+            firma = self._firma(self.ruta_anulaciones)
+        except FileNotFoundError:
+            self._anulaciones = (None, {})
+            return self._anulaciones[1]
+        if self._anulaciones[0] == firma:
+            return self._anulaciones[1]
+
+        marcas = {}
+        with open(self.ruta_anulaciones, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    marca = json.loads(linea)
+                except json.JSONDecodeError:
+                    continue  # Línea incompleta por un corte: la marca sigue en el diario de su estación
+                if isinstance(marca, dict) and marca.get("id_vale"):
+                    marcas[marca["id_vale"]] = marca
+        self._anulaciones = (firma, marcas)
+        return marcas
+
+    def _guardar_anulaciones(self, anulaciones):
+        """Anexa marcas al archivo de anulaciones. Llamar con el bloqueo de la carpeta tomado."""
+        with open(self.ruta_anulaciones, "a", encoding="utf-8") as f:
+            for marca in anulaciones:
+                f.write(json.dumps(marca, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _retirar_anulaciones(self, ids_vale):
+        """Quita las marcas de vales ya borrados. Llamar con el bloqueo de la carpeta tomado."""
+        restantes = [m for id_vale, m in self._cargar_anulaciones().items() if id_vale not in ids_vale]
+        tmp_path = f"{self.ruta_anulaciones}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for marca in restantes:
+                f.write(json.dumps(marca, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.ruta_anulaciones)
+
+    def _anulados_mes(self, clave):
+        """ID_Vale anulados que pueden estar en el archivo de un mes."""
+        return frozenset(
+            id_vale for id_vale, marca in self._cargar_anulaciones().items()
+            if not marca.get("fecha") or self.clave_mes(marca["fecha"]) == clave
+        )
+
+    def codigos_anulados_actualizados(self):
+        """
+        Códigos de los vales anulados desde la llamada anterior (p. ej. por otra
+        estación), para quitarlos del conjunto local de códigos registrados. Se
+        omiten los que ya volvieron a registrarse en un vale vigente.
+        """
+        with self._lock:
+            nuevos = {}
+            for id_vale, marca in self._cargar_anulaciones().items():
+                if id_vale not in self._anulaciones_entregadas:
+                    self._anulaciones_entregadas.add(id_vale)
+                    if marca.get("codigo"):
+                        nuevos[marca["codigo"]] = self.clave_mes(marca.get("fecha"))
+            vigentes = set()
+            for clave in set(nuevos.values()):
+                if os.path.exists(self.ruta_shard(clave)):
+                    vigentes |= self._codigos_mes(clave)[1]
+        return {codigo for codigo in nuevos if codigo not in vigentes}
+
+    def _escribir_snapshot(self, clave, filas):
+        """
+        Escribe la copia columnar de un mes a partir de sus filas; retorna las filas
+        no vacías. Llamar con self.bloqueo_archivo tomado (el mismo del .xlsx).
+        """
+        filas = [fila for fila in filas if any(v is not None for v in fila)]
+        try:
+            ColumnarSnapshot.escribir(self.ruta_snapshot(clave), self.headers, filas,
+                                      self.COLUMNAS_NUMERICAS, self._firma(self.ruta_shard(clave)))
+        except Exception as e:
+            print(f"No se pudo escribir la copia columnar de '{clave}': {e}")
+        return filas
+
+    def _filas_mes(self, clave):
+        """Filas de un mes: de la copia columnar si está al día, si no del .xlsx (y se regenera la copia)."""
+        path = self.ruta_shard(clave)
+        copia = ColumnarSnapshot.leer(self.ruta_snapshot(clave), self._firma(path))
+        if copia is not None and copia[0] == self.headers:
+            return copia[1]
+        with self.bloqueo_archivo:
+            wb = load_workbook(path, read_only=True)
+            try:
+                return self._escribir_snapshot(clave, wb[self.sheet_name].iter_rows(min_row=2, values_only=True))
+            finally:
+                wb.close()
+
+    def migrar_desde_hoja(self, session, sheet_name="Vales"):
+        """
+        Pasa a los archivos por mes los vales de la hoja 'Vales' del libro principal
+        y deja en ella solo la cabecera. Los archivos por mes se escriben antes de
+        vaciar la hoja, así que una interrupción no pierde vales.
+
+        Returns:
+            int: Número de filas migradas.
+        """
+        with session.lock:
+            if sheet_name not in session.nombres_hojas():
+                return 0
+            filas = [fila for fila in session.filas(sheet_name, min_row=2) if any(v is not None for v in fila)]
+            if not filas:
+                return 0
+            self.anexar(filas, omitir_duplicados=False)
+            session.modificar(lambda wb: wb[sheet_name].delete_rows(2, wb[sheet_name].max_row))
+            session.guardar()
+        print(f"{len(filas)} vales migrados a archivos mensuales en '{self.directorio}'.")
+        return len(filas)
+
+    # --- CONSULTAS ---
+
+    def filas(self, desde=None, hasta=None):
+        """
+        Itera los vales vigentes (tuplas de valores) con fecha en [desde, hasta),
+        abriendo solo los archivos de los meses de ese rango. Sin rango retorna
+        todos. Los vales anulados se omiten.
+        """
+        with self._lock:
+            for clave in self.meses(desde, hasta):
+                anulados = self._anulados_mes(clave)
+                for fila in self._filas_mes(clave):
+                    if anulados and fila[0] in anulados:
+                        continue
+                    if desde is not None or hasta is not None:
+                        fecha = self.fecha_de(fila[self.fecha_idx])
+                        if fecha is None:
+                            continue
+                        if desde is not None and fecha < desde:
+                            continue
+                        if hasta is not None and fecha >= hasta:
+                            continue
+                    yield fila
+
+    def _codigos_mes(self, clave):
+        """(firma, códigos) de los vales vigentes de un mes, releídos solo si el archivo o sus anulados cambiaron."""
+        anulados = self._anulados_mes(clave)
+        firma = (self._firma(self.ruta_shard(clave)), anulados)
+        cacheado = self._codigos.get(clave)
+        if cacheado and cacheado[0] == firma:
+            return cacheado
+        codigos = {
+            fila[self.codigo_idx] for fila in self._filas_mes(clave)
+            if self.codigo_idx < len(fila) and fila[self.codigo_idx] and fila[0] not in anulados
+        }
+        self._codigos[clave] = (firma, codigos)
+        return self._codigos[clave]
+
+    def buscar_vale(self, codigo):
+        """
+        Fila del vale vigente más reciente de un código, o None. Solo abre los
+        meses cuyo conjunto de códigos (cacheado) contiene el código.
+        """
+        with self._lock:
+            for clave in reversed(self.meses()):
+                try:
+                    if codigo not in self._codigos_mes(clave)[1]:
+                        continue
+                    anulados = self._anulados_mes(clave)
+                    for fila in reversed(list(self._filas_mes(clave))):
+                        if self.codigo_idx < len(fila) and fila[self.codigo_idx] == codigo and fila[0] not in anulados:
+                            return list(fila)
+                except FileNotFoundError:
+                    continue
+        return None
+
+    def codigos_actualizados(self, todos=False):
+        """
+        Códigos de los meses cuyo archivo cambió desde la llamada anterior (todos en la
+        primera, o con todos=True). Permite sumar al conjunto local los vales registrados
+        por otras estaciones.
+        """
+        nuevos = set()
+        with self._lock:
+            if todos:
+                self._entregados = {}
+                # Los códigos entregados ya descuentan los vales anulados hasta ahora
+                self._anulaciones_entregadas = set(self._cargar_anulaciones())
+            for clave in self.meses():
+                try:
+                    firma, codigos = self._codigos_mes(clave)
+                except FileNotFoundError:
+                    continue
+                if self._entregados.get(clave) != firma:
+                    nuevos |= codigos
+                    self._entregados[clave] = firma
+        return nuevos
+
+    def _resumen_mes(self, clave):
+        """Totales por empleado de los vales vigentes de un mes, recalculados solo si el archivo o sus anulados cambiaron."""
+        path = self.ruta_shard(clave)
+        anulados = self._anulados_mes(clave)
+        firma = (self._firma(path), anulados)
+        cacheado = self._resumenes.get(clave)
+        if cacheado and cacheado[0] == firma:
+            return cacheado[1]
+
+        resumen = {}
+        for fila in self._filas_mes(clave):
+            if len(fila) <= max(self.fecha_idx, self.empleado_idx, self.valor_idx):
+                continue
+            if fila[0] in anulados:
+                continue
+            fecha = self.fecha_de(fila[self.fecha_idx])
+            if fecha is None or fila[self.valor_idx] is None or not fila[self.empleado_idx]:
+                continue
+            try:
+                valor = float(fila[self.valor_idx])
+            except (ValueError, TypeError):
+                continue
+
+            datos = resumen.setdefault(fila[self.empleado_idx], {"semanal": {}, "mensual": {}, "anual": {}})
+            week_key = f"{fecha.year}-W{fecha.isocalendar()[1]:02d}"
+            if week_key not in datos["semanal"]:
+                start_of_week = fecha - dt.timedelta(days=fecha.weekday())
+                datos["semanal"][week_key] = {
+                    "start_date": start_of_week,
+                    "end_date": start_of_week + dt.timedelta(days=6),
+                    "total": 0
+                }
+            datos["semanal"][week_key]["total"] += valor
+
+            month_key = f"{fecha.year}-{fecha.month:02d}"
+            mensual = datos["mensual"].setdefault(month_key, {"year": fecha.year, "month": fecha.month, "total": 0})
+            mensual["total"] += valor
+
+            datos["anual"][fecha.year] = datos["anual"].get(fecha.year, 0) + valor
+
+        self._resumenes[clave] = (firma, resumen)
+        return resumen
+
+    def consolidados(self, empleado_id, desde=None, hasta=None):
+        """
+        Totales semanales, mensuales y anuales de un empleado, sumando los meses
+        completos que intersectan [desde, hasta) (todos si no se indica).
+
+        Returns:
+            dict: {"semanal": {semana: {...}}, "mensual": {mes: {...}}, "anual": {año: total}}
+        """
+        resultado = {"semanal": {}, "mensual": {}, "anual": {}}
+        with self._lock:
+            for clave in self.meses(desde, hasta):
+                if clave == self.SIN_FECHA:
+                    continue
+                datos = self._resumen_mes(clave).get(empleado_id)
+                if not datos:
+                    continue
+                for week_key, semana in datos["semanal"].items():
+                    if week_key in resultado["semanal"]:
+                        resultado["semanal"][week_key]["total"] += semana["total"]
+                    else:
+                        resultado["semanal"][week_key] = dict(semana)
+                for month_key, mes in datos["mensual"].items():
+                    resultado["mensual"][month_key] = dict(mes)
+                for year, total in datos["anual"].items():
+                    resultado["anual"][year] = resultado["anual"].get(year, 0) + total
+        return resultado
+
+
+# --- BLOQUE DE TESTEO (varias estaciones como procesos) ---
+_HEADERS_PRUEBA = [
+    "ID_Vale", "EmpleadoID", "FechaHora_Generacion", "Numero_Ticket_Asociado",
+    "Referencia_Asociada", "Color_Trabajo", "Resumen_Tallas_Cantidades",
+    "Total_Producido_Trabajo", "Suma_Valores_Trabajos", "Codigo_Serial_Trabajo_Asociado",
+    "WorkTypeDetected"
+]
+
+
+def _estacion_de_prueba(directorio, estacion, vales):
+    store = ValesShardStore(directorio, _HEADERS_PRUEBA)
+    for i in range(vales):
+        # Cada estación registra sus propios códigos y además intenta el código compartido "C-COMUN"
+        codigo = "C-COMUN" if i == 0 else f"C-{estacion}-{i}"
+        store.anexar([[f"V-{estacion}-{i}", estacion, "2025-01-15 08:00:00", 1, "REF", "NEGRO", "", 1, 1000, codigo, "CO"]])
+
+
+if __name__ == "__main__":
+    import tempfile
+    from multiprocessing import Process
+
+    directorio = tempfile.mkdtemp()
+    estaciones, vales = 4, 15
+    procesos = [Process(target=_estacion_de_prueba, args=(directorio, f"E{n}", vales)) for n in range(estaciones)]
+    for p in procesos:
+        p.start()
+    for p in procesos:
+        p.join()
+
+    guardados = list(ValesShardStore(directorio, _HEADERS_PRUEBA).filas())
+    print(f"Vales esperados: {estaciones * (vales - 1) + 1}, vales guardados: {len(guardados)}")